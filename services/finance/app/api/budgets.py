@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Body, Query
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
+from app.infrastructure.budget_tracker import budget_tracker
 from datetime import datetime
-import calendar
 
 router = APIRouter()
 
@@ -15,24 +16,9 @@ async def get_budgets(user_id: int, month: str = Query(None)):
         month = datetime.now().strftime('%Y-%m')
         
     try:
-        # Buscar orçamentos
-        budgets_resp = supabase.table('budgets').select('*').eq('user_id', user_id).eq('month', month).execute()
-        budgets = budgets_resp.data or []
-        
-        # Buscar despesas do mês
-        year, m = map(int, month.split('-'))
-        last_day = calendar.monthrange(year, m)[1]
-        start_date = f"{month}-01"
-        end_date = f"{month}-{last_day:02d}"
-        
-        expenses_resp = supabase.table('expenses').select('amount, categories(name)').eq('user_id', user_id).eq('type', 'expense').gte('date', start_date).lte('date', end_date).execute()
-        expenses = expenses_resp.data or []
-        
-        # Agrupar por categoria
-        spent_by_category = {}
-        for e in expenses:
-            cat = (e.get('categories') or {}).get('name', 'Outros')
-            spent_by_category[cat] = spent_by_category.get(cat, 0) + float(e['amount'])
+        # Orçamentos e despesa por categoria vêm do tracker incremental
+        budgets = list((await db.run(budget_tracker.budgets, user_id, month)).values())
+        spent_by_category = await db.run(budget_tracker.spent, user_id, month)
             
         result = []
         for b in budgets:
@@ -65,7 +51,22 @@ async def create_budget(user_id: int, data: dict = Body(...)):
             'month': data.get('month', datetime.now().strftime('%Y-%m'))
         }
         # Upsert: se já houver orçamento para esta categoria no mesmo mês, atualiza
-        response = supabase.table('budgets').upsert(budget_data, on_conflict='user_id, category, month').execute()
+        response = await db.execute(supabase.table('budgets').upsert(budget_data, on_conflict='user_id, category, month'))
+        budget_tracker.invalidate(user_id, budget_data['month'])
         return {"budget": response.data[0]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{budget_id}")
+
+async def delete_budget(budget_id: int, user_id: int):
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+
+    try:
+        response = await db.execute(supabase.table('budgets').delete().eq('id', budget_id).eq('user_id', user_id))
+        for budget in (response.data or []):
+            budget_tracker.invalidate(user_id, budget['month'])
+        return {'message': 'Removido com sucesso'}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
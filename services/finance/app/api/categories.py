@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 
 router = APIRouter()
 
@@ -9,7 +10,7 @@ async def get_categories(user_id: int):
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('categories').select('*').eq('user_id', user_id).execute()
+        response = await db.execute(supabase.table('categories').select('*').eq('user_id', user_id))
         return {"categories": response.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -25,7 +26,7 @@ async def add_category(user_id: int, data: dict):
             'name': data['name'],
             'colour': data.get('colour', '#808080')
         }
-        response = supabase.table('categories').insert(category_data).execute()
+        response = await db.execute(supabase.table('categories').insert(category_data))
         if response.data:
             return {"category": response.data[0]}
         raise HTTPException(status_code=400, detail="Failed to create category")
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Body
-import os
-from google import genai
+import json
+from fastapi import APIRouter, HTTPException, Body, Request
+from fastapi.responses import StreamingResponse
 
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure.snapshot import user_snapshot
+from app.infrastructure.ai_gateway import ai_gateway
+from app.infrastructure.conversations import conversation_store
+from app.infrastructure import db
 from datetime import datetime, timedelta
 
 router = APIRouter()
@@ -30,23 +34,20 @@ Responde sempre em Português de Portugal."""
 def get_fallback_response(user_message: str):
     return "Como posso ajudar com as suas finanças hoje? Posso dar dicas de poupança, investimentos ou gestão de dívidas."
 
-async def get_user_context(user_id: int):
+async def get_user_context(request: Request, user_id: int):
     """Gera um resumo textual dos dados do usuário para a IA"""
     if not supabase: return "Dados indisponíveis."
     try:
+        snapshot = await user_snapshot(request, user_id)
         # Saldo e Transações
-        resp = supabase.table('expenses').select('type, amount').eq('user_id', user_id).execute()
-        trx = resp.data or []
-        income = sum(float(t['amount']) for t in trx if t['type'] == 'income')
-        expense = sum(float(t['amount']) for t in trx if t['type'] == 'expense')
+        income = snapshot['income']
+        expense = snapshot['expense']
         
         # Investimentos
-        inv_resp = supabase.table('investments').select('quantity, last_price').eq('user_id', user_id).execute()
-        inv_total = sum(float(i['quantity']) * float(i['last_price']) for i in (inv_resp.data or []))
+        inv_total = sum(float(i['quantity']) * float(i['last_price']) for i in snapshot['investments'])
         
         # Objetivos
-        goals_resp = supabase.table('savings_goals').select('name, target_amount, current_amount').eq('user_id', user_id).execute()
-        goals = goals_resp.data or []
+        goals = snapshot['goals']
         goals_str = ", ".join([f"{g['name']} ({round(g['current_amount']/g['target_amount']*100)}%)" for g in goals if g['target_amount'] > 0])
         
         return f"""
@@ -59,44 +60,108 @@ async def get_user_context(user_id: int):
     except:
         return "Erro ao carregar contexto financeiro."
 
+async def prepare_prompt(request: Request, user_id: int, conversation, user_message: str):
+    """Mensagens e instrução de sistema para o modelo: contexto financeiro + resumo + turnos recentes"""
+    await conversation.settle()
+    context = await get_user_context(request, user_id)
+    system_instruction = FINANCE_SYSTEM_PROMPT.format(user_context=context)
+    if conversation.summary:
+        system_instruction += f"\n\nRESUMO DA CONVERSA ATÉ AGORA:\n{conversation.summary}"
+    return conversation.messages(user_message), system_instruction
+
+async def remember(conversation, user_message: str, reply: str):
+    conversation.add('user', user_message)
+    conversation.add('model', reply)
+    await conversation.save()
+    conversation.schedule_compaction()
+
+async def open_conversation(user_id: int, data: dict):
+    """Conversa pedida (ou uma nova) e se o cliente pediu uma que já não existe (`reset`)"""
+    requested = data.get('conversationId')
+    conversation = await db.run(conversation_store.get_or_create, user_id, requested, data.get('conversationHistory'))
+    return conversation, bool(requested) and conversation.id != requested
+
+def sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 @router.post("/")
 
-async def chat(user_id: int, data: dict = Body(...)):
+async def chat(request: Request, user_id: int, data: dict = Body(...)):
+    """
+    Envia uma mensagem ao Sensei. O cliente manda só `message` e o `conversationId` devolvido
+    na resposta anterior; sem id (ou com um id expirado) começa uma nova conversa, semeada com
+    `conversationHistory` se o cliente ainda o enviar. `reset` indica que o id enviado já não
+    existia e que o Sensei perdeu o contexto anterior.
+    """
     user_message = data.get('message', '').strip()
-    conversation_history = data.get('conversationHistory', [])
     
     if not user_message:
         raise HTTPException(status_code=400, detail="Message is required")
+    
+    conversation, reset = await open_conversation(user_id, data)
         
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        return {"response": get_fallback_response(user_message), "status": "fallback"}
+    if not ai_gateway.available:
+        return {"response": get_fallback_response(user_message), "status": "fallback", "conversationId": conversation.id, "reset": reset}
         
     try:
-        client = genai.Client(api_key=api_key)
+        messages, system_instruction = await prepare_prompt(request, user_id, conversation, user_message)
         
-        # Obter contexto dinâmico
-        context = await get_user_context(user_id)
-        system_instruction = FINANCE_SYSTEM_PROMPT.format(user_context=context)
+        text = await ai_gateway.generate(messages, system_instruction=system_instruction, temperature=0.7)
+        await remember(conversation, user_message, text)
         
-        # Formatar mensagens
-        messages = []
-        for msg in conversation_history[-10:]:
-            role = 'model' if msg.get('role') in ['bot', 'assistant', 'model'] else 'user'
-            messages.append(genai.types.Content(role=role, parts=[genai.types.Part(text=msg.get('content', ''))]))
-            
-        messages.append(genai.types.Content(role='user', parts=[genai.types.Part(text=user_message)]))
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=messages,
-            config=genai.types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.7
-            )
-        )
-        
-        return {"response": response.text, "status": "success"}
+        return {"response": text, "status": "success", "conversationId": conversation.id, "reset": reset}
     except Exception as e:
         print(f"Erro Gemini: {e}")
-        return {"response": get_fallback_response(user_message), "status": "error_fallback"}
+        return {"response": get_fallback_response(user_message), "status": "error_fallback", "conversationId": conversation.id, "reset": reset}
+
+@router.post("/stream")
+async def chat_stream(request: Request, user_id: int, data: dict = Body(...)):
+    """
+    Variante em Server-Sent Events do /chat: envia {"type": "delta", "text": ...} à medida que o
+    modelo gera e termina com {"type": "done", "status": ..., "response": <texto final>, "conversationId": ..., "reset": ...}.
+    Em fallback (sem chave ou erro do modelo) o `response` final substitui o texto parcial.
+    """
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    conversation, reset = await open_conversation(user_id, data)
+    
+    async def events():
+        if not ai_gateway.available:
+            yield sse({"type": "done", "status": "fallback", "response": get_fallback_response(user_message), "conversationId": conversation.id, "reset": reset})
+            return
+        parts = []
+        try:
+            messages, system_instruction = await prepare_prompt(request, user_id, conversation, user_message)
+            async for chunk in ai_gateway.stream(messages, system_instruction=system_instruction, temperature=0.7):
+                parts.append(chunk)
+                yield sse({"type": "delta", "text": chunk})
+            text = "".join(parts)
+            await remember(conversation, user_message, text)
+            yield sse({"type": "done", "status": "success", "response": text, "conversationId": conversation.id, "reset": reset})
+        except Exception as e:
+            print(f"Erro Gemini (stream): {e}")
+            yield sse({"type": "done", "status": "error_fallback", "response": get_fallback_response(user_message), "conversationId": conversation.id, "reset": reset})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Sem cache nem buffering em proxies, para cada pedaço chegar logo ao browser
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{conversation_id}")
+async def get_conversation(user_id: int, conversation_id: str):
+    """Resumo e turnos recentes guardados no servidor"""
+    conversation = await db.run(conversation_store.get, user_id, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation.to_dict()
+
+@router.delete("/{conversation_id}")
+async def delete_conversation(user_id: int, conversation_id: str):
+    if not await db.run(conversation_store.delete, user_id, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"status": "deleted"}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 from app.utils.auth import get_current_user
 from datetime import datetime
 
@@ -12,7 +13,7 @@ async def get_debts(current_user: dict = Depends(get_current_user)):
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     try:
-        resp = supabase.table('debts').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+        resp = await db.execute(supabase.table('debts').select('*').eq('user_id', user_id).order('created_at', desc=True))
         debts = resp.data or []
         total_debt = sum(float(d.get('remaining_amount', 0)) for d in debts)
         return {"debts": debts, "total_debt": total_debt}
@@ -38,7 +39,7 @@ async def create_debt(data: dict, current_user: dict = Depends(get_current_user)
             'creditor': data.get('creditor', ''),
             'notes': data.get('notes', ''),
         }
-        resp = supabase.table('debts').insert(debt_data).execute()
+        resp = await db.execute(supabase.table('debts').insert(debt_data))
         if resp.data:
             return {"debt": resp.data[0], "message": "Dívida criada com sucesso"}
         raise HTTPException(status_code=400, detail="Falha ao criar dívida")
@@ -55,7 +56,7 @@ async def update_debt(debt_id: int, data: dict, current_user: dict = Depends(get
         update_data = {k: v for k, v in data.items() if k in [
             'name', 'remaining_amount', 'interest_rate', 'monthly_payment', 'due_date', 'creditor', 'notes', 'type'
         ]}
-        resp = supabase.table('debts').update(update_data).eq('id', debt_id).eq('user_id', user_id).execute()
+        resp = await db.execute(supabase.table('debts').update(update_data).eq('id', debt_id).eq('user_id', user_id))
         if resp.data:
             return {"debt": resp.data[0], "message": "Dívida atualizada"}
         raise HTTPException(status_code=404, detail="Dívida não encontrada")
@@ -69,7 +70,7 @@ async def delete_debt(debt_id: int, current_user: dict = Depends(get_current_use
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     try:
-        supabase.table('debts').delete().eq('id', debt_id).eq('user_id', user_id).execute()
+        await db.execute(supabase.table('debts').delete().eq('id', debt_id).eq('user_id', user_id))
         return {"message": "Dívida removida com sucesso"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
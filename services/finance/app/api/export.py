@@ -1,33 +1,52 @@
 from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
+from app.utils.pagination import apply_keyset, encode_cursor
+from app.infrastructure.report_jobs import report_jobs
 from datetime import datetime, timedelta
 import csv
+import importlib.util
 import io
 import os
 
 router = APIRouter()
 
-@router.get("/csv")
-async def export_csv(user_id: int, start_date: str = None, end_date: str = None):
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Database not configured")
-    
-    try:
-        today = datetime.now()
-        if not start_date:
-            start_date = today.replace(day=1).strftime('%Y-%m-%d')
-        if not end_date:
-            next_month = today.replace(day=28) + timedelta(days=4)
-            end_date = (next_month - timedelta(days=next_month.day)).strftime('%Y-%m-%d')
-            
-        resp = supabase.table('expenses').select('date, amount, type, notes, categories(name)').eq('user_id', user_id).gte('date', start_date).lte('date', end_date).order('date', desc=True).execute()
-        transactions = resp.data or []
-        
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=';')
-        writer.writerow(['Data', 'Descricao', 'Categoria', 'Tipo', 'Valor (EUR)'])
-        
-        for t in transactions:
+EXPORT_PAGE_SIZE = 500
+CSV_HEADER = ['Data', 'Descricao', 'Categoria', 'Tipo', 'Valor (EUR)']
+
+def _default_range(start_date: str = None, end_date: str = None):
+    today = datetime.now()
+    if not start_date:
+        start_date = today.replace(day=1).strftime('%Y-%m-%d')
+    if not end_date:
+        next_month = today.replace(day=28) + timedelta(days=4)
+        end_date = (next_month - timedelta(days=next_month.day)).strftime('%Y-%m-%d')
+    return start_date, end_date
+
+def iter_transaction_pages(user_id: int, start_date: str, end_date: str, columns: str = 'id, date, amount, type, notes, categories(name)'):
+    """Percorre o intervalo em páginas (keyset por date/id), sem carregar tudo em memória"""
+    cursor = None
+    while True:
+        query = supabase.table('expenses').select(columns).eq('user_id', user_id).gte('date', start_date).lte('date', end_date)
+        rows = apply_keyset(query, cursor).limit(EXPORT_PAGE_SIZE).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        cursor = encode_cursor(rows[-1])
+
+def iter_csv(user_id: int, start_date: str, end_date: str):
+    """Gera o CSV em blocos de bytes: cabeçalho (com BOM) e depois uma página de cada vez"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue().encode('utf-8-sig')
+
+    for rows in iter_transaction_pages(user_id, start_date, end_date):
+        buffer.seek(0)
+        buffer.truncate()
+        for t in rows:
             writer.writerow([
                 t['date'],
                 t.get('notes', ''),
@@ -35,103 +54,105 @@ async def export_csv(user_id: int, start_date: str = None, end_date: str = None)
                 'Receita' if t['type'] == 'income' else 'Despesa',
                 f"{float(t['amount']):.2f}".replace('.', ','),
             ])
-            
-        output.seek(0)
-        filename = f"relatorio_{start_date}_{end_date}.csv"
-        return Response(
-            content=output.getvalue().encode('utf-8-sig'),
-            media_type='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield buffer.getvalue().encode('utf-8')
 
-@router.get("/pdf")
-async def export_pdf(user_id: int, start_date: str = None, end_date: str = None):
+@router.get("/csv")
+async def export_csv(user_id: int, start_date: str = None, end_date: str = None):
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER
-    except ImportError:
+    start_date, end_date = _default_range(start_date, end_date)
+    filename = f"relatorio_{start_date}_{end_date}.csv"
+    # Gerador síncrono: o Starlette itera-o numa threadpool, sem bloquear o event loop
+    return StreamingResponse(
+        iter_csv(user_id, start_date, end_date),
+        media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def _data_version(user_id: int, start_date: str, end_date: str) -> str:
+    """Carimbo da versão dos dados do intervalo: nº de linhas + maior id (transações só são inseridas)"""
+    resp = supabase.table('expenses').select('id', count='exact').eq('user_id', user_id).gte('date', start_date).lte('date', end_date).order('id', desc=True).limit(1).execute()
+    max_id = resp.data[0]['id'] if resp.data else 0
+    return f"{resp.count or 0}-{max_id}"
+
+def _load_report_rows(user_id: int, start_date: str, end_date: str):
+    rows = []
+    for page in iter_transaction_pages(user_id, start_date, end_date):
+        rows.extend(page)
+    return rows
+
+async def _submit_pdf_job(user_id: int, start_date: str, end_date: str):
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    if importlib.util.find_spec('reportlab') is None:
         raise HTTPException(status_code=500, detail="reportlab not installed on server.")
-        
+
+    start_date, end_date = _default_range(start_date, end_date)
+    version = await db.run(_data_version, user_id, start_date, end_date)
+    key = (user_id, start_date, end_date, version)
+    return report_jobs.submit(key, lambda: _load_report_rows(user_id, start_date, end_date))
+
+def _job_status(job: dict):
+    _, start_date, end_date, _ = job['key']
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'error': job['error'],
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+def _get_job(job_id: str, user_id: int):
+    job = report_jobs.jobs.get(job_id)
+    if not job or job['key'][0] != user_id:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return job
+
+def _pdf_response(job: dict):
+    _, start_date, end_date, _ = job['key']
+    artifact = report_jobs.cached(job['key'])
+    if artifact is None:
+        raise HTTPException(status_code=410, detail="Relatório expirou, volte a pedi-lo")
+    filename = f"relatorio_{start_date}_{end_date}.pdf"
+    return Response(
+        content=artifact,
+        media_type='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@router.post("/pdf/jobs")
+async def create_pdf_job(user_id: int, start_date: str = None, end_date: str = None):
+    """Agenda a geração do PDF em background e devolve o id do job"""
     try:
-        today = datetime.now()
-        if not start_date:
-            start_date = today.replace(day=1).strftime('%Y-%m-%d')
-        if not end_date:
-            next_month = today.replace(day=28) + timedelta(days=4)
-            end_date = (next_month - timedelta(days=next_month.day)).strftime('%Y-%m-%d')
-            
-        resp = supabase.table('expenses').select('date, amount, type, notes, categories(name)').eq('user_id', user_id).gte('date', start_date).lte('date', end_date).order('date', desc=True).execute()
-        transactions = resp.data or []
-        
-        total_income = sum(float(t['amount']) for t in transactions if t['type'] == 'income')
-        total_expense = sum(float(t['amount']) for t in transactions if t['type'] == 'expense')
-        balance = total_income - total_expense
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm, leftMargin=2*cm, rightMargin=2*cm)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Titulo
-        title_style = ParagraphStyle('title', parent=styles['Title'], fontSize=20, textColor=colors.HexColor('#0F172A'), alignment=TA_CENTER)
-        story.append(Paragraph('Relatorio Financeiro', title_style))
-        story.append(Paragraph(f'{start_date} -- {end_date}', ParagraphStyle('sub', parent=styles['Normal'], fontSize=11, textColor=colors.HexColor('#64748B'), alignment=TA_CENTER)))
-        story.append(Spacer(1, 0.5*cm))
-        
-        summary_data = [
-            ['Receitas', 'Despesas', 'Saldo'],
-            [f'EUR {total_income:,.2f}', f'EUR {total_expense:,.2f}', f'EUR {balance:,.2f}'],
-        ]
-        summary_table = Table(summary_data, colWidths=[5.5*cm, 5.5*cm, 5.5*cm])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F172A')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#F8FAFC')]),
-            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#E2E8F0')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-        ]))
-        story.append(summary_table)
-        story.append(Spacer(1, 0.5*cm))
-        
-        table_data = [['Data', 'Descricao', 'Categoria', 'Tipo', 'Valor (EUR)']]
-        for t in transactions:
-            table_data.append([
-                t['date'],
-                (t.get('notes') or '')[:35],
-                (t.get('categories') or {}).get('name', 'Outros'),
-                'Receita' if t['type'] == 'income' else 'Despesa',
-                f"{float(t['amount']):,.2f}",
-            ])
-            
-        trans_table = Table(table_data, colWidths=[2.5*cm, 6*cm, 3.5*cm, 2*cm, 2.5*cm])
-        trans_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F172A')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('ALIGN', (4, 0), (4, -1), 'RIGHT'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8FAFC')]),
-            ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#E2E8F0')),
-        ]))
-        story.append(trans_table)
-        
-        doc.build(story)
-        buffer.seek(0)
-        filename = f"relatorio_{start_date}_{end_date}.pdf"
-        return Response(
-            content=buffer.getvalue(),
-            media_type='application/pdf',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
+        job = await _submit_pdf_job(user_id, start_date, end_date)
+        return _job_status(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/pdf/jobs/{job_id}")
+async def get_pdf_job(job_id: str, user_id: int):
+    return _job_status(_get_job(job_id, user_id))
+
+@router.get("/pdf/jobs/{job_id}/download")
+async def download_pdf_job(job_id: str, user_id: int):
+    job = _get_job(job_id, user_id)
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Relatório ainda não está pronto ({job['status']})")
+    return _pdf_response(job)
+
+@router.get("/pdf")
+async def export_pdf(user_id: int, start_date: str = None, end_date: str = None):
+    """Download direto (compatibilidade): usa o mesmo job/cache e espera sem bloquear o event loop"""
+    try:
+        job = await _submit_pdf_job(user_id, start_date, end_date)
+        job = await report_jobs.wait(job['job_id'])
+        if job['status'] == 'failed':
+            raise HTTPException(status_code=500, detail=job['error'])
+        return _pdf_response(job)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
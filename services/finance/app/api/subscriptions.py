@@ -1,11 +1,24 @@
 from fastapi import APIRouter, HTTPException, Body, Depends
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 from app.utils.auth import get_current_user
 from datetime import datetime, timedelta
 from typing import List, Optional
 
 router = APIRouter()
 
+def next_billing_date(billing_day: int, today: datetime) -> datetime:
+    """Próxima data de débito de uma subscrição"""
+    try:
+        if today.day <= billing_day:
+            return today.replace(day=billing_day)
+        if today.month == 12:
+            return today.replace(year=today.year + 1, month=1, day=billing_day)
+        return today.replace(month=today.month + 1, day=billing_day)
+    except ValueError:
+        # Caso dia seja 31 e o mês só tenha 30
+        return (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
 @router.get("/")
 async def get_subscriptions(current_user: dict = Depends(get_current_user)):
     user_id = current_user['user_id']
@@ -13,26 +26,14 @@ async def get_subscriptions(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('subscriptions').select('*').eq('user_id', user_id).order('billing_day').execute()
+        response = await db.execute(supabase.table('subscriptions').select('*').eq('user_id', user_id).order('billing_day'))
         subs = response.data if response.data else []
         
         today = datetime.now()
         result = []
         for s in subs:
-            billing_day = s.get('billing_day', 1)
-            # Calcular próxima data de débito
-            try:
-                if today.day <= billing_day:
-                    next_billing = today.replace(day=billing_day)
-                else:
-                    if today.month == 12:
-                        next_billing = today.replace(year=today.year + 1, month=1, day=billing_day)
-                    else:
-                        next_billing = today.replace(month=today.month + 1, day=billing_day)
-            except ValueError:
-                # Caso dia seja 31 e o mês só tenha 30
-                next_billing = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-
+            billing_day = s.get('billing_day') or 1
+            next_billing = next_billing_date(billing_day, today)
             days_until = (next_billing.date() - today.date()).days
             
             result.append({
@@ -68,7 +69,7 @@ async def create_subscription(data: dict = Body(...), current_user: dict = Depen
             'is_active': data.get('is_active', True),
             'color': data.get('color', '#3B82F6'),
         }
-        response = supabase.table('subscriptions').insert(insert_data).execute()
+        response = await db.execute(supabase.table('subscriptions').insert(insert_data))
         if response.data:
             return {'subscription': response.data[0], 'message': 'Subscrição criada'}
         raise HTTPException(status_code=400, detail="Erro ao criar subscrição")
@@ -83,7 +84,7 @@ async def update_subscription(sub_id: int, data: dict = Body(...), current_user:
     
     try:
         # Verificar posse
-        check = supabase.table('subscriptions').select('user_id').eq('id', sub_id).execute()
+        check = await db.execute(supabase.table('subscriptions').select('user_id').eq('id', sub_id))
         if not check.data or check.data[0]['user_id'] != user_id:
             raise HTTPException(status_code=404, detail="Subscrição não encontrada")
             
@@ -96,7 +97,7 @@ async def update_subscription(sub_id: int, data: dict = Body(...), current_user:
         if 'billing_day' in data:
             update_data['billing_day'] = int(data['billing_day'])
             
-        response = supabase.table('subscriptions').update(update_data).eq('id', sub_id).execute()
+        response = await db.execute(supabase.table('subscriptions').update(update_data).eq('id', sub_id))
         return {'subscription': response.data[0]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -108,7 +109,7 @@ async def delete_subscription(sub_id: int, current_user: dict = Depends(get_curr
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        supabase.table('subscriptions').delete().eq('id', sub_id).eq('user_id', user_id).execute()
+        await db.execute(supabase.table('subscriptions').delete().eq('id', sub_id).eq('user_id', user_id))
         return {'message': 'Removida com sucesso'}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,43 @@
 from datetime import datetime, timedelta
 from app.utils.auth import get_current_user
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from app.infrastructure.supabase_client import supabase
-import os
-from google import genai
+from app.infrastructure import db
+from app.infrastructure.ledger_rollup import ledger_store
+from app.infrastructure.aggregates import category_totals
+from app.infrastructure.snapshot import user_snapshot
+from app.infrastructure.ai_cache import ai_result_cache, fingerprint
+from app.infrastructure.ai_gateway import ai_gateway
+from app.api.subscriptions import next_billing_date
+import asyncio
 
 
 router = APIRouter()
 
+def range_totals(user_id: int, start_date: str, end_date: str) -> dict:
+    """
+    Totais por tipo e categoria no intervalo: {'income': {cat: total}, 'expense': {cat: total}}.
+    Usa o rollup em memória se já estiver carregado; senão agrega na base de dados
+    (uma linha por categoria) e, se a função SQL não existir, faz o backfill do rollup.
+    """
+    ledger = ledger_store.peek(user_id)
+    if ledger is None:
+        try:
+            return category_totals(user_id, start_date, end_date)
+        except Exception:
+            ledger = ledger_store.get(user_id)
+    return {t: ledger.totals_by_category(t, start_date, end_date) for t in ('income', 'expense')}
+
+MAX_PROXIMOS_PAGAMENTOS = 5
+
+def _latest_transactions(user_id: int, start_date: str, end_date: str):
+    resp = supabase.table('expenses').select('id, notes, amount, type, date').eq('user_id', user_id).gte('date', start_date).lte('date', end_date).order('date', desc=True).order('id', desc=True).limit(10).execute()
+    return resp.data or []
+
+def _active_subscriptions(user_id: int):
+    resp = supabase.table('subscriptions').select('id, name, amount, billing_day, category').eq('user_id', user_id).eq('is_active', True).execute()
+    return resp.data or []
+
 @router.get("/")
 async def get_activity_summary(
     start_date: str = None, 
@@ -27,20 +57,21 @@ async def get_activity_summary(
             next_month = today.replace(day=28) + timedelta(days=4)
             end_date = (next_month - timedelta(days=next_month.day)).strftime('%Y-%m-%d')
         
-        response = supabase.table('expenses').select('*, categories(name, colour)').eq('user_id', user_id).gte('date', start_date).lte('date', end_date).order('date', desc=True).execute()
-        transactions = response.data if response.data else []
-        
-        total_income = sum(float(t['amount']) for t in transactions if t['type'] == 'income')
-        total_expense = sum(float(t['amount']) for t in transactions if t['type'] == 'expense')
+        # Agregado mínimo, últimas 10 transações e subscrições ativas em paralelo
+        totals, latest, subscriptions = await asyncio.gather(
+            db.run(range_totals, user_id, start_date, end_date),
+            db.run(_latest_transactions, user_id, start_date, end_date),
+            db.run(_active_subscriptions, user_id),
+        )
+        total_income = sum(totals['income'].values())
+        total_expense = sum(totals['expense'].values())
         balance = total_income - total_expense
         
-        expenses_by_category = {}
-        for t in transactions:
-            if t['type'] == 'expense' and t.get('categories'):
-                cat_name = t['categories']['name']
-                if cat_name not in expenses_by_category:
-                    expenses_by_category[cat_name] = {'valor': 0, 'categoria': cat_name}
-                expenses_by_category[cat_name]['valor'] += float(t['amount'])
+        expenses_by_category = {
+            cat_name: {'valor': valor, 'categoria': cat_name}
+            for cat_name, valor in totals['expense'].items()
+            if cat_name is not None
+        }
         
         total_expense_for_percent = total_expense if total_expense > 0 else 1
         despesas_por_categoria = [
@@ -54,7 +85,7 @@ async def get_activity_summary(
         despesas_por_categoria.sort(key=lambda x: x['valor'], reverse=True)
         
         ultimas_transacoes = []
-        for t in transactions[:10]:
+        for t in latest:
             ultimas_transacoes.append({
                 'id': t['id'],
                 'descricao': t.get('notes', 'Sem descricao') or 'Sem descricao',
@@ -63,72 +94,155 @@ async def get_activity_summary(
                 'data': t['date']
             })
         
+        proximos_pagamentos = []
+        for sub in subscriptions:
+            next_billing = next_billing_date(sub.get('billing_day') or 1, today)
+            proximos_pagamentos.append({
+                'id': sub['id'],
+                'descricao': sub['name'],
+                'valor': float(sub['amount']),
+                'categoria': sub.get('category', 'Serviços'),
+                'data': next_billing.strftime('%Y-%m-%d'),
+                'diasRestantes': (next_billing.date() - today.date()).days
+            })
+        proximos_pagamentos.sort(key=lambda p: p['diasRestantes'])
+        
         return {
             'saldoAtual': balance,
             'despesasMes': total_expense,
             'receitasMes': total_income,
-            'proximosPagamentos': [],
+            'proximosPagamentos': proximos_pagamentos[:MAX_PROXIMOS_PAGAMENTOS],
             'despesasPorCategoria': despesas_por_categoria,
             'ultimasTransacoes': ultimas_transacoes
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MONTHLY_PAGE_SIZE = 1000
+
+def _last_months(months: int):
+    """Lista de chaves YYYY-MM dos últimos N meses (inclui o mês atual), da mais antiga para a mais recente"""
+    today = datetime.now()
+    keys = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        keys.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(keys))
+
+def _monthly_totals_fallback(user_id: int, start_date: str):
+    """Agrega em Python, paginando só as colunas necessárias (se a função SQL não existir)"""
+    totals = {}
+    offset = 0
+    while True:
+        resp = supabase.table('expenses').select('date, type, amount').eq('user_id', user_id).gte('date', start_date).order('id').range(offset, offset + MONTHLY_PAGE_SIZE - 1).execute()
+        rows = resp.data or []
+        for t in rows:
+            bucket = totals.setdefault(t['date'][:7], {'income': 0.0, 'expense': 0.0})
+            if t['type'] in bucket:
+                bucket[t['type']] += float(t['amount'])
+        if len(rows) < MONTHLY_PAGE_SIZE:
+            return totals
+        offset += MONTHLY_PAGE_SIZE
+
+@router.get("/monthly")
+async def get_monthly_balance(months: int = 6, current_user: dict = Depends(get_current_user)):
+    """Série mensal de receitas, despesas e saldo dos últimos N meses (agregada no servidor)"""
+    user_id = current_user['user_id']
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    if months < 1 or months > 60:
+        raise HTTPException(status_code=400, detail="months deve estar entre 1 e 60")
+
+    try:
+        keys = _last_months(months)
+        start_date = f"{keys[0]}-01"
+
+        try:
+            resp = await db.execute(supabase.rpc('monthly_balance', {'p_user_id': user_id, 'p_start': start_date}))
+            totals = {r['month']: {'income': float(r['income']), 'expense': float(r['expense'])} for r in (resp.data or [])}
+        except Exception:
+            totals = await db.run(_monthly_totals_fallback, user_id, start_date)
+
+        series = []
+        for key in keys:
+            bucket = totals.get(key, {'income': 0.0, 'expense': 0.0})
+            series.append({
+                'month': key,
+                'income': round(bucket['income'], 2),
+                'expense': round(bucket['expense'], 2),
+                'balance': round(bucket['income'] - bucket['expense'], 2)
+            })
+        return {'months': series}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def compute_health(snapshot: dict) -> dict:
+    """Métricas de saúde financeira a partir do snapshot do utilizador"""
+    income = snapshot['income']
+    expense = snapshot['expense']
+    investments_total = sum(float(i.get('quantity', 0)) * float(i.get('last_price', 0)) for i in snapshot['investments'])
+    fundo_emergencia = sum(float(g.get('current_amount', 0)) for g in snapshot['goals'])
+    
+    taxa_poupanca = ((income - expense) / income * 100) if income > 0 else 0
+    meses_reserva = fundo_emergencia / (expense / 12) if expense > 0 else 12 if fundo_emergencia > 0 else 0
+    
+    health_score = 50
+    health_score += min(25, taxa_poupanca) if taxa_poupanca > 0 else -10
+    health_score += min(25, meses_reserva * 4)
+    
+    return {
+        'healthScore': round(max(0, min(100, health_score))),
+        'metrics': {
+            'rendaMensal': income,
+            'despesasMensais': expense,
+            'poupancaMensal': income - expense,
+            'fundoEmergencia': fundo_emergencia,
+            'dividas': 0,
+            'investimentos': investments_total
+        },
+        'taxaPoupanca': round(taxa_poupanca, 1),
+        'mesesFundoEmergencia': round(meses_reserva, 1),
+        'taxaEndividamento': 0
+    }
+
 @router.get("/health")
-async def get_financial_health(current_user: dict = Depends(get_current_user)):
+async def get_financial_health(request: Request, current_user: dict = Depends(get_current_user)):
     """Calcula metricas de saude financeira completas"""
     user_id = current_user['user_id']
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('expenses').select('type, amount').eq('user_id', user_id).execute()
-        trx = response.data if response.data else []
-        income = sum(float(t['amount']) for t in trx if t['type'] == 'income')
-        expense = sum(float(t['amount']) for t in trx if t['type'] == 'expense')
-        
-        inv_resp = supabase.table('investments').select('quantity, last_price').eq('user_id', user_id).execute()
-        investments_total = sum(float(i.get('quantity', 0)) * float(i.get('last_price', 0)) for i in (inv_resp.data or []))
-        
-        goals_resp = supabase.table('savings_goals').select('current_amount').eq('user_id', user_id).execute()
-        fundo_emergencia = sum(float(g.get('current_amount', 0)) for g in (goals_resp.data or []))
-        
-        taxa_poupanca = ((income - expense) / income * 100) if income > 0 else 0
-        meses_reserva = fundo_emergencia / (expense / 12) if expense > 0 else 12 if fundo_emergencia > 0 else 0
-        
-        health_score = 50
-        health_score += min(25, taxa_poupanca) if taxa_poupanca > 0 else -10
-        health_score += min(25, meses_reserva * 4)
-        
-        return {
-            'healthScore': round(max(0, min(100, health_score))),
-            'metrics': {
-                'rendaMensal': income,
-                'despesasMensais': expense,
-                'poupancaMensal': income - expense,
-                'fundoEmergencia': fundo_emergencia,
-                'dividas': 0,
-                'investimentos': investments_total
-            },
-            'taxaPoupanca': round(taxa_poupanca, 1),
-            'mesesFundoEmergencia': round(meses_reserva, 1),
-            'taxaEndividamento': 0
-        }
+        return compute_health(await user_snapshot(request, user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/analysis")
-async def get_ai_analysis(current_user: dict = Depends(get_current_user)):
+async def get_ai_analysis(request: Request, current_user: dict = Depends(get_current_user)):
     """Gera um relatório de análise financeira usando IA (Gemini)"""
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
+    if not ai_gateway.available:
         return {"analysis": "Configure a sua chave de API para receber análises de IA personalizadas."}
     
     try:
-        health_data = await get_financial_health(current_user)
+        health_data = compute_health(await user_snapshot(request, current_user['user_id']))
         metrics = health_data['metrics']
         
+        cache_key = fingerprint(
+            'analysis',
+            renda=metrics['rendaMensal'],
+            despesas=metrics['despesasMensais'],
+            fundo=metrics['fundoEmergencia'],
+            investimentos=metrics['investimentos'],
+            score=health_data['healthScore'],
+        )
+        cached = ai_result_cache.get(cache_key)
+        if cached is not None:
+            return {"analysis": cached, "cached": True}
+        
         prompt = f"""
         Como coach financeiro, analisa estes dados de um utilizador:
         - Rendimento: {metrics['rendaMensal']} EUR
@@ -141,26 +255,32 @@ async def get_ai_analysis(current_user: dict = Depends(get_current_user)):
         Sê encorajador e prático. Usa texto simples.
         """
         
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        return {"analysis": response.text}
+        text = await ai_gateway.generate(prompt)
+        ai_result_cache.set(cache_key, text)
+        return {"analysis": text}
     except Exception as e:
         return {"analysis": "Parabéns por acompanhares as tuas finanças! Continua a registar os teus gastos para uma análise mais profunda."}
 
 @router.get("/insights")
-async def get_smart_insights(current_user: dict = Depends(get_current_user)):
+async def get_smart_insights(request: Request, current_user: dict = Depends(get_current_user)):
     """Gera previsões e insights profundos (Smart Insights)"""
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
+    if not ai_gateway.available:
         return {"insights": [], "suggestion": "Ativa a IA para veres o teu futuro financeiro."}
     
     try:
-        health_data = await get_financial_health(current_user)
+        health_data = compute_health(await user_snapshot(request, current_user['user_id']))
         metrics = health_data['metrics']
         
+        cache_key = fingerprint(
+            'insights',
+            saldo=metrics['rendaMensal'] - metrics['despesasMensais'],
+            investimentos=metrics['investimentos'],
+            fundo=metrics['fundoEmergencia'],
+        )
+        cached = ai_result_cache.get(cache_key)
+        if cached is not None:
+            return {"insights": cached, "cached": True}
+        
         prompt = f"""
         Como analista financeiro preditivo, olha para estes dados:
         - Saldo: {metrics['rendaMensal'] - metrics['despesasMensais']} EUR/mês
@@ -176,21 +296,18 @@ async def get_smart_insights(current_user: dict = Depends(get_current_user)):
         Responde APENAS o JSON, sem markdown.
         """
         
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
+        text = await ai_gateway.generate(prompt)
         
         # Parse JSON from response
         import json, re
-        text = response.text.strip()
+        text = text.strip()
         # Find JSON array using regex
         json_match = re.search(r'\[.*\]', text, re.DOTALL)
         if json_match:
             text = json_match.group(0)
         
         insights = json.loads(text)
+        ai_result_cache.set(cache_key, insights)
         return {"insights": insights}
     except Exception as e:
         print(f"Insights Error: {e}")
@@ -199,3 +316,8 @@ async def get_smart_insights(current_user: dict = Depends(get_current_user)):
             {"title": "Poder de Investimento", "value": "Equilibrado", "desc": "Tens margem para reforçar o teu PPR ou fundo de índice."},
             {"title": "Score de Liberdade", "value": "12%", "desc": "Estás no caminho certo. Continua a poupar 20% do teu rendimento."}
         ]}
+
+@router.get("/ai-cache/stats")
+async def get_ai_cache_stats():
+    """Contadores de hits/misses da cache de análise e insights e estado do gateway de IA"""
+    return {**ai_result_cache.stats(), 'gateway': ai_gateway.stats()}
@@ -1,16 +1,26 @@
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 from app.infrastructure.messaging import publish_event
+from app.infrastructure.ledger_rollup import ledger_store
+from app.infrastructure.budget_tracker import budget_tracker, UNCATEGORIZED
 from app.utils.auth import get_current_user
-from fastapi import APIRouter, HTTPException, Query, Depends
+from app.utils.pagination import apply_keyset, encode_cursor
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from typing import Optional
+from datetime import date, datetime
+import csv
+import io
+import json
+import math
 
 router = APIRouter()
 
 @router.get("/")
 async def get_transactions(
-    limit: int = 50, 
+    limit: int = Query(50, ge=1, le=500), 
     start_date: Optional[str] = None, 
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     user_id = current_user['user_id']
@@ -18,18 +28,45 @@ async def get_transactions(
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        query = supabase.table('expenses').select('*, categories(name, colour)').eq('user_id', user_id).order('date', desc=True).limit(limit)
+        query = supabase.table('expenses').select('*, categories(name, colour)').eq('user_id', user_id)
         
         if start_date:
             query = query.gte('date', start_date)
         if end_date:
             query = query.lte('date', end_date)
         
-        response = query.execute()
-        return {"transactions": response.data}
+        # Pedir uma linha a mais para saber se existe página seguinte
+        response = await db.execute(apply_keyset(query, cursor).limit(limit + 1))
+        rows = response.data or []
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return {"transactions": rows[:limit], "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+XP_PER_TRANSACTION = 15
+BULK_MAX_ROWS = 10000
+BULK_BATCH_SIZE = 500
+BULK_TYPES = {'despesa': 'expense', 'expense': 'expense', 'receita': 'income', 'income': 'income'}
+
+def check_budget(user_id: int, month: str, category: str = None):
+    """Publica budget_exceeded se a despesa da categoria no mês (YYYY-MM) ultrapassar o orçamento"""
+    try:
+        result = budget_tracker.exceeded(user_id, month, category)
+        if result:
+            budget_limit, total_spent = result
+            publish_event("budget_exceeded", {
+                "user_id": user_id, 
+                "month": month, 
+                "category": category or UNCATEGORIZED,
+                "limit": budget_limit, 
+                "spent": round(total_spent, 2)
+            })
+    except Exception as e:
+        # A transação já está gravada: uma falha aqui não deve falhar o pedido
+        print(f"Erro ao verificar orçamento {month}/{category}: {e}")
+
 @router.post("/")
 async def add_transaction(data: dict, current_user: dict = Depends(get_current_user)):
     user_id = current_user['user_id']
@@ -44,7 +81,7 @@ async def add_transaction(data: dict, current_user: dict = Depends(get_current_u
         category_id = None
         if data.get('categoria'):
             try:
-                cat_resp = supabase.table('categories').select('id').eq('name', data.get('categoria')).eq('user_id', user_id).limit(1).execute()
+                cat_resp = await db.execute(supabase.table('categories').select('id').eq('name', data.get('categoria')).eq('user_id', user_id).limit(1))
                 if cat_resp.data:
                     category_id = cat_resp.data[0]['id']
             except:
@@ -64,29 +101,17 @@ async def add_transaction(data: dict, current_user: dict = Depends(get_current_u
             transaction_data['category_id'] = category_id
 
         
-        response = supabase.table('expenses').insert(transaction_data).execute()
+        response = await db.execute(supabase.table('expenses').insert(transaction_data))
         
         if response.data:
-            # Check Budget
+            # Atualizar o rollup diário (totais por dia/categoria)
+            category_name = data.get('categoria') if category_id is not None else None
+            ledger_store.record(user_id, data['data'], transaction_type, float(data['valor']), category_name)
+
+            # Check Budget (total corrente da categoria no mês)
             if transaction_type == 'expense':
-                try:
-                    month = data['data'][:7] # YYYY-MM
-                    # Get budget
-                    b_resp = supabase.table('budgets').select('amount, category').eq('user_id', user_id).eq('month', month).execute()
-                    # (This is simplified, should really check category too if provided)
-                    if b_resp.data:
-                        # Simple check: check total expenses for month
-                        e_resp = supabase.table('expenses').select('amount').eq('user_id', user_id).eq('type', 'expense').gte('date', f"{month}-01").execute()
-                        total_spent = sum(float(e['amount']) for e in (e_resp.data or []))
-                        budget_limit = float(b_resp.data[0]['amount'])
-                        if total_spent > budget_limit:
-                            publish_event("budget_exceeded", {
-                                "user_id": user_id, 
-                                "month": month, 
-                                "limit": budget_limit, 
-                                "spent": total_spent
-                            })
-                except: pass
+                budget_tracker.record(user_id, data['data'][:7], category_name, float(data['valor']))
+                await db.run(check_budget, user_id, data['data'][:7], category_name)
 
             # Publicar evento assincrono
             publish_event("transaction_created", {"user_id": user_id, "amount": float(data['valor']), "type": transaction_type})
@@ -94,7 +119,7 @@ async def add_transaction(data: dict, current_user: dict = Depends(get_current_u
             # God-Tier: Recompensa XP/Gamification
             try:
                 # Evento interno para o Identity atribuir XP
-                publish_event("gain_xp", {"user_id": user_id, "xp": 15})
+                publish_event("gain_xp", {"user_id": user_id, "xp": XP_PER_TRANSACTION})
             except: pass
             
             return {"transaction": response.data[0], "message": "Transacao adicionada"}
@@ -102,3 +127,122 @@ async def add_transaction(data: dict, current_user: dict = Depends(get_current_u
         raise HTTPException(status_code=400, detail="Failed to create transaction")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def _parse_bulk_rows(body: bytes, content_type: str):
+    """Aceita JSON (lista ou {"transactions": [...]}) ou CSV com as colunas data;tipo;valor;categoria;descricao;moeda"""
+    if 'csv' in content_type or 'text/plain' in content_type:
+        text = body.decode('utf-8-sig')
+        delimiter = ';' if text.split('\n', 1)[0].count(';') >= text.split('\n', 1)[0].count(',') else ','
+        return [{(k or '').strip().lower(): (v or '').strip() for k, v in row.items()} for row in csv.DictReader(io.StringIO(text), delimiter=delimiter)]
+    payload = json.loads(body or b'[]')
+    if isinstance(payload, dict):
+        payload = payload.get('transactions', [])
+    if not isinstance(payload, list):
+        raise ValueError("Esperada uma lista de transações")
+    return payload
+
+def _bulk_row(user_id: int, data: dict, category_ids: dict) -> dict:
+    """Valida uma linha da importação; lança ValueError com o motivo se for inválida"""
+    if not isinstance(data, dict):
+        raise ValueError("Linha não é um objeto")
+    tipo = str(data.get('tipo') or '').strip().lower()
+    if tipo not in BULK_TYPES:
+        raise ValueError(f"Tipo inválido: {data.get('tipo')!r} (esperado 'despesa' ou 'receita')")
+    when = str(data.get('data') or '').strip()
+    try:
+        date.fromisoformat(when)
+    except ValueError:
+        try:
+            datetime.fromisoformat(when)
+        except ValueError:
+            raise ValueError(f"Data inválida: {data.get('data')!r} (esperado AAAA-MM-DD)")
+    amount = float(str(data['valor']).replace(',', '.'))
+    if not math.isfinite(amount):
+        raise ValueError(f"Valor inválido: {data['valor']!r}")
+    transaction_data = {
+        'user_id': user_id,
+        'type': BULK_TYPES[tipo],
+        'amount': amount,
+        'currency': data.get('moeda') or 'EUR',
+        'date': when,
+        'notes': data.get('descricao', '') or data.get('notas', ''),
+    }
+    category_id = category_ids.get(data.get('categoria'))
+    if category_id is not None:
+        transaction_data['category_id'] = category_id
+    return transaction_data
+
+@router.post("/bulk")
+async def bulk_add_transactions(request: Request, current_user: dict = Depends(get_current_user)):
+    """Importa milhares de transações (JSON ou CSV) com inserts em lote e um único evento"""
+    user_id = current_user['user_id']
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+
+    try:
+        rows = _parse_bulk_rows(await request.body(), request.headers.get('content-type', ''))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Nenhuma transação enviada")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {BULK_MAX_ROWS} transações por pedido")
+
+    try:
+        # Um único pedido para todas as categorias do utilizador
+        cat_resp = await db.execute(supabase.table('categories').select('id, name').eq('user_id', user_id))
+        category_ids = {c['name']: c['id'] for c in (cat_resp.data or [])}
+
+        to_insert = []
+        row_numbers = []
+        errors = []
+        for index, data in enumerate(rows):
+            try:
+                to_insert.append(_bulk_row(user_id, data, category_ids))
+                row_numbers.append(index)
+            except KeyError as e:
+                errors.append({'row': index, 'error': f"Campo em falta: {e}"})
+            except (TypeError, ValueError) as e:
+                errors.append({'row': index, 'error': str(e)})
+
+        id_to_category = {v: k for k, v in category_ids.items()}
+        inserted = 0
+        failed_batches = []
+        affected = set()
+        income = expense = 0.0
+        for i in range(0, len(to_insert), BULK_BATCH_SIZE):
+            batch = to_insert[i:i + BULK_BATCH_SIZE]
+            try:
+                response = await db.execute(supabase.table('expenses').insert(batch))
+            except Exception as e:
+                # Os lotes anteriores já estão gravados: reportar este e seguir com os restantes
+                failed_batches.append({'from_row': row_numbers[i], 'to_row': row_numbers[i + len(batch) - 1], 'count': len(batch), 'error': str(e)})
+                continue
+            for t in (response.data or batch):
+                category_name = id_to_category.get(t.get('category_id'))
+                ledger_store.record(user_id, t['date'], t['type'], float(t['amount']), category_name)
+                if t['type'] == 'expense':
+                    expense += float(t['amount'])
+                    budget_tracker.record(user_id, t['date'][:7], category_name, float(t['amount']))
+                    affected.add((t['date'][:7], category_name))
+                else:
+                    income += float(t['amount'])
+            inserted += len(batch)
+
+        # Orçamentos avaliados uma vez por (mês, categoria) afetado
+        for month, category_name in sorted(affected, key=lambda k: (k[0], k[1] or '')):
+            await db.run(check_budget, user_id, month, category_name)
+
+        if inserted:
+            publish_event("transactions_imported", {
+                "user_id": user_id,
+                "count": inserted,
+                "income": round(income, 2),
+                "expense": round(expense, 2),
+                "xp": XP_PER_TRANSACTION * inserted
+            })
+
+        return {"inserted": inserted, "errors": errors, "failed_batches": failed_batches,
+                "message": f"{inserted} transacoes importadas" + (f", {sum(b['count'] for b in failed_batches)} por gravar" if failed_batches else "")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,40 @@
+"""
+Agregações executadas na base de dados (funções SQL em sql/category_totals.sql e
+sql/daily_ledger_totals.sql).
+
+Cada função devolve uma linha por grupo em vez das transações em bruto. Se a função
+ainda não existir na base de dados, o pedido lança exceção e quem chama usa o
+caminho em processo (ledger_rollup / budget_tracker).
+"""
+from app.infrastructure.supabase_client import supabase
+
+RPC_PAGE_SIZE = 1000
+
+
+def category_totals(user_id: int, start_date: str, end_date: str) -> dict:
+    """Totais por tipo e categoria: {'income': {cat: total}, 'expense': {cat: total}} (cat None = sem categoria)"""
+    resp = supabase.rpc('category_totals', {'p_user_id': user_id, 'p_start': start_date[:10], 'p_end': end_date[:10]}).execute()
+    totals = {'income': {}, 'expense': {}}
+    for row in (resp.data or []):
+        if row['type'] in totals:
+            totals[row['type']][row['category']] = float(row['total'])
+    return totals
+
+
+def daily_category_totals(user_id: int) -> list:
+    """Linhas (day, type, category, total) de todo o histórico do utilizador (tabela daily_ledger_totals)"""
+    rows = []
+    offset = 0
+    while True:
+        resp = supabase.rpc('daily_category_totals', {'p_user_id': user_id}).order('day').order('type').order('category').range(offset, offset + RPC_PAGE_SIZE - 1).execute()
+        page = resp.data or []
+        rows.extend(page)
+        if len(page) < RPC_PAGE_SIZE:
+            return rows
+        offset += RPC_PAGE_SIZE
+
+
+def rebuild_daily_totals(user_id: int = None) -> int:
+    """Recalcula daily_ledger_totals a partir de `expenses` (um utilizador ou todos). Devolve o número de utilizadores."""
+    resp = supabase.rpc('rebuild_daily_ledger_totals', {'p_user_id': user_id}).execute()
+    return int(resp.data or 0)
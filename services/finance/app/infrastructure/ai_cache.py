@@ -0,0 +1,70 @@
+"""
+Cache de resultados da IA (análise e insights) indexada pela impressão digital dos dados do prompt.
+
+Os prompts de /summary/analysis e /summary/insights dependem só de meia dúzia de números,
+por isso um utilizador cujos números não mudaram recebe a resposta guardada sem nova
+chamada ao Gemini. Entradas expiram por TTL e, com a cache cheia, sai a menos usada (LRU).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', '1024'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(6 * 3600)))
+
+
+def fingerprint(kind: str, **inputs) -> str:
+    """Hash estável do tipo de prompt e dos valores que o alimentam (arredondados ao cêntimo)"""
+    normalized = {k: round(v, 2) if isinstance(v, float) else v for k, v in inputs.items()}
+    raw = json.dumps([kind, normalized], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AIResultCache:
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: int = AI_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hitRate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+ai_result_cache = AIResultCache()
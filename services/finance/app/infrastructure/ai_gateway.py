@@ -0,0 +1,245 @@
+"""
+Gateway único para chamadas ao modelo de IA do Finance Service.
+
+- Um cliente de longa duração por processo (em vez de um `genai.Client` por pedido).
+- As chamadas correm fora do event loop, num pool próprio.
+- Limite de chamadas concorrentes (AI_MAX_CONCURRENCY) e prazo por chamada (AI_TIMEOUT).
+- Prompts idênticos em curso são agregados (single-flight): só um vai ao modelo.
+
+O backend é escolhido por AI_BACKEND: `gemini` (por omissão, requer GOOGLE_API_KEY) ou
+`stub`, um backend local determinístico para testar latência e throughput sem rede.
+
+    text = await ai_gateway.generate(prompt)
+    text = await ai_gateway.generate(messages, system_instruction=..., temperature=0.7)
+    async for chunk in ai_gateway.stream(messages, system_instruction=...):
+        ...
+
+`messages` é uma lista de {'role': 'user' | 'model', 'text': ...}.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+AI_MODEL = os.getenv('AI_MODEL', 'gemini-2.5-flash')
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '8'))
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', '30'))
+
+
+class GeminiBackend:
+    name = 'gemini'
+
+    def __init__(self, api_key: str = None, model: str = AI_MODEL):
+        self._api_key = api_key
+        self.model = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def api_key(self):
+        # Lida no primeiro uso: o .env é carregado por supabase_client ao arrancar
+        return self._api_key or os.getenv('GOOGLE_API_KEY')
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+            return self._client
+
+    def generate(self, contents, system_instruction: str = None, temperature: float = None) -> str:
+        client = self._get_client()
+        response = client.models.generate_content(model=self.model, **self._request(contents, system_instruction, temperature))
+        return response.text
+
+    def generate_stream(self, contents, system_instruction: str = None, temperature: float = None):
+        """Gerador síncrono com os pedaços de texto à medida que o modelo os produz"""
+        client = self._get_client()
+        for chunk in client.models.generate_content_stream(model=self.model, **self._request(contents, system_instruction, temperature)):
+            if chunk.text:
+                yield chunk.text
+
+    def _request(self, contents, system_instruction, temperature) -> dict:
+        from google import genai
+
+        if isinstance(contents, list):
+            contents = [
+                genai.types.Content(role=m['role'], parts=[genai.types.Part(text=m['text'])])
+                for m in contents
+            ]
+        config = None
+        if system_instruction is not None or temperature is not None:
+            config = genai.types.GenerateContentConfig(system_instruction=system_instruction, temperature=temperature)
+        return {'contents': contents, 'config': config}
+
+
+class StubBackend:
+    """Backend local: resposta determinística derivada do prompt, com latência configurável"""
+    name = 'stub'
+    available = True
+
+    def __init__(self, latency: float = None):
+        self.latency = float(os.getenv('AI_STUB_LATENCY', '0.05')) if latency is None else latency
+        self.calls = 0
+
+    def generate(self, contents, system_instruction: str = None, temperature: float = None) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._answer(contents, system_instruction, temperature)
+
+    def generate_stream(self, contents, system_instruction: str = None, temperature: float = None):
+        """A mesma resposta de `generate`, palavra a palavra, com a latência repartida pelos pedaços"""
+        self.calls += 1
+        words = self._answer(contents, system_instruction, temperature).split(' ')
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield word if i == 0 else ' ' + word
+
+    def _answer(self, contents, system_instruction, temperature) -> str:
+        digest = hashlib.sha256(_prompt_key(contents, system_instruction, temperature).encode('utf-8')).hexdigest()[:8]
+        if isinstance(contents, str) and 'JSON' in contents:
+            return json.dumps([
+                {"title": "Projeção 6 Meses", "value": "EUR 0", "desc": f"stub {digest}"},
+                {"title": "Poder de Investimento", "value": "Médio", "desc": f"stub {digest}"},
+                {"title": "Score de Liberdade", "value": "0%", "desc": f"stub {digest}"},
+            ])
+        return f"Resposta de teste ({digest})."
+
+
+def _prompt_key(contents, system_instruction, temperature) -> str:
+    return json.dumps([contents, system_instruction, temperature], sort_keys=True, ensure_ascii=False)
+
+
+class AIGateway:
+    def __init__(self, backend, max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_TIMEOUT):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai')
+        self._semaphore = None
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return self.backend.available
+
+    def _get_semaphore(self):
+        # Criado no primeiro uso para ficar ligado ao event loop que o usa
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def generate(self, contents, system_instruction: str = None, temperature: float = None) -> str:
+        key = hashlib.sha256(_prompt_key(contents, system_instruction, temperature).encode('utf-8')).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(contents, system_instruction, temperature))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: se um dos pedidos for cancelado, os restantes continuam à espera do mesmo resultado
+        return await asyncio.shield(task)
+
+    async def _call(self, contents, system_instruction, temperature) -> str:
+        # O prazo inclui o tempo à espera de vaga no semáforo
+        try:
+            return await asyncio.wait_for(self._run(contents, system_instruction, temperature), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def stream(self, contents, system_instruction: str = None, temperature: float = None):
+        """
+        Gerador assíncrono com os pedaços da resposta. Sem single-flight (cada cliente precisa
+        de todos os pedaços); o prazo AI_TIMEOUT aplica-se à espera por cada pedaço, incluindo o
+        primeiro (e, portanto, a espera por vaga no semáforo).
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.backend.generate_stream(contents, system_instruction, temperature):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                # A vaga só é devolvida quando a chamada ao modelo termina mesmo, não quando o
+                # cliente desiste: senão as chamadas reais podiam ultrapassar max_concurrency
+                loop.call_soon_threadsafe(semaphore.release)
+
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        self.calls += 1
+        try:
+            loop.run_in_executor(self._executor, produce)
+        except BaseException:
+            semaphore.release()
+            raise
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    self.errors += 1
+                    raise item
+                yield item
+        finally:
+            # Cliente desligado ou prazo esgotado: o produtor pára no próximo pedaço (e liberta a vaga)
+            stop.set()
+
+    async def _run(self, contents, system_instruction, temperature) -> str:
+        async with self._get_semaphore():
+            self.calls += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.backend.generate, contents, system_instruction, temperature)
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.backend.name,
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'inflight': len(self._inflight),
+            'maxConcurrency': self.max_concurrency,
+            'timeout': self.timeout,
+        }
+
+
+def _default_backend():
+    if os.getenv('AI_BACKEND', 'gemini') == 'stub':
+        return StubBackend()
+    return GeminiBackend()
+
+
+ai_gateway = AIGateway(_default_backend())
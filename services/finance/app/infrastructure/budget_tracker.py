@@ -0,0 +1,129 @@
+"""
+Totais de despesa por (utilizador, mês, categoria) mantidos incrementalmente.
+
+Cada mês é carregado uma vez (do rollup diário se já estiver em memória, senão de
+uma agregação por categoria feita na base de dados) e depois atualizado por `record()`
+a cada nova despesa, por isso verificar se um orçamento foi excedido é uma leitura de
+dicionário em vez de um novo varrimento do mês.
+
+Cada mês carregado expira ao fim de BUDGET_CACHE_TTL segundos (alterações feitas por outra
+instância ou diretamente na base de dados) e é descartado por `invalidate()` quando um
+orçamento é criado, alterado ou apagado.
+"""
+import calendar
+import os
+import threading
+import time
+
+from app.infrastructure.supabase_client import supabase
+from app.infrastructure.ledger_rollup import ledger_store
+from app.infrastructure.aggregates import category_totals
+
+UNCATEGORIZED = 'Outros'
+BUDGET_CACHE_TTL = float(os.getenv('BUDGET_CACHE_TTL', '60'))
+
+
+def month_bounds(month: str):
+    year, m = map(int, month.split('-'))
+    last_day = calendar.monthrange(year, m)[1]
+    return f"{month}-01", f"{month}-{last_day:02d}"
+
+
+class BudgetTracker:
+    def __init__(self, ttl: float = BUDGET_CACHE_TTL):
+        self.ttl = ttl
+        self._spent = {}           # (user_id, month) -> (instante monotónico do carregamento, totais)
+        self._budgets = {}         # (user_id, month) -> (instante monotónico do carregamento, orçamentos)
+        self._versions = {}        # user_id -> versão, incrementada por invalidate()
+        self._lock = threading.RLock()
+
+    def _cached(self, cache: dict, key: tuple):
+        """Entrada ainda dentro do TTL, ou None. Chamar com o lock."""
+        entry = cache.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def _store(self, cache: dict, key: tuple, version: int, value: dict) -> dict:
+        """Guarda o valor carregado, a menos que o utilizador tenha sido invalidado entretanto"""
+        with self._lock:
+            current = self._cached(cache, key)
+            if current is not None:
+                return current
+            if self._versions.get(key[0], 0) == version:
+                cache[key] = (time.monotonic(), value)
+        return value
+
+    def _month_totals(self, user_id: int, month: str) -> dict:
+        key = (user_id, month)
+        with self._lock:
+            totals = self._cached(self._spent, key)
+            version = self._versions.get(user_id, 0)
+        if totals is None:
+            start_date, end_date = month_bounds(month)
+            ledger = ledger_store.peek(user_id)
+            by_category = None
+            if ledger is None:
+                try:
+                    by_category = category_totals(user_id, start_date, end_date)['expense']
+                except Exception:
+                    ledger = ledger_store.get(user_id)
+            if by_category is None:
+                by_category = ledger.totals_by_category('expense', start_date, end_date)
+            totals = {}
+            for category, amount in by_category.items():
+                name = category or UNCATEGORIZED
+                totals[name] = totals.get(name, 0.0) + amount
+            totals = self._store(self._spent, key, version, totals)
+        return totals
+
+    def spent(self, user_id: int, month: str) -> dict:
+        """Despesa acumulada por categoria no mês (cópia)"""
+        totals = self._month_totals(user_id, month)
+        with self._lock:
+            return dict(totals)
+
+    def record(self, user_id: int, month: str, category: str, amount: float):
+        """Soma uma nova despesa. Meses ainda não carregados incluem-na quando forem lidos do rollup."""
+        with self._lock:
+            totals = self._cached(self._spent, (user_id, month))
+            if totals is not None:
+                name = category or UNCATEGORIZED
+                totals[name] = totals.get(name, 0.0) + float(amount)
+
+    def _month_budgets(self, user_id: int, month: str) -> dict:
+        key = (user_id, month)
+        with self._lock:
+            budgets = self._cached(self._budgets, key)
+            version = self._versions.get(user_id, 0)
+        if budgets is None:
+            resp = supabase.table('budgets').select('*').eq('user_id', user_id).eq('month', month).execute()
+            budgets = self._store(self._budgets, key, version, {b['category']: b for b in (resp.data or [])})
+        return budgets
+
+    def budgets(self, user_id: int, month: str) -> dict:
+        """Orçamentos do mês indexados por categoria (cópia)"""
+        budgets = self._month_budgets(user_id, month)
+        with self._lock:
+            return dict(budgets)
+
+    def invalidate(self, user_id: int, month: str = None):
+        """Descarta os totais e orçamentos do utilizador (de um mês, ou de todos)"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for cache in (self._spent, self._budgets):
+                for key in [k for k in cache if k[0] == user_id and (month is None or k[1] == month)]:
+                    del cache[key]
+
+    def exceeded(self, user_id: int, month: str, category: str):
+        """Devolve (limite, gasto) se o orçamento da categoria estiver ultrapassado, senão None"""
+        name = category or UNCATEGORIZED
+        budget = self._month_budgets(user_id, month).get(name)
+        if not budget:
+            return None
+        spent = self._month_totals(user_id, month).get(name, 0.0)
+        limit = float(budget['amount'])
+        return (limit, spent) if spent > limit else None
+
+
+budget_tracker = BudgetTracker()
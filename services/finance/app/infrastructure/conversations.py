@@ -0,0 +1,254 @@
+"""
+Conversas do Financial Sensei guardadas no servidor, com resumo acumulado.
+
+O cliente envia só a nova mensagem e o `conversationId`. O histórico fica aqui: os
+turnos mais recentes são enviados ao modelo tal como estão e, quando o histórico
+ultrapassa CHAT_TOKEN_BUDGET, os turnos mais antigos são incorporados num resumo
+compacto (no máximo CHAT_SUMMARY_TOKENS). Assim o tamanho do prompt por mensagem
+fica limitado, seja qual for a duração da conversa.
+
+A compactação corre em background depois de cada resposta; a mensagem seguinte
+espera por ela só se ainda não tiver terminado. Sem modelo disponível, o resumo é
+extrativo (início de cada turno), com o mesmo limite.
+
+As conversas são gravadas na tabela `chat_conversations` (sql/chat_conversations.sql)
+depois de cada resposta e de cada compactação, e a memória do processo (TTL + LRU) serve
+de cache à frente dela: cada leitura confirma a `version` gravada, por isso outra
+instância (funções Vercel, vários workers, um reinício) continua a mesma conversa.
+Sem base de dados configurada, ficam só em memória.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.infrastructure.ai_gateway import ai_gateway
+from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
+
+CHAT_TOKEN_BUDGET = int(os.getenv('CHAT_TOKEN_BUDGET', '1500'))
+CHAT_SUMMARY_TOKENS = int(os.getenv('CHAT_SUMMARY_TOKENS', '300'))
+CHAT_MIN_RECENT_TURNS = 2
+CHAT_MAX_CONVERSATIONS = int(os.getenv('CHAT_MAX_CONVERSATIONS', '5000'))
+CHAT_CONVERSATION_TTL = int(os.getenv('CHAT_CONVERSATION_TTL', str(24 * 3600)))
+CONVERSATIONS_TABLE = 'chat_conversations'
+
+SUMMARY_PROMPT = """Atualiza o resumo de uma conversa entre um utilizador e o seu consultor financeiro.
+Mantém factos, números, objetivos e decisões do utilizador; omite cumprimentos e repetições.
+Responde só com o novo resumo, em Português de Portugal, com no máximo {max_words} palavras.
+
+RESUMO ATUAL:
+{summary}
+
+NOVOS TURNOS:
+{turns}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata (~4 caracteres por token), suficiente para impor um orçamento"""
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def _format_turns(turns: list) -> str:
+    return "\n".join(f"{'Utilizador' if t['role'] == 'user' else 'Sensei'}: {t['text']}" for t in turns)
+
+
+class Conversation:
+    def __init__(self, user_id: int, conversation_id: str = None):
+        self.id = conversation_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.summary = ''
+        self.turns = []
+        self.updated_at = time.time()
+        self.version = 0           # incrementada a cada gravação
+        self._compaction = None
+        self._compact_lock = asyncio.Lock()
+
+    @classmethod
+    def from_row(cls, row: dict):
+        conversation = cls(row['user_id'], row['id'])
+        conversation.summary = row.get('summary') or ''
+        conversation.turns = list(row.get('turns') or [])
+        conversation.updated_at = float(row['updated_at'])
+        conversation.version = int(row['version'])
+        return conversation
+
+    def to_row(self) -> dict:
+        """Linha de chat_conversations com a próxima versão (copiada no event loop, gravada numa thread)"""
+        self.version += 1
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'summary': self.summary,
+            'turns': list(self.turns),
+            'updated_at': self.updated_at,
+            'version': self.version,
+        }
+
+    async def save(self):
+        try:
+            await db.run(conversation_store.persist, self.to_row())
+        except Exception as e:
+            print(f"Erro ao gravar conversa {self.id}: {e}")
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(t['text']) for t in self.turns)
+
+    def add(self, role: str, text: str):
+        self.turns.append({'role': role, 'text': text})
+        self.updated_at = time.time()
+
+    def messages(self, user_message: str) -> list:
+        """Turnos recentes + nova mensagem, no formato do gateway de IA (o resumo vai na instrução de sistema)"""
+        return [*self.turns, {'role': 'user', 'text': user_message}]
+
+    def _fold_count(self) -> int:
+        """Quantos turnos antigos passar para o resumo para voltar a caber no orçamento"""
+        excess = self.tokens() - CHAT_TOKEN_BUDGET
+        count = 0
+        while excess > 0 and len(self.turns) - count > CHAT_MIN_RECENT_TURNS:
+            excess -= estimate_tokens(self.turns[count]['text'])
+            count += 1
+        return count
+
+    async def compact(self):
+        # Uma compactação de cada vez: `count` é calculado antes do await ao modelo e aplicado
+        # depois; duas em paralelo apagariam cada uma os primeiros `count` turnos
+        async with self._compact_lock:
+            if await self._compact():
+                await self.save()
+
+    async def _compact(self) -> bool:
+        count = self._fold_count()
+        if not count:
+            return False
+        folded = self.turns[:count]
+        summary = None
+        if ai_gateway.available:
+            prompt = SUMMARY_PROMPT.format(
+                max_words=CHAT_SUMMARY_TOKENS * 3 // 4,
+                summary=self.summary or '(vazio)',
+                turns=_format_turns(folded),
+            )
+            try:
+                summary = (await ai_gateway.generate(prompt, temperature=0.2)).strip()
+            except Exception as e:
+                print(f"Erro ao resumir conversa {self.id}: {e}")
+        if not summary:
+            # Resumo extrativo: o início de cada turno, os mais recentes têm prioridade
+            lines = [self.summary] if self.summary else []
+            lines += [_clip(line, 40) for line in _format_turns(folded).split("\n")]
+            summary = "\n".join(lines)[-CHAT_SUMMARY_TOKENS * 4:]
+        self.summary = _clip(summary, CHAT_SUMMARY_TOKENS)
+        # Só se acrescentam turnos no fim, por isso os primeiros `count` são os que foram resumidos
+        del self.turns[:count]
+        return True
+
+    def schedule_compaction(self):
+        if self._fold_count() and (self._compaction is None or self._compaction.done()):
+            self._compaction = asyncio.ensure_future(self.compact())
+
+    async def settle(self):
+        """Espera por uma compactação pendente e garante que o histórico cabe no orçamento"""
+        if self._compaction is not None and not self._compaction.done():
+            await self._compaction
+        if self._fold_count():
+            await self.compact()
+
+    def to_dict(self) -> dict:
+        return {
+            'conversationId': self.id,
+            'summary': self.summary,
+            'turns': list(self.turns),
+            'tokens': self.tokens(),
+        }
+
+
+class ConversationStore:
+    def __init__(self, maxsize: int = CHAT_MAX_CONVERSATIONS, ttl: int = CHAT_CONVERSATION_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, conversation_id: str):
+        """
+        Conversa do utilizador, ou None se não existir, tiver expirado ou for de outro utilizador.
+        Bloqueia (lê a base de dados): chamar com db.run a partir de código async.
+        """
+        if not conversation_id:
+            return None
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+        if conversation is not None and conversation.user_id != user_id:
+            return None
+        if supabase:
+            try:
+                conversation = self._fresh(user_id, conversation_id, conversation)
+            except Exception as e:
+                # Sem acesso à tabela: servir a cópia em memória, se houver
+                print(f"Erro ao ler conversa {conversation_id}: {e}")
+        if conversation is None or conversation.updated_at + self.ttl < time.time():
+            with self._lock:
+                self._conversations.pop(conversation_id, None)
+            return None
+        self._cache(conversation)
+        return conversation
+
+    def _fresh(self, user_id: int, conversation_id: str, cached):
+        """A cópia em memória se estiver em dia com a gravada; senão a gravada (None se não existir)"""
+        resp = supabase.table(CONVERSATIONS_TABLE).select('*').eq('id', conversation_id).eq('user_id', user_id).limit(1).execute()
+        if not resp.data:
+            return None
+        row = resp.data[0]
+        if cached is not None and cached.version >= int(row['version']):
+            return cached
+        return Conversation.from_row(row)
+
+    def _cache(self, conversation: Conversation):
+        with self._lock:
+            self._conversations[conversation.id] = conversation
+            self._conversations.move_to_end(conversation.id)
+            while len(self._conversations) > self.maxsize:
+                self._conversations.popitem(last=False)
+
+    def get_or_create(self, user_id: int, conversation_id: str = None, history: list = None) -> Conversation:
+        """
+        Conversa existente ou uma nova (opcionalmente semeada com o histórico enviado pelo cliente).
+        Uma conversa nova tem um id diferente do pedido, o que permite ao cliente avisar do reinício.
+        """
+        conversation = self.get(user_id, conversation_id)
+        if conversation is not None:
+            return conversation
+        conversation = Conversation(user_id)
+        for msg in (history or [])[-10:]:
+            role = 'model' if msg.get('role') in ['bot', 'assistant', 'model'] else 'user'
+            conversation.add(role, msg.get('content', ''))
+        self._cache(conversation)
+        return conversation
+
+    def persist(self, row: dict):
+        if supabase:
+            supabase.table(CONVERSATIONS_TABLE).upsert(row, returning='minimal').execute()
+
+    def delete(self, user_id: int, conversation_id: str) -> bool:
+        """Bloqueia (apaga na base de dados): chamar com db.run a partir de código async"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            deleted = conversation is not None and conversation.user_id == user_id
+            if deleted:
+                del self._conversations[conversation_id]
+        if supabase:
+            resp = supabase.table(CONVERSATIONS_TABLE).delete().eq('id', conversation_id).eq('user_id', user_id).execute()
+            deleted = deleted or bool(resp.data)
+        return deleted
+
+
+conversation_store = ConversationStore()
@@ -0,0 +1,221 @@
+"""
+Rollup incremental do livro de transações por utilizador.
+
+A fonte persistente são os totais diários da tabela `daily_ledger_totals` (uma linha por
+utilizador/dia/tipo/categoria), mantida por um trigger em `expenses` e por isso correta
+para todas as instâncias (sql/daily_ledger_totals.sql).
+
+Por cima dela, cada processo guarda em memória os totais de cada utilizador numa árvore
+de Fenwick por dia, pelo que o total de qualquer intervalo [start_date, end_date] e cada
+nova transação custam O(log n), em vez de reler todas as linhas de `expenses`:
+
+- o utilizador é carregado (backfill) na primeira leitura a partir de daily_ledger_totals
+  (ou das linhas de `expenses`, se a função SQL não existir);
+- `record()` aplica as escritas feitas por esta instância;
+- cada ledger expira ao fim de LEDGER_ROLLUP_TTL segundos e é recarregado, para apanhar
+  escritas de outras instâncias (funções Vercel, réplicas) ou feitas fora da API;
+- `invalidate()` descarta-o de imediato.
+
+Reconstrução da tabela persistente (todos os utilizadores, ou um só):
+    python -m app.infrastructure.ledger_rollup rebuild [--user-id N]
+"""
+import os
+import threading
+import time
+from datetime import date
+
+from app.infrastructure.supabase_client import supabase
+from app.infrastructure.aggregates import daily_category_totals, rebuild_daily_totals
+
+BACKFILL_PAGE_SIZE = 1000
+LEDGER_ROLLUP_TTL = float(os.getenv('LEDGER_ROLLUP_TTL', '60'))
+TRANSACTION_TYPES = ('income', 'expense')
+MIN_SERIES_DAYS = 64
+
+
+def _ordinal(day: str) -> int:
+    return date.fromisoformat(day[:10]).toordinal()
+
+
+class DailySeries:
+    """
+    Totais diários numa árvore de Fenwick indexada pelo dia.
+    `add` e `total` custam O(log n); só um dia fora do intervalo coberto reconstrói a
+    árvore, com folga proporcional ao intervalo, por isso o custo amortizado mantém-se.
+    """
+
+    def __init__(self):
+        self.base = None           # ordinal do primeiro dia coberto pela árvore
+        self.amounts = {}          # ordinal -> total do dia (para reconstruir ao alargar)
+        self.tree = [0.0]          # árvore de Fenwick, 1-indexada
+
+    def add(self, day: str, amount: float):
+        i = _ordinal(day)
+        self.amounts[i] = self.amounts.get(i, 0.0) + amount
+        if self.base is None or not self.base <= i < self.base + len(self.tree) - 1:
+            self._resize()
+            return
+        k = i - self.base + 1
+        while k < len(self.tree):
+            self.tree[k] += amount
+            k += k & -k
+
+    def _resize(self):
+        lo, hi = min(self.amounts), max(self.amounts)
+        # Capacidade para o dobro dos dias cobertos, com metade da folga de cada lado
+        span = hi - lo + 1
+        size = max(2 * span, MIN_SERIES_DAYS)
+        self.base = lo - (size - span) // 2
+        tree = [0.0] * (size + 1)
+        for i, amount in self.amounts.items():
+            tree[i - self.base + 1] += amount
+        for k in range(1, size + 1):
+            parent = k + (k & -k)
+            if parent <= size:
+                tree[parent] += tree[k]
+        self.tree = tree
+
+    def _prefix(self, n: int) -> float:
+        """Soma dos primeiros n dias da árvore"""
+        total = 0.0
+        while n > 0:
+            total += self.tree[n]
+            n -= n & -n
+        return total
+
+    def total(self, start_date: str = None, end_date: str = None) -> float:
+        if self.base is None:
+            return 0.0
+        size = len(self.tree) - 1
+        lo = max(_ordinal(start_date) - self.base, 0) if start_date else 0
+        hi = min(_ordinal(end_date) - self.base + 1, size) if end_date else size
+        return self._prefix(hi) - self._prefix(lo) if hi > lo else 0.0
+
+
+class UserLedger:
+    def __init__(self):
+        self.totals = {t: DailySeries() for t in TRANSACTION_TYPES}
+        self.by_category = {t: {} for t in TRANSACTION_TYPES}
+
+    def add(self, day: str, transaction_type: str, amount: float, category: str = None):
+        if transaction_type not in self.totals:
+            return
+        day = day[:10]
+        self.totals[transaction_type].add(day, amount)
+        self.by_category[transaction_type].setdefault(category, DailySeries()).add(day, amount)
+
+    def total(self, transaction_type: str, start_date: str = None, end_date: str = None) -> float:
+        return self.totals[transaction_type].total(start_date, end_date)
+
+    def totals_by_category(self, transaction_type: str, start_date: str = None, end_date: str = None) -> dict:
+        """Totais por nome de categoria (None = sem categoria), omitindo as que não têm movimento"""
+        result = {}
+        for category, series in self.by_category[transaction_type].items():
+            amount = series.total(start_date, end_date)
+            if amount:
+                result[category] = amount
+        return result
+
+
+class LedgerRollupStore:
+    def __init__(self, ttl: float = LEDGER_ROLLUP_TTL):
+        self.ttl = ttl
+        self._ledgers = {}         # user_id -> (instante monotónico do carregamento, UserLedger)
+        self._versions = {}        # user_id -> versão, incrementada por invalidate()
+        self._lock = threading.RLock()
+
+    def _cached(self, user_id: int):
+        """Ledger ainda dentro do TTL, ou None. Chamar com o lock."""
+        entry = self._ledgers.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def get(self, user_id: int) -> UserLedger:
+        """Devolve o ledger do utilizador, carregando-o de daily_ledger_totals se não existir ou tiver expirado"""
+        with self._lock:
+            ledger = self._cached(user_id)
+        if ledger is None:
+            ledger = self.load(user_id)
+        return ledger
+
+    def peek(self, user_id: int):
+        """Ledger já carregado e dentro do TTL, ou None (sem I/O)"""
+        with self._lock:
+            return self._cached(user_id)
+
+    def record(self, user_id: int, day: str, transaction_type: str, amount: float, category: str = None):
+        """Aplica uma nova transação. Se o utilizador ainda não foi carregado, o backfill já a inclui."""
+        with self._lock:
+            ledger = self._cached(user_id)
+            if ledger is not None:
+                ledger.add(day, transaction_type, float(amount), category)
+
+    def load(self, user_id: int) -> UserLedger:
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+        ledger = UserLedger()
+        if supabase:
+            try:
+                # Totais diários persistentes: uma linha por dia/tipo/categoria
+                for row in daily_category_totals(user_id):
+                    ledger.add(row['day'], row['type'], float(row['total']), row['category'])
+            except Exception:
+                ledger = UserLedger()
+                self._backfill_rows(ledger, user_id)
+        with self._lock:
+            # Um invalidate() durante a leitura pode ter tornado este resultado antigo: não o guardar
+            if self._versions.get(user_id, 0) == version:
+                self._ledgers[user_id] = (time.monotonic(), ledger)
+        return ledger
+
+    def _backfill_rows(self, ledger: UserLedger, user_id: int):
+        """Fallback sem a função SQL: percorre as transações em bruto"""
+        offset = 0
+        while True:
+            resp = supabase.table('expenses').select('date, type, amount, categories(name)').eq('user_id', user_id).order('id').range(offset, offset + BACKFILL_PAGE_SIZE - 1).execute()
+            rows = resp.data or []
+            for t in rows:
+                ledger.add(t['date'], t['type'], float(t['amount']), (t.get('categories') or {}).get('name'))
+            if len(rows) < BACKFILL_PAGE_SIZE:
+                return
+            offset += BACKFILL_PAGE_SIZE
+
+    def rebuild(self, user_id: int = None) -> int:
+        """
+        Recalcula daily_ledger_totals na base de dados (um utilizador ou todos), visível para
+        todas as instâncias, e descarta a cópia local. Devolve o número de utilizadores.
+        """
+        count = rebuild_daily_totals(user_id)
+        self.invalidate(user_id)
+        return count
+
+    def invalidate(self, user_id: int = None):
+        with self._lock:
+            if user_id is None:
+                for uid in set(self._ledgers) | set(self._versions):
+                    self._versions[uid] = self._versions.get(uid, 0) + 1
+                self._ledgers.clear()
+            else:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._ledgers.pop(user_id, None)
+
+
+ledger_store = LedgerRollupStore()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reconstrói daily_ledger_totals a partir da tabela expenses")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--user-id', type=int)
+    args = parser.parse_args()
+
+    if not supabase:
+        raise SystemExit("Database not configured")
+    count = ledger_store.rebuild(args.user_id)
+    print(f" [OK] daily_ledger_totals reconstruída para {count} utilizador(es)")
+    if args.user_id is not None:
+        ledger = ledger_store.get(args.user_id)
+        print(f"      Receitas: {ledger.total('income'):.2f} EUR | Despesas: {ledger.total('expense'):.2f} EUR")
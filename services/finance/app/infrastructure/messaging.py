@@ -1,21 +1,271 @@
-import pika
+"""
+Publicação de eventos no RabbitMQ (exchange `events`, tipo topic).
+
+Um único `EventPublisher` por processo mantém a ligação e o canal abertos numa thread
+própria (pika SelectConnection) e volta a ligar-se sozinho. `publish_event()` só põe o
+evento numa fila em memória e regressa de imediato; a thread junta os eventos que
+chegam durante PUBLISH_LINGER_MS (até PUBLISH_BATCH_SIZE), publica-os de seguida e
+recebe as confirmações do broker (publisher confirms) de forma assíncrona.
+
+Se o broker não estiver disponível, os eventos pendentes (e os ainda sem confirmação)
+vão para o log local de eventos (app.infrastructure.event_log), lido pelo Notification Service.
+"""
 import json
 import os
+import queue
+import threading
+import time
+from collections import deque
+
+import pika
 
+from app.infrastructure.event_log import event_log
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
+EXCHANGE = 'events'
+
+PUBLISH_QUEUE_SIZE = int(os.getenv('PUBLISH_QUEUE_SIZE', '10000'))
+PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', '200'))
+PUBLISH_LINGER_MS = float(os.getenv('PUBLISH_LINGER_MS', '5'))
+PUBLISH_MAX_UNCONFIRMED = int(os.getenv('PUBLISH_MAX_UNCONFIRMED', '1000'))
+RECONNECT_MAX_DELAY = 30
+
+
+class EventPublisher:
+    def __init__(self, host: str = RABBITMQ_HOST, batch_size: int = PUBLISH_BATCH_SIZE,
+                 linger_ms: float = PUBLISH_LINGER_MS, max_unconfirmed: int = PUBLISH_MAX_UNCONFIRMED):
+        self.host = host
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.max_unconfirmed = max_unconfirmed
+        self._queue = queue.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        self._retry = deque()          # eventos a republicar primeiro (sem confirmação quando a ligação caiu)
+        self._unconfirmed = {}         # delivery_tag -> (event_type, payload)
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._opened = False
+        self._ready = False
+        self._wakeup_pending = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._stopping = False
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.spilled = 0
+
+    # --- API usada pelos handlers (qualquer thread) ---
+
+    def publish(self, event_type: str, payload: dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((event_type, payload))
+        except queue.Full:
+            # Nunca bloquear um pedido: com a fila cheia o evento vai direto para o log local
+            self._spill([(event_type, payload)])
+            return
+        self._wakeup()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera até todos os eventos aceites estarem confirmados pelo broker (ou no fallback)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while not self._is_idle():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def close(self, timeout: float = 5):
+        self.flush(timeout)
+        self._stopping = True
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._close_connection)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'connected': self._ready,
+            'queued': self._queue.qsize() + len(self._retry),
+            'unconfirmed': len(self._unconfirmed),
+            'published': self.published,
+            'confirmed': self.confirmed,
+            'nacked': self.nacked,
+            'spilled': self.spilled,
+        }
+
+    # --- Thread do publisher ---
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='event-publisher', daemon=True)
+                    self._thread.start()
+
+    def _is_idle(self) -> bool:
+        return self._queue.empty() and not self._retry and not self._unconfirmed
+
+    def _notify_if_idle(self):
+        with self._idle:
+            if self._is_idle():
+                self._idle.notify_all()
+
+    def _wakeup(self):
+        # Um único callback agendado de cada vez, por muitos eventos que cheguem entretanto
+        connection = self._connection
+        if not self._ready or self._wakeup_pending or connection is None:
+            return
+        self._wakeup_pending = True
+        try:
+            connection.ioloop.add_callback_threadsafe(self._schedule_drain)
+        except Exception:
+            self._wakeup_pending = False
+
+    def _run(self):
+        delay = 1
+        while not self._stopping:
+            self._opened = False
+            connection = self._connection = pika.SelectConnection(
+                pika.ConnectionParameters(host=self.host, heartbeat=30, connection_attempts=1, retry_delay=1),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            connection.ioloop.start()
+            connection.ioloop.close()
+            self._ready = False
+            self._channel = None
+            self._connection = None
+            if self._stopping:
+                break
+            if self._opened:
+                delay = 1
+                continue
+            # Broker indisponível: os eventos pendentes vão para o log local em vez de ficarem à espera
+            print(f" [FALLBACK] RabbitMQ nao disponivel. Eventos pendentes logados localmente; nova tentativa em {delay}s")
+            self._spill_pending()
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        self._spill_pending()
+
+    def _on_connection_open(self, connection):
+        self._opened = True
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._ready = False
+        self._channel = None
+        # Sem confirmação não há garantia de entrega: republicar (pelo menos uma vez)
+        for tag in sorted(self._unconfirmed, reverse=True):
+            self._retry.appendleft(self._unconfirmed.pop(tag))
+        connection.ioloop.stop()
+
+    def _close_connection(self):
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        self._delivery_tag = 0
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic',
+                                 callback=lambda _: channel.confirm_delivery(self._on_confirm, callback=self._on_confirm_ok))
+
+    def _on_channel_closed(self, channel, reason):
+        # A ligação pode já ter sido fechada (e _connection limpo) antes deste callback
+        connection = self._connection
+        if connection is not None and connection.is_open:
+            connection.close()
+
+    def _on_confirm_ok(self, _):
+        self._ready = True
+        print(f" [*] Publisher ligado a {self.host}")
+        self._schedule_drain()
+
+    def _schedule_drain(self):
+        self._connection.ioloop.call_later(self.linger, self._drain)
+
+    def _drain(self):
+        self._wakeup_pending = False
+        if not self._ready:
+            return
+        sent = 0
+        while sent < self.batch_size and len(self._unconfirmed) < self.max_unconfirmed:
+            if self._retry:
+                event = self._retry.popleft()
+            else:
+                try:
+                    event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            event_type, payload = event
+            self._channel.basic_publish(
+                exchange=EXCHANGE,
+                routing_key=event_type,
+                body=json.dumps(payload),
+                properties=pika.BasicProperties(content_type='application/json', delivery_mode=2),
+            )
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = event
+            self.published += 1
+            sent += 1
+        # Ainda há eventos (lote cheio): continuar no próximo ciclo do ioloop;
+        # com a janela de confirmações cheia, _on_confirm volta a drenar
+        if sent == self.batch_size and (self._retry or not self._queue.empty()):
+            self._wakeup_pending = True
+            self._connection.ioloop.call_later(0, self._drain)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+        events = [self._unconfirmed.pop(tag) for tag in tags]
+        if isinstance(method, pika.spec.Basic.Nack):
+            self.nacked += len(events)
+            self._spill(events)
+        else:
+            self.confirmed += len(events)
+        if not self._wakeup_pending and (self._retry or not self._queue.empty()):
+            self._wakeup_pending = True
+            self._schedule_drain()
+        self._notify_if_idle()
+
+    def _spill_pending(self):
+        events = list(self._retry)
+        self._retry.clear()
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            self._spill(events)
+        self._notify_if_idle()
+
+    def _spill(self, events: list):
+        try:
+            event_log.append(events)
+            self.spilled += len(events)
+        except Exception as e:
+            print(f" [ERROR] Failed to log {len(events)} events locally: {e}")
+
+
+event_publisher = EventPublisher()
+
 
 def publish_event(event_type: str, payload: dict):
-    try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST, connection_attempts=1, retry_delay=1))
-        channel = connection.channel()
-        channel.exchange_declare(exchange='events', exchange_type='topic')
-        
-        message = json.dumps(payload)
-        channel.basic_publish(exchange='events', routing_key=event_type, body=message)
-        connection.close()
-        print(f" [x] Sent {event_type}:{message}")
-    except Exception as e:
-        print(f" [FALLBACK] RabbitMQ nao disponivel. Evento {event_type} logado localmente: {payload}")
-        # Opcional: Salvar em ficheiro local para o Notification Service ler
-        with open("events_log.json", "a") as f:
-            f.write(json.dumps({"type": event_type, "data": payload}) + "\n")
+    """Entrega o evento ao publisher em background; não bloqueia o pedido"""
+    event_publisher.publish(event_type, payload)
@@ -0,0 +1,186 @@
+"""
+Geração de relatórios PDF em background.
+
+Os dados são lidos numa thread (I/O), o PDF é desenhado num ProcessPoolExecutor (CPU)
+e o resultado fica em cache, indexado por (user_id, start_date, end_date, versão dos dados).
+Downloads repetidos do mesmo relatório com os mesmos dados são servidos da cache.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from app.infrastructure import db
+
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '32'))
+REPORT_ROWS_PER_TABLE = 40
+REPORT_JOB_TTL = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS)
+        return _executor
+
+
+def render_pdf(start_date: str, end_date: str, rows: list) -> bytes:
+    """Desenha o relatório. Corre num processo separado, por isso só recebe dados simples."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
+    total_income = sum(float(t['amount']) for t in rows if t['type'] == 'income')
+    total_expense = sum(float(t['amount']) for t in rows if t['type'] == 'expense')
+    balance = total_income - total_expense
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm, leftMargin=2*cm, rightMargin=2*cm)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Titulo
+    title_style = ParagraphStyle('title', parent=styles['Title'], fontSize=20, textColor=colors.HexColor('#0F172A'), alignment=TA_CENTER)
+    story.append(Paragraph('Relatorio Financeiro', title_style))
+    story.append(Paragraph(f'{start_date} -- {end_date}', ParagraphStyle('sub', parent=styles['Normal'], fontSize=11, textColor=colors.HexColor('#64748B'), alignment=TA_CENTER)))
+    story.append(Spacer(1, 0.5*cm))
+
+    summary_data = [
+        ['Receitas', 'Despesas', 'Saldo'],
+        [f'EUR {total_income:,.2f}', f'EUR {total_expense:,.2f}', f'EUR {balance:,.2f}'],
+    ]
+    summary_table = Table(summary_data, colWidths=[5.5*cm, 5.5*cm, 5.5*cm])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F172A')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#F8FAFC')]),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#E2E8F0')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 0.5*cm))
+
+    header = ['Data', 'Descricao', 'Categoria', 'Tipo', 'Valor (EUR)']
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F172A')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (4, 0), (4, -1), 'RIGHT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8FAFC')]),
+        ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#E2E8F0')),
+    ])
+    # Uma tabela pequena por bloco em vez de um único flowable gigante:
+    # o layout de cada bloco é independente e a memória do reportlab não cresce com o histórico
+    for i in range(0, len(rows), REPORT_ROWS_PER_TABLE):
+        chunk = [header]
+        for t in rows[i:i + REPORT_ROWS_PER_TABLE]:
+            chunk.append([
+                t['date'],
+                (t.get('notes') or '')[:35],
+                (t.get('categories') or {}).get('name', 'Outros'),
+                'Receita' if t['type'] == 'income' else 'Despesa',
+                f"{float(t['amount']):,.2f}",
+            ])
+        trans_table = Table(chunk, colWidths=[2.5*cm, 6*cm, 3.5*cm, 2*cm, 2.5*cm], repeatRows=1)
+        trans_table.setStyle(table_style)
+        story.append(trans_table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+class ReportJobs:
+    def __init__(self, cache_size: int = REPORT_CACHE_SIZE):
+        self.jobs = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self._tasks = set()
+        self._inflight = {}
+        self._done = {}            # job_id -> asyncio.Future resolvida quando o job termina
+
+    def cached(self, key: tuple):
+        artifact = self.cache.get(key)
+        if artifact is not None:
+            self.cache.move_to_end(key)
+        return artifact
+
+    def _store(self, key: tuple, artifact: bytes):
+        self.cache[key] = artifact
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def submit(self, key: tuple, load_rows) -> dict:
+        """
+        Cria (ou reutiliza) um job para `key`.
+        `load_rows` é uma função síncrona que devolve as linhas do relatório.
+        """
+        if key in self._inflight:
+            return self.jobs[self._inflight[key]]
+        self._prune()
+
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'key': key, 'status': 'pending', 'error': None, 'created_at': time.time()}
+        self.jobs[job_id] = job
+
+        if self.cached(key) is not None:
+            job['status'] = 'done'
+            return job
+
+        self._inflight[key] = job_id
+        self._done[job_id] = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._run(job, load_rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - REPORT_JOB_TTL
+        for job_id in [j for j, job in self.jobs.items() if job['created_at'] < cutoff and job['status'] in ('done', 'failed')]:
+            del self.jobs[job_id]
+
+    async def _run(self, job: dict, load_rows):
+        key = job['key']
+        _, start_date, end_date, _ = key
+        try:
+            job['status'] = 'running'
+            rows = await db.run(load_rows)
+            loop = asyncio.get_running_loop()
+            artifact = await loop.run_in_executor(_get_executor(), render_pdf, start_date, end_date, rows)
+            self._store(key, artifact)
+            job['status'] = 'done'
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            self._inflight.pop(key, None)
+            done = self._done.pop(job['job_id'], None)
+            if done is not None and not done.done():
+                done.set_result(job)
+
+    async def wait(self, job_id: str, timeout: float = 120):
+        job = self.jobs[job_id]
+        done = self._done.get(job_id)
+        if done is None or job['status'] not in ('pending', 'running'):
+            return job
+        try:
+            # shield: um pedido que desiste não cancela a future partilhada pelos outros
+            return await asyncio.wait_for(asyncio.shield(done), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Geração do relatório excedeu o tempo limite")
+
+
+report_jobs = ReportJobs()
@@ -0,0 +1,40 @@
+"""
+Snapshot financeiro do utilizador partilhado durante um pedido.
+
+Saúde financeira, análise IA, insights e o contexto do chat precisam dos mesmos dados
+(totais de receitas/despesas, investimentos e objetivos). O snapshot faz essas leituras
+numa única ronda em paralelo e fica memorizado em `request.state`, por isso cada
+pedido faz no máximo uma ronda de leituras, seja qual for o número de consumidores.
+"""
+import asyncio
+
+from fastapi import Request
+
+from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
+from app.infrastructure.ledger_rollup import ledger_store
+
+
+async def _load(user_id: int) -> dict:
+    ledger, inv_resp, goals_resp = await asyncio.gather(
+        db.run(ledger_store.get, user_id),
+        db.execute(supabase.table('investments').select('quantity, last_price').eq('user_id', user_id)),
+        db.execute(supabase.table('savings_goals').select('name, target_amount, current_amount').eq('user_id', user_id)),
+    )
+    return {
+        'income': ledger.total('income'),
+        'expense': ledger.total('expense'),
+        'investments': inv_resp.data or [],
+        'goals': goals_resp.data or [],
+    }
+
+
+async def user_snapshot(request: Request, user_id: int) -> dict:
+    """Snapshot do utilizador, carregado no máximo uma vez por pedido"""
+    snapshots = getattr(request.state, 'user_snapshots', None)
+    if snapshots is None:
+        snapshots = request.state.user_snapshots = {}
+    if user_id not in snapshots:
+        # Guardar a task (e não o resultado) para que consumidores concorrentes partilhem a mesma leitura
+        snapshots[user_id] = asyncio.ensure_future(_load(user_id))
+    return await snapshots[user_id]
@@ -22,6 +22,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+def shutdown_event():
+    # Entregar os eventos ainda em fila antes de o processo terminar
+    from app.infrastructure.messaging import event_publisher
+    event_publisher.close()
+
 @app.get("/")
 def read_root():
     return {"message": "Finance Service API", "status": "running"}
@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import date as date_type, datetime
+from fastapi import HTTPException
+
+def encode_cursor(row: dict) -> str:
+    """Cursor opaco com a chave (date, id) da última linha devolvida"""
+    raw = json.dumps([row['date'], row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _valid_date(value) -> bool:
+    try:
+        date_type.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        pass
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def decode_cursor(cursor: str):
+    """
+    Chave (date, id) do cursor. Os valores entram no filtro `or` do PostgREST, por isso
+    só se aceita uma data ISO e um id inteiro (nada que possa acrescentar cláusulas).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(date, str) or not _valid_date(date) or type(row_id) is not int:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return date, row_id
+
+def apply_keyset(query, cursor: str = None):
+    """
+    Paginação por keyset sobre (date DESC, id DESC).
+    Cada página é um index range scan a partir da chave do cursor, com custo
+    constante seja qual for a página (ao contrário de OFFSET).
+    """
+    query = query.order('date', desc=True).order('id', desc=True)
+    if cursor:
+        date, row_id = decode_cursor(cursor)
+        query = query.or_(f'date.lt."{date}",and(date.eq."{date}",id.lt.{row_id})')
+    return query
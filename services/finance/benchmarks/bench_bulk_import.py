@@ -0,0 +1,57 @@
+"""
+Benchmark: importação em lote (POST /transactions/bulk) vs uma transação por pedido (POST /transactions).
+
+Corre contra um Finance Service ligado a uma base de dados de teste (insere linhas reais!):
+    python benchmarks/bench_bulk_import.py --url http://localhost:8002/api/v1 --user-id 3 --rows 1000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+
+def synthetic_rows(count: int):
+    today = date.today()
+    return [
+        {
+            'tipo': random.choice(['despesa', 'despesa', 'receita']),
+            'valor': round(random.uniform(1, 500), 2),
+            'data': (today - timedelta(days=random.randint(0, 90))).isoformat(),
+            'categoria': random.choice(['Alimentação', 'Transporte', 'Lazer', 'Outros']),
+            'descricao': f'bench #{i}',
+        }
+        for i in range(count)
+    ]
+
+
+def run(url: str, user_id: int, rows: int, single_rows: int):
+    import requests
+
+    session = requests.Session()
+    params = {'user_id': user_id}
+
+    single = synthetic_rows(single_rows)
+    t0 = time.perf_counter()
+    for row in single:
+        session.post(f"{url}/transactions/", json=row, params=params, timeout=30).raise_for_status()
+    single_s = time.perf_counter() - t0
+
+    bulk = synthetic_rows(rows)
+    t0 = time.perf_counter()
+    r = session.post(f"{url}/transactions/bulk", json={'transactions': bulk}, params=params, timeout=300)
+    r.raise_for_status()
+    bulk_s = time.perf_counter() - t0
+
+    print(f"Finance Service em {url} (user_id={user_id})")
+    print(f"  POST /transactions       {single_rows:>6} linhas em {single_s:7.2f} s  -> {single_rows / single_s:9.1f} linhas/s")
+    print(f"  POST /transactions/bulk  {r.json()['inserted']:>6} linhas em {bulk_s:7.2f} s  -> {rows / bulk_s:9.1f} linhas/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--single-rows', type=int, default=100, help="linhas a enviar pelo caminho de uma linha por pedido")
+    args = parser.parse_args()
+    run(args.url, args.user_id, args.rows, args.single_rows)
@@ -0,0 +1,85 @@
+"""
+Benchmark: 100 pedidos em paralelo com queries bloqueantes no event loop vs no pool de app.infrastructure.db.
+
+Modo offline (por omissão): cada "pedido" é um handler async que faz N queries simuladas
+(time.sleep com a latência de um round-trip ao Supabase). Compara chamar `.execute()`
+diretamente no handler (como antes) com `await db.execute(...)`.
+
+Modo live: dispara pedidos concorrentes contra um serviço a correr.
+    python benchmarks/bench_db_concurrency.py --url "http://localhost:8002/api/v1/summary/health?user_id=3"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class SimulatedQuery:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def execute(self):
+        time.sleep(self.latency)
+        return self
+
+
+async def run_offline(requests_count: int, queries: int, latency_ms: float):
+    from app.infrastructure import db
+
+    latency = latency_ms / 1000
+
+    async def blocking_handler():
+        for _ in range(queries):
+            SimulatedQuery(latency).execute()
+
+    async def pooled_handler():
+        for _ in range(queries):
+            await db.execute(SimulatedQuery(latency))
+
+    print(f"{requests_count} pedidos concorrentes, {queries} queries/pedido, {latency_ms:.0f} ms/query, DB_POOL_SIZE={db.DB_POOL_SIZE}")
+    for name, handler in (('execute() no event loop', blocking_handler), ('db.execute() no pool', pooled_handler)):
+        t0 = time.perf_counter()
+        await asyncio.gather(*(handler() for _ in range(requests_count)))
+        elapsed = time.perf_counter() - t0
+        print(f"  {name:<24} {elapsed:7.2f} s  -> {requests_count / elapsed:8.1f} pedidos/s")
+
+
+def run_live(url: str, requests_count: int):
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=requests_count, pool_maxsize=requests_count)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def one(_):
+        t0 = time.perf_counter()
+        session.get(url, timeout=60).raise_for_status()
+        return (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests_count) as pool:
+        latencies = sorted(pool.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - t0
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{requests_count} pedidos concorrentes a {url}")
+    print(f"  total {elapsed:.2f} s  -> {requests_count / elapsed:.1f} pedidos/s  (mediana {statistics.median(latencies):.0f} ms, p95 {p95:.0f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    if args.url:
+        run_live(args.url, args.requests)
+    else:
+        asyncio.run(run_offline(args.requests, args.queries, args.latency_ms))
@@ -0,0 +1,117 @@
+"""
+Benchmark: escrita no antigo events_log.json (abrir/acrescentar por evento) vs o log segmentado.
+
+Corre num diretório temporário, sem dependências externas:
+    python benchmarks/bench_event_log.py --events 50000 --batch 200
+
+Com --tail mede a latência entre escrever um evento e um leitor (noutro processo) o ver,
+a acordar com o LogWatcher vs o antigo ciclo de polling de 2 s.
+    python benchmarks/bench_event_log.py --tail --events 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def run(events: int, batch: int):
+    from app.infrastructure.event_log import EventLog
+
+    payload = {"user_id": 1, "amount": 12.5, "type": "expense"}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events_log.json')
+        t0 = time.perf_counter()
+        for _ in range(events):
+            with open(path, "a") as f:
+                f.write(json.dumps({"type": "transaction_created", "data": payload}) + "\n")
+        legacy = time.perf_counter() - t0
+
+        log = EventLog(os.path.join(tmp, 'single'), segment_bytes=4 * 1024 * 1024)
+        t0 = time.perf_counter()
+        for _ in range(events):
+            log.append([("transaction_created", payload)])
+        log.sync()
+        single = time.perf_counter() - t0
+
+        log = EventLog(os.path.join(tmp, 'batched'), segment_bytes=4 * 1024 * 1024)
+        t0 = time.perf_counter()
+        for _ in range(0, events, batch):
+            log.append([("transaction_created", payload)] * min(batch, events))
+        log.sync()
+        batched = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        offset = count = 0
+        while True:
+            records = log.read(offset, 1000)
+            if not records:
+                break
+            count += len(records)
+            offset = records[-1]['offset'] + 1
+        replay = time.perf_counter() - t0
+
+        print(f"{events} eventos")
+        print(f"  events_log.json (1 open/evento)   {events / legacy:10.0f} eventos/s (sem fsync)")
+        print(f"  EventLog.append, 1 evento          {events / single:10.0f} eventos/s")
+        print(f"  EventLog.append, lotes de {batch:<5}   {events / batched:10.0f} eventos/s")
+        print(f"  replay desde o offset 0            {count / replay:10.0f} eventos/s  ({log.stats()['segments']} segmentos)")
+
+
+def _tail(directory: str, events: int, poll: float, results):
+    from app.infrastructure.event_log import EventLog
+
+    log = EventLog(directory)
+    watcher = log.watcher() if poll is None else None
+    offset = 0
+    latencies = []
+    while len(latencies) < events:
+        records = log.read(offset, 1000)
+        if records:
+            now = time.time()
+            latencies.extend(now - r['data']['t'] for r in records)
+            offset = records[-1]['offset'] + 1
+        elif watcher is not None:
+            watcher.wait(1)
+        else:
+            time.sleep(poll)
+    results.put(latencies)
+
+
+def run_tail(events: int, interval_ms: float):
+    from app.infrastructure.event_log import EventLog
+
+    print(f"{events} eventos, um a cada {interval_ms:.0f} ms, leitor noutro processo")
+    for name, poll in (('LogWatcher', None), ('polling de 2 s', 2.0)):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = EventLog(tmp)
+            results = multiprocessing.Queue()
+            reader = multiprocessing.Process(target=_tail, args=(tmp, events, poll, results))
+            reader.start()
+            time.sleep(0.5)
+            for _ in range(events):
+                log.append([("transaction_created", {"t": time.time()})])
+                time.sleep(interval_ms / 1000)
+            latencies = sorted(results.get())
+            reader.join()
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            print(f"  {name:<16} mediana {statistics.median(latencies) * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--tail', action='store_true')
+    parser.add_argument('--interval-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    if args.tail:
+        run_tail(args.events, args.interval_ms)
+    else:
+        run(args.events, args.batch)
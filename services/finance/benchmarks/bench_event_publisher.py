@@ -0,0 +1,76 @@
+"""
+Benchmark: publicar eventos com uma ligação por evento (como antes) vs o EventPublisher persistente.
+
+Requer um RabbitMQ local (por exemplo `docker compose up rabbitmq`):
+    python benchmarks/bench_event_publisher.py --host localhost --events 5000
+
+Para cada modo mostra a latência acrescentada ao pedido (tempo da chamada de publicação)
+e o débito em eventos/s até o broker confirmar todos os eventos.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def publish_per_connection(host: str, event_type: str, payload: dict):
+    """O publish_event antigo: abre ligação, declara o exchange, publica e fecha"""
+    import pika
+
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host, connection_attempts=1, retry_delay=1))
+    channel = connection.channel()
+    channel.exchange_declare(exchange='events', exchange_type='topic')
+    channel.basic_publish(exchange='events', routing_key=event_type, body=json.dumps(payload))
+    connection.close()
+
+
+def report(name: str, latencies: list, elapsed: float, count: int):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"  {name:<22} {count / elapsed:9.0f} eventos/s  | latência no pedido: "
+          f"mediana {statistics.median(latencies) * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms")
+
+
+def run(host: str, events: int, legacy_events: int):
+    from app.infrastructure.messaging import EventPublisher
+
+    payload = {"user_id": 1, "amount": 12.5, "type": "expense"}
+    print(f"RabbitMQ em {host}")
+
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(legacy_events):
+        t = time.perf_counter()
+        publish_per_connection(host, 'bench_event', payload)
+        latencies.append(time.perf_counter() - t)
+    report("ligação por evento", latencies, time.perf_counter() - t0, legacy_events)
+
+    publisher = EventPublisher(host=host)
+    publisher.publish('bench_event', payload)
+    if not publisher.flush(timeout=15) or not publisher.stats()['connected']:
+        raise SystemExit(f"Publisher não ligou a {host}: {publisher.stats()}")
+
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(events):
+        t = time.perf_counter()
+        publisher.publish('bench_event', payload)
+        latencies.append(time.perf_counter() - t)
+    publisher.flush()
+    report("EventPublisher", latencies, time.perf_counter() - t0, events)
+    print(f"  {publisher.stats()}")
+    publisher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--legacy-events', type=int, default=200, help="a ligação por evento é lenta; menos eventos chegam")
+    args = parser.parse_args()
+
+    run(args.host, args.events, args.legacy_events)
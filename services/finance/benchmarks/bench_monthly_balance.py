@@ -0,0 +1,114 @@
+"""
+Benchmark: série mensal agregada (/summary/monthly) vs transferência de 500 transações (/transactions?limit=500).
+
+Modo offline (por omissão): gera um histórico sintético e compara o tamanho do payload
+e o custo de serializar + agrupar no cliente com o payload agregado.
+
+Modo live: mede as duas rotas num Finance Service a correr.
+    python benchmarks/bench_monthly_balance.py --url http://localhost:8002/api/v1 --user-id 3
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+
+def synthetic_history(rows: int, years: int = 3):
+    start = date.today() - timedelta(days=365 * years)
+    history = []
+    for i in range(rows):
+        d = start + timedelta(days=random.randint(0, 365 * years))
+        history.append({
+            'id': i + 1,
+            'user_id': 3,
+            'type': random.choice(['income', 'expense', 'expense', 'expense']),
+            'amount': round(random.uniform(1, 2500), 2),
+            'currency': 'EUR',
+            'date': d.isoformat(),
+            'notes': 'Transação de teste ' + str(i),
+            'category_id': random.randint(1, 12),
+            'categories': {'name': 'Categoria', 'colour': '#808080'},
+        })
+    history.sort(key=lambda t: t['date'], reverse=True)
+    return history
+
+
+def bucket_raw(payload: str, months: int):
+    """Replica o que o BalanceChart fazia no browser"""
+    transactions = json.loads(payload)['transactions']
+    totals = {}
+    for t in transactions:
+        bucket = totals.setdefault(t['date'][:7], {'income': 0.0, 'expense': 0.0})
+        bucket[t['type']] += float(t['amount'])
+    return sorted(totals.items())[-months:]
+
+
+def aggregate(history, months: int):
+    totals = {}
+    for t in history:
+        bucket = totals.setdefault(t['date'][:7], {'income': 0.0, 'expense': 0.0})
+        bucket[t['type']] += t['amount']
+    series = [
+        {'month': k, 'income': round(v['income'], 2), 'expense': round(v['expense'], 2), 'balance': round(v['income'] - v['expense'], 2)}
+        for k, v in sorted(totals.items())[-months:]
+    ]
+    return json.dumps({'months': series})
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def run_offline(rows: int, months: int, repeat: int):
+    history = synthetic_history(rows)
+    raw_payload = json.dumps({'transactions': history[:500]})
+    agg_payload = aggregate(history, months)
+
+    raw_ms = timed(lambda: bucket_raw(json.dumps({'transactions': history[:500]}), months), repeat)
+    agg_ms = timed(lambda: json.loads(agg_payload), repeat)
+
+    print(f"Histórico sintético: {rows} transações, {months} meses")
+    print(f"  /transactions?limit=500  payload={len(raw_payload):>9} B  cliente={raw_ms:8.3f} ms  (cobre {min(rows, 500)}/{rows} linhas)")
+    print(f"  /summary/monthly         payload={len(agg_payload):>9} B  cliente={agg_ms:8.3f} ms  (cobre {rows}/{rows} linhas)")
+
+
+def run_live(url: str, user_id: int, months: int, repeat: int):
+    import requests
+
+    session = requests.Session()
+
+    def fetch(path):
+        r = session.get(f"{url}{path}", params={'user_id': user_id}, timeout=30)
+        r.raise_for_status()
+        return r.content
+
+    raw = fetch('/transactions/?limit=500')
+    agg = fetch(f'/summary/monthly?months={months}')
+    raw_ms = timed(lambda: fetch('/transactions/?limit=500'), repeat)
+    agg_ms = timed(lambda: fetch(f'/summary/monthly?months={months}'), repeat)
+
+    print(f"Finance Service em {url} (user_id={user_id})")
+    print(f"  /transactions?limit=500  payload={len(raw):>9} B  mediana={raw_ms:8.1f} ms")
+    print(f"  /summary/monthly         payload={len(agg):>9} B  mediana={agg_ms:8.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--url')
+    parser.add_argument('--user-id', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.url:
+        run_live(args.url, args.user_id, args.months, args.repeat)
+    else:
+        run_offline(args.rows, args.months, args.repeat)
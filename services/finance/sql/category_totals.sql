@@ -0,0 +1,17 @@
+-- Agregações por categoria calculadas na base de dados (uma linha por categoria/tipo).
+-- Usadas pelo resumo de atividade e pelos orçamentos, para que o payload não cresça
+-- com o número de transações do utilizador (o rollup diário está em daily_ledger_totals.sql).
+
+create or replace function category_totals(p_user_id bigint, p_start date, p_end date)
+returns table (category text, type text, total numeric)
+language sql
+stable
+as $$
+    select c.name as category, e.type, sum(e.amount) as total
+    from expenses e
+    left join categories c on c.id = e.category_id
+    where e.user_id = p_user_id
+      and e.date >= p_start
+      and e.date <= p_end
+    group by c.name, e.type;
+$$;
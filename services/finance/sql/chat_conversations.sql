@@ -0,0 +1,15 @@
+-- Conversas do Financial Sensei (app.infrastructure.conversations): resumo acumulado e
+-- turnos recentes, para que qualquer instância do Finance Service continue a conversa.
+-- `updated_at` em segundos epoch (expiração por CHAT_CONVERSATION_TTL); `version` é
+-- incrementada a cada gravação e permite validar a cópia em memória de cada processo.
+
+create table if not exists chat_conversations (
+    id text primary key,
+    user_id bigint not null,
+    summary text not null default '',
+    turns jsonb not null default '[]'::jsonb,
+    updated_at double precision not null,
+    version bigint not null default 0
+);
+
+create index if not exists chat_conversations_user_idx on chat_conversations (user_id);
@@ -0,0 +1,83 @@
+-- Rollup diário persistente: totais por utilizador/dia/tipo/categoria, mantidos por um
+-- trigger em `expenses` (insert, update e delete), pelo que ficam corretos para todas as
+-- instâncias e para alterações feitas fora da API.
+-- O backfill do rollup em memória (ledger_rollup) lê daqui via daily_category_totals,
+-- uma linha por dia com movimento em vez das transações em bruto.
+-- Reconstrução (instalação inicial ou correção): select rebuild_daily_ledger_totals();
+
+create table if not exists daily_ledger_totals (
+    user_id bigint not null,
+    day date not null,
+    type text not null,
+    category_id bigint,
+    total numeric not null default 0
+);
+
+create unique index if not exists daily_ledger_totals_key
+    on daily_ledger_totals (user_id, day, type, coalesce(category_id, 0));
+
+create or replace function daily_ledger_totals_add(p_user_id bigint, p_day date, p_type text, p_category_id bigint, p_amount numeric)
+returns void
+language sql
+as $$
+    insert into daily_ledger_totals (user_id, day, type, category_id, total)
+    values (p_user_id, p_day, p_type, p_category_id, p_amount)
+    on conflict (user_id, day, type, coalesce(category_id, 0))
+    do update set total = daily_ledger_totals.total + excluded.total;
+$$;
+
+create or replace function daily_ledger_totals_apply()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform daily_ledger_totals_add(old.user_id, old.date::date, old.type, old.category_id, -old.amount);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform daily_ledger_totals_add(new.user_id, new.date::date, new.type, new.category_id, new.amount);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists expenses_daily_ledger_totals on expenses;
+create trigger expenses_daily_ledger_totals
+    after insert or update or delete on expenses
+    for each row execute function daily_ledger_totals_apply();
+
+-- Recalcula os totais de um utilizador (ou de todos) a partir de `expenses`.
+-- Devolve o número de utilizadores reconstruídos.
+create or replace function rebuild_daily_ledger_totals(p_user_id bigint default null)
+returns integer
+language plpgsql
+as $$
+declare
+    users integer;
+begin
+    -- Bloquear escritas em expenses durante a reconstrução (as leituras continuam)
+    lock table expenses in share mode;
+    delete from daily_ledger_totals where p_user_id is null or user_id = p_user_id;
+    insert into daily_ledger_totals (user_id, day, type, category_id, total)
+    select user_id, date::date, type, category_id, sum(amount)
+    from expenses
+    where p_user_id is null or user_id = p_user_id
+    group by 1, 2, 3, 4;
+    select count(distinct user_id) into users from daily_ledger_totals where p_user_id is null or user_id = p_user_id;
+    return users;
+end;
+$$;
+
+-- Leitura do rollup com o nome atual de cada categoria (renomear não exige reconstrução)
+create or replace function daily_category_totals(p_user_id bigint)
+returns table (day text, type text, category text, total numeric)
+language sql
+stable
+as $$
+    select to_char(d.day, 'YYYY-MM-DD') as day, d.type, c.name as category, sum(d.total) as total
+    from daily_ledger_totals d
+    left join categories c on c.id = d.category_id
+    where d.user_id = p_user_id
+      and d.total <> 0
+    group by 1, d.type, c.name;
+$$;
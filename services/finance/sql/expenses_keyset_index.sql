@@ -0,0 +1,4 @@
+-- Índice para a paginação por keyset de GET /transactions (ordem date DESC, id DESC).
+-- Permite que cada página seja lida diretamente a partir do cursor, sem OFFSET.
+
+create index if not exists expenses_user_date_id_idx on expenses (user_id, date desc, id desc);
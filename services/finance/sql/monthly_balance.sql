@@ -0,0 +1,21 @@
+-- Série mensal de receitas/despesas por utilizador, agregada na base de dados.
+-- Usada por GET /summary/monthly (BalanceChart) via supabase.rpc('monthly_balance').
+-- Devolve uma linha por mês com movimento; os meses vazios são preenchidos pela API.
+
+create index if not exists expenses_user_date_idx on expenses (user_id, date);
+
+create or replace function monthly_balance(p_user_id bigint, p_start date)
+returns table (month text, income numeric, expense numeric)
+language sql
+stable
+as $$
+    select
+        to_char(date_trunc('month', e.date::date), 'YYYY-MM') as month,
+        coalesce(sum(e.amount) filter (where e.type = 'income'), 0) as income,
+        coalesce(sum(e.amount) filter (where e.type = 'expense'), 0) as expense
+    from expenses e
+    where e.user_id = p_user_id
+      and e.date >= p_start
+    group by 1
+    order by 1;
+$$;
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 
 router = APIRouter()
 
@@ -9,7 +10,7 @@ async def get_goals(user_id: int):
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('savings_goals').select('*').eq('user_id', user_id).execute()
+        response = await db.execute(supabase.table('savings_goals').select('*').eq('user_id', user_id))
         goals = response.data if response.data else []
         
         # Mapear para os nomes que o frontend espera (compatibilidade com monolito)
@@ -41,7 +42,7 @@ async def create_goal(user_id: int, data: dict):
             'current_amount': float(data.get('valorAtual', 0)),
             'deadline': data.get('prazo')
         }
-        response = supabase.table('savings_goals').insert(goal_data).execute()
+        response = await db.execute(supabase.table('savings_goals').insert(goal_data))
         if response.data:
             return {"goal": response.data[0], "message": "Objetivo criado com sucesso"}
         raise HTTPException(status_code=400, detail="Failed to create goal")
@@ -58,7 +59,7 @@ async def update_goal(goal_id: int, data: dict):
         if 'valorAtual' in data:
             update_data['current_amount'] = float(data['valorAtual'])
         
-        response = supabase.table('savings_goals').update(update_data).eq('id', goal_id).execute()
+        response = await db.execute(supabase.table('savings_goals').update(update_data).eq('id', goal_id))
         if response.data:
             return {"goal": response.data[0]}
         raise HTTPException(status_code=404, detail="Goal not found")
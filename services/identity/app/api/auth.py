@@ -4,6 +4,7 @@ import os
 import requests
 from jose import jwt
 from app.infrastructure.supabase_client import sync_user_with_supabase, supabase
+from app.infrastructure import db
 
 router = APIRouter()
 
@@ -75,7 +76,7 @@ async def callback_google(request: Request, code: str = None, error: str = None)
             'grant_type': 'authorization_code'
         }
         
-        token_response = requests.post(GOOGLE_TOKEN_URL, data=token_data, timeout=10)
+        token_response = await db.run(requests.post, GOOGLE_TOKEN_URL, data=token_data, timeout=10)
 
         
         if token_response.status_code != 200:
@@ -94,7 +95,7 @@ async def callback_google(request: Request, code: str = None, error: str = None)
         display_name = decoded_token.get('name', email.split('@')[0] if email else 'User')
         
         # Sincronizar com Supabase
-        user_id = sync_user_with_supabase(external_id, email, display_name)
+        user_id = await db.run(sync_user_with_supabase, external_id, email, display_name)
         
         if not user_id:
             return RedirectResponse(f"{FRONTEND_URL}/login?error=db_error")
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Body
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 
 router = APIRouter()
 
@@ -12,7 +13,7 @@ async def get_user_settings(user_id: int):
     try:
         # Garantir que user_id é tratado como int se chegar como string
         u_id = int(str(user_id))
-        response = supabase.table('user_settings').select('*').eq('user_id', u_id).execute()
+        response = await db.execute(supabase.table('user_settings').select('*').eq('user_id', u_id))
         
         if response.data and len(response.data) > 0:
             settings = response.data[0]
@@ -96,7 +97,7 @@ async def update_user_settings(user_id: int, data: dict = Body(...)):
             'fundo_emergencia': data.get('fundoEmergencia'),
         }
         
-        supabase.table('user_settings').upsert(settings_data).execute()
+        await db.execute(supabase.table('user_settings').upsert(settings_data))
         return {'message': 'Configurações atualizadas', 'settings': settings_data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,11 @@
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
 from app.utils.auth import get_current_user
+from app.infrastructure.price_cache import price_cache
+from app.infrastructure.valuation import value_portfolio
+from app.infrastructure.price_history import price_history, PERIODS, RESOLUTIONS, CHART_MAX_POINTS
 from fastapi import APIRouter, HTTPException, Depends
-import random
-import requests
+import time
 
 router = APIRouter()
 
@@ -13,49 +16,36 @@ async def get_investments(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('investments').select('*').eq('user_id', user_id).execute()
+        response = await db.execute(supabase.table('investments').select('*').eq('user_id', user_id))
         investments = response.data if response.data else []
         
-        formatted = []
-        
-        # Obter IDs de cripto para CoinGecko (mapeamento simples)
-        crypto_map = {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana"}
         symbols = [inv.get('symbol', '').upper() for inv in investments]
-        crypto_ids = [crypto_map[s] for s in symbols if s in crypto_map]
-        
-        current_prices = {}
-        if crypto_ids:
-            try:
-                url = f"https://api.coingecko.com/api/v3/simple/price?ids={','.join(crypto_ids)}&vs_currencies=eur"
-                r = requests.get(url, timeout=5)
-                if r.status_code == 200:
-                    data = r.json()
-                    for s, cid in crypto_map.items():
-                        if cid in data:
-                            current_prices[s] = data[cid]['eur']
-            except:
-                pass # Fallback para simulação se a API falhar
+        # Só a cache: nunca esperar por uma API externa (o refresher atualiza em background)
+        reference = {inv.get('symbol', '').upper(): float(inv.get('last_price') or 0) for inv in investments}
+        quotes = price_cache.get_many(symbols, reference)
+        valuation = value_portfolio(investments, {s: q['price'] for s, q in quotes.items()})
 
-        for inv in investments:
+        formatted = []
+        for inv, position in zip(investments, valuation['positions']):
             symbol = inv.get('symbol', '').upper()
-            base_price = float(inv.get('last_price', 0))
-            
-            if symbol in current_prices:
-                real_price = current_prices[symbol]
-            else:
-                # Simular flutuação para ativos não-crypto ou se a API falhar
-                fluctuation = random.uniform(-0.005, 0.005)
-                real_price = base_price * (1 + fluctuation)
-            
+            quote = quotes.get(symbol)
+
             formatted.append({
                 'id': inv['id'],
                 'symbol': symbol,
                 'quantity': float(inv.get('quantity', 0)),
                 'avg_price': float(inv.get('avg_price', 0)),
-                'last_price': round(real_price, 2),
+                'last_price': position['price'],
                 'market': inv.get('market'),
+                'market_value': position['market_value'],
+                'cost_basis': position['cost_basis'],
+                'unrealized_pnl': position['unrealized_pnl'],
+                'unrealized_pnl_pct': position['unrealized_pnl_pct'],
+                'weight': position['weight'],
+                'price_updated_at': quote['updatedAt'] if quote else None,
+                'price_stale': quote['stale'] if quote else True,
             })
-        return {"investments": formatted}
+        return {"investments": formatted, "summary": valuation['summary']}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -75,7 +65,7 @@ async def add_investment(data: dict, current_user: dict = Depends(get_current_us
             'last_price': float(data.get('purchase_price', 0)),
             'currency': 'EUR'
         }
-        response = supabase.table('investments').insert(investment_data).execute()
+        response = await db.execute(supabase.table('investments').insert(investment_data))
         if response.data:
             return {"investment": response.data[0]}
         raise HTTPException(status_code=400, detail="Failed to create investment")
@@ -102,8 +92,75 @@ async def search_stocks(q: str):
     results = [s for s in mock_stocks if q.upper() in s["symbol"] or q.lower() in s["name"].lower()]
     return {"results": results}
 
+@router.get("/price/cache/stats")
+async def get_price_cache_stats():
+    return price_cache.stats()
+
 @router.get("/price/{symbol}")
 async def get_stock_price(symbol: str):
-    import random
-    # Retorna um preço simulado entre 50 e 500 para testes
-    return {"price": round(random.uniform(50, 500), 2)}
+    symbol = symbol.upper()
+    price = price_cache.get(symbol)
+    if price is None:
+        # Símbolo ainda não seguido (ex.: novo investimento): um pedido único ao fornecedor
+        await db.run(price_cache.refresh, [symbol])
+        price = price_cache.get(symbol)
+    if price is None:
+        # Sem fornecedor disponível: última cotação registada no histórico
+        last = price_history.last(symbol)
+        if last is None:
+            # Ex.: ação que ninguém detém (o simulado precisa de um preço de referência).
+            # Não é um erro: o cliente pede o preço ao utilizador
+            return {"symbol": symbol, "price": None, "quoted": False}
+        return {"symbol": symbol, "price": round(last[1], 2), "updatedAt": last[0], "quoted": True}
+    return {"symbol": symbol, "price": round(price, 2), "quoted": True}
+
+@router.get("/price/{symbol}/history")
+async def get_price_history(symbol: str, start: int = None, end: int = None, resolution: str = None):
+    symbol = symbol.upper()
+    end = end or int(time.time())
+    start = start if start is not None else end - PERIODS['1m']
+    if resolution is not None and resolution != 'raw' and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution: {resolution}")
+    if resolution is None:
+        resolution, rows = price_history.series(symbol, start, end)
+    else:
+        # Resolução explícita: limitar o tamanho da resposta (um mês em raw são ~170 mil pontos)
+        count = price_history.count(symbol, start, end, resolution)
+        if count > CHART_MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"Range has {count} points at resolution {resolution} (max {CHART_MAX_POINTS}); use a coarser resolution or a shorter range")
+        rows = price_history.range(symbol, start, end, resolution)
+    return {"symbol": symbol, "resolution": resolution, "points": [dict(zip(rows.dtype.names, row)) for row in rows.tolist()]}
+
+@router.get("/history")
+async def get_portfolio_history(period: str = '1m', current_user: dict = Depends(get_current_user)):
+    user_id = current_user['user_id']
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    if period != 'all' and period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Invalid period: {period}")
+
+    response = await db.execute(supabase.table('investments').select('symbol, quantity, last_price').eq('user_id', user_id))
+    quantities = {}
+    reference = {}
+    for inv in response.data or []:
+        symbol = inv.get('symbol', '').upper()
+        quantities[symbol] = quantities.get(symbol, 0) + float(inv.get('quantity') or 0)
+        reference[symbol] = reference.get(symbol) or float(inv.get('last_price') or 0)
+
+    end = int(time.time())
+    if period == 'all':
+        firsts = [t for t in (price_history.first_ts(s) for s in quantities) if t is not None]
+        start = min(firsts) if firsts else end - PERIODS['1d']
+    else:
+        start = end - PERIODS[period]
+    # Símbolos sem histórico entram ao preço atual (cache, ou o último gravado)
+    fallback = {s: q['price'] for s, q in price_cache.get_many(list(quantities), reference).items()}
+    for symbol, price in reference.items():
+        if price:
+            fallback.setdefault(symbol, price)
+    # Valor com as quantidades atuais (as compras e vendas passadas não ficam registadas)
+    resolution, grid, values, missing = price_history.portfolio_series(quantities, start, end, fallback=fallback)
+    return {"period": period, "resolution": resolution,
+            "points": [{"ts": t, "value": round(v, 2)} for t, v in zip(grid.tolist(), values.tolist())],
+            "flat": [s for s in missing if s in fallback],
+            "unpriced": [s for s in missing if s not in fallback]}
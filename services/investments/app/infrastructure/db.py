@@ -0,0 +1,30 @@
+"""
+Acesso à base de dados sem bloquear o event loop.
+
+O cliente supabase-py é síncrono: chamar `.execute()` dentro de um handler `async def`
+pára o event loop do worker até a resposta chegar. Aqui as queries correm num pool de
+threads limitado (DB_POOL_SIZE), partilhando o cliente `supabase` do processo, cujo
+cliente httpx mantém as ligações HTTP keep-alive abertas entre pedidos.
+
+    response = await db.execute(supabase.table('<tabela>').select('*').eq('user_id', user_id))
+    result = await db.run(funcao_bloqueante, user_id)
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db')
+
+
+async def run(fn, *args, **kwargs):
+    """Corre uma função bloqueante (queries, HTTP) no pool e devolve o resultado"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def execute(query):
+    """Executa um query builder do supabase-py no pool"""
+    return await run(query.execute)
@@ -0,0 +1,278 @@
+"""
+Cache de cotações partilhada pelo processo do Investment Service.
+
+Os pedidos de portfólio nunca chamam APIs externas: leem daqui o último preço conhecido,
+mesmo que já esteja fora de prazo (stale-while-revalidate). Uma thread em background:
+
+- descobre os símbolos detidos por qualquer utilizador (a cada PRICE_DISCOVERY_SECONDS);
+- atualiza os preços cujo TTL (definido por fornecedor) expirou, um pedido por fornecedor;
+- em caso de falha de um fornecedor, espera com backoff exponencial e continua a servir
+  os preços antigos;
+- grava o novo `last_price` em `investments` (uma escrita por símbolo alterado) e acrescenta
+  a cotação ao histórico local (app.infrastructure.price_history).
+
+Só as cotações de fornecedores reais (`real = True`) são gravadas e servem de base a
+atualizações seguintes; as do `simulated` e do `fake` apenas são mostradas.
+
+Os fornecedores são configuráveis por PRICE_PROVIDERS (lista por ordem de preferência):
+`coingecko` (cripto), `simulated` (variação aleatória à volta do último preço, como antes)
+e `fake` (preços determinísticos, sem rede, para testes e benchmarks).
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+
+import requests
+
+from app.infrastructure.price_history import price_history
+from app.infrastructure.supabase_client import supabase
+
+PRICE_PROVIDERS = os.getenv('PRICE_PROVIDERS', 'coingecko,simulated')
+PRICE_REFRESH_SECONDS = float(os.getenv('PRICE_REFRESH_SECONDS', '15'))
+PRICE_DISCOVERY_SECONDS = float(os.getenv('PRICE_DISCOVERY_SECONDS', '300'))
+PRICE_BACKOFF_MAX_SECONDS = 600
+DISCOVERY_PAGE_SIZE = 1000
+
+
+class CoinGeckoProvider:
+    name = 'coingecko'
+    ttl = 60
+    real = True
+    ids = {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana", "ADA": "cardano", "XRP": "ripple", "DOGE": "dogecoin"}
+
+    def __init__(self, timeout: float = 5):
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def supports(self, symbol: str) -> bool:
+        return symbol in self.ids
+
+    def fetch(self, symbols: list, reference: dict) -> dict:
+        url = "https://api.coingecko.com/api/v3/simple/price"
+        r = self._session.get(url, params={'ids': ','.join(self.ids[s] for s in symbols), 'vs_currencies': 'eur'}, timeout=self.timeout)
+        r.raise_for_status()
+        data = r.json()
+        return {s: float(data[self.ids[s]]['eur']) for s in symbols if self.ids[s] in data}
+
+
+class SimulatedProvider:
+    """Variação de ±0,5% à volta do preço gravado (ativos sem fonte real); nunca se acumula"""
+    name = 'simulated'
+    ttl = 30
+    real = False
+
+    def supports(self, symbol: str) -> bool:
+        return True
+
+    def fetch(self, symbols: list, reference: dict) -> dict:
+        return {s: reference[s] * (1 + random.uniform(-0.005, 0.005)) for s in symbols if reference.get(s)}
+
+
+class FakeProvider:
+    """Preços determinísticos por símbolo (ou os indicados), sem rede"""
+    name = 'fake'
+    ttl = 5
+    real = False
+
+    def __init__(self, prices: dict = None, latency: float = 0.0, fail: bool = False):
+        self.prices = prices or {}
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def supports(self, symbol: str) -> bool:
+        return True
+
+    def fetch(self, symbols: list, reference: dict) -> dict:
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("fake provider failure")
+        return {s: self.prices.get(s, self._price(s)) for s in symbols}
+
+    def _price(self, symbol: str) -> float:
+        return 10 + int(hashlib.sha256(symbol.encode('utf-8')).hexdigest()[:6], 16) % 99000 / 100
+
+
+PROVIDERS = {'coingecko': CoinGeckoProvider, 'simulated': SimulatedProvider, 'fake': FakeProvider}
+
+
+def providers_from_env(spec: str = PRICE_PROVIDERS) -> list:
+    return [PROVIDERS[name.strip()]() for name in spec.split(',') if name.strip()]
+
+
+class PriceCache:
+    def __init__(self, providers: list = None, refresh_seconds: float = PRICE_REFRESH_SECONDS,
+                 discovery_seconds: float = PRICE_DISCOVERY_SECONDS, persist: bool = True, history=price_history):
+        self.providers = providers if providers is not None else providers_from_env()
+        self.refresh_seconds = refresh_seconds
+        self.discovery_seconds = discovery_seconds
+        self.persist = persist
+        self.history = history
+        self._entries = {}         # symbol -> (preço, instante monotónico, epoch, fornecedor)
+        self._reference = {}       # symbol -> último preço gravado ou real (base do simulado; nunca um preço simulado)
+        self._backoff = {}         # fornecedor -> (falhas seguidas, monotónico da próxima tentativa)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_discovery = None
+        self.refreshes = 0
+        self.failures = 0
+
+    # --- Leituras (nunca bloqueiam em I/O) ---
+
+    def get_many(self, symbols: list, reference: dict = None) -> dict:
+        """
+        {symbol: {'price', 'updatedAt', 'stale', 'source'}} para os símbolos com preço em cache.
+        Símbolos novos ou fora de prazo ficam marcados para a próxima atualização.
+        """
+        result = {}
+        now = time.monotonic()
+        wake = False
+        with self._lock:
+            for symbol in symbols:
+                if reference and reference.get(symbol) and not self._reference.get(symbol):
+                    self._reference[symbol] = reference[symbol]
+                entry = self._entries.get(symbol)
+                if entry is None:
+                    self._reference.setdefault(symbol, None)
+                    wake = True
+                    continue
+                price, fetched, updated_at, provider = entry
+                stale = now - fetched > provider.ttl
+                wake = wake or stale
+                result[symbol] = {'price': price, 'updatedAt': updated_at, 'stale': stale, 'source': provider.name}
+        if wake:
+            self._wake.set()
+        return result
+
+    def get(self, symbol: str):
+        entry = self.get_many([symbol]).get(symbol)
+        return entry['price'] if entry else None
+
+    # --- Atualização ---
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='price-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._last_discovery is None or time.monotonic() - self._last_discovery >= self.discovery_seconds:
+                    self.discover()
+                self.refresh()
+            except Exception as e:
+                print(f" [ERROR] Price refresh failed: {e}")
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+
+    def discover(self):
+        """Regista todos os símbolos detidos por algum utilizador, com o último preço gravado"""
+        self._last_discovery = time.monotonic()
+        if not supabase:
+            return
+        offset = 0
+        while True:
+            resp = supabase.table('investments').select('symbol, last_price').order('id').range(offset, offset + DISCOVERY_PAGE_SIZE - 1).execute()
+            rows = resp.data or []
+            with self._lock:
+                for row in rows:
+                    symbol = (row.get('symbol') or '').upper()
+                    if symbol and not self._reference.get(symbol):
+                        self._reference[symbol] = float(row.get('last_price') or 0) or None
+            if len(rows) < DISCOVERY_PAGE_SIZE:
+                return
+            offset += DISCOVERY_PAGE_SIZE
+
+    def _provider_for(self, symbol: str):
+        for provider in self.providers:
+            if provider.supports(symbol):
+                return provider
+        return None
+
+    def refresh(self, symbols: list = None, force: bool = False) -> int:
+        """Atualiza os símbolos fora de prazo (ou os indicados). Devolve quantos preços mudaram."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = symbols if symbols is not None else list(self._reference)
+            due = {}
+            for symbol in candidates:
+                provider = self._provider_for(symbol)
+                if provider is None:
+                    continue
+                entry = self._entries.get(symbol)
+                if force or entry is None or now - entry[1] > provider.ttl:
+                    due.setdefault(provider, []).append(symbol)
+            reference = dict(self._reference)
+
+        updated = {}
+        real = {}
+        for provider, batch in due.items():
+            failures, retry_at = self._backoff.get(provider.name, (0, 0))
+            if retry_at > now:
+                continue
+            try:
+                prices = provider.fetch(batch, reference)
+            except Exception as e:
+                failures += 1
+                delay = min(self.refresh_seconds * 2 ** failures, PRICE_BACKOFF_MAX_SECONDS)
+                self._backoff[provider.name] = (failures, time.monotonic() + delay)
+                self.failures += 1
+                print(f" [FALLBACK] {provider.name} indisponível ({e}); a servir preços antigos, nova tentativa em {delay:.0f}s")
+                continue
+            self._backoff.pop(provider.name, None)
+            fetched = time.monotonic()
+            with self._lock:
+                for symbol, price in prices.items():
+                    self._entries[symbol] = (price, fetched, time.time(), provider)
+                    if provider.real:
+                        self._reference[symbol] = price
+            updated.update(prices)
+            if provider.real:
+                real.update(prices)
+        self.refreshes += 1
+        if real and self.history is not None:
+            try:
+                # Só cotações reais: o histórico alimenta gráficos e o fallback de /price/{symbol}
+                self.history.record(real)
+            except Exception as e:
+                print(f" [ERROR] Failed to record price history: {e}")
+        if real and self.persist:
+            self._persist(real)
+        return len(updated)
+
+    def _persist(self, prices: dict):
+        """Grava o último preço real em `investments`, para os outros serviços (ex.: saúde financeira)"""
+        if not supabase:
+            return
+        for symbol, price in prices.items():
+            try:
+                supabase.table('investments').update({'last_price': round(price, 2)}, returning='minimal').eq('symbol', symbol).execute()
+            except Exception as e:
+                print(f" [ERROR] Failed to persist price for {symbol}: {e}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            stale = sum(1 for price, fetched, _, provider in self._entries.values() if now - fetched > provider.ttl)
+            return {
+                'symbols': len(self._reference),
+                'cached': len(self._entries),
+                'stale': stale,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'providers': [p.name for p in self.providers],
+                'backoff': {name: round(max(retry_at - now, 0), 1) for name, (_, retry_at) in self._backoff.items()},
+            }
+
+
+price_cache = PriceCache()
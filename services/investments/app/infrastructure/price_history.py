@@ -0,0 +1,259 @@
+"""
+Histórico local de cotações: ficheiros binários de registos de largura fixa, por símbolo.
+
+Estrutura em PRICE_HISTORY_DIR:
+
+    BTC.raw.bin   (ts int64, price float64)                        16 bytes por cotação
+    BTC.1m.bin    (ts int64, open, high, low, close float64)       40 bytes por barra
+    BTC.1h.bin    idem, por hora
+    BTC.1d.bin    idem, por dia
+
+- As cotações (ts em segundos epoch, crescente) só são acrescentadas ao fim do .raw; as
+  barras são atualizadas na mesma escrita, reescrevendo apenas a última (ainda aberta).
+- As leituras usam np.memmap e procura binária na coluna `ts`, por isso uma consulta só
+  toca nas páginas do intervalo pedido, qualquer que seja o tamanho do ficheiro.
+- As escritas de cada símbolo são serializadas com flock (vários workers podem ter um
+  refresher de cotações ativo) e um tamanho que não seja múltiplo do registo (escrita
+  interrompida) é ignorado e depois sobrescrito.
+
+    python -m app.infrastructure.price_history stats
+    python -m app.infrastructure.price_history read BTC [--resolution 1h] [--days 7]
+"""
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'price_history')
+CHART_MAX_POINTS = 500
+
+RAW = np.dtype([('ts', '<i8'), ('price', '<f8')])
+BAR = np.dtype([('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8')])
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+PERIODS = {'1d': 86400, '1w': 7 * 86400, '1m': 30 * 86400, '3m': 90 * 86400, '1y': 365 * 86400}
+
+_SYMBOL = re.compile(r'^[A-Z0-9._-]{1,32}$')
+
+
+class PriceHistory:
+    def __init__(self, directory: str = PRICE_HISTORY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._maps = {}            # path -> memmap do ficheiro com o tamanho visto na última leitura
+
+    def _path(self, symbol: str, resolution: str) -> str:
+        if not _SYMBOL.match(symbol):
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+        return os.path.join(self.directory, f"{symbol}.{resolution}.bin")
+
+    def symbols(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-8] for name in os.listdir(self.directory) if name.endswith('.raw.bin'))
+
+    # --- Escrita ---
+
+    def record(self, prices: dict, ts: int = None):
+        """Acrescenta uma cotação por símbolo, todas com o mesmo instante (agora, por omissão)"""
+        ts = int(ts if ts is not None else time.time())
+        for symbol, price in prices.items():
+            if _SYMBOL.match(symbol):
+                self.append(symbol, [(ts, price)])
+
+    def append(self, symbol: str, points) -> int:
+        """Acrescenta cotações (ts, price) por ordem crescente; as que não forem mais recentes que a última são ignoradas"""
+        if isinstance(points, np.ndarray) and points.dtype == RAW:
+            new = points
+        else:
+            pairs = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            new = np.empty(len(pairs), dtype=RAW)
+            new['ts'] = pairs[:, 0]
+            new['price'] = pairs[:, 1]
+        if len(new) == 0:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            fd = os.open(self._path(symbol, 'raw'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                end = _aligned_size(fd, RAW)
+                if end:
+                    last_ts = np.frombuffer(os.pread(fd, RAW.itemsize, end - RAW.itemsize), dtype=RAW)['ts'][0]
+                    new = new[new['ts'] > last_ts]
+                    if len(new) == 0:
+                        return 0
+                if len(new) > 1 and np.any(np.diff(new['ts']) <= 0):
+                    raise ValueError("Timestamps must be strictly increasing")
+                os.pwrite(fd, new.tobytes(), end)
+                for resolution, seconds in RESOLUTIONS.items():
+                    self._roll(symbol, resolution, seconds, new)
+            finally:
+                os.close(fd)
+        return len(new)
+
+    def _roll(self, symbol: str, resolution: str, seconds: int, points: np.ndarray):
+        """Junta as novas cotações em barras e funde a primeira com a última barra do ficheiro, se for a mesma"""
+        bucket = points['ts'] - points['ts'] % seconds
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+        ends = np.append(starts[1:], len(points))
+        prices = points['price']
+        bars = np.empty(len(starts), dtype=BAR)
+        bars['ts'] = bucket[starts]
+        bars['open'] = prices[starts]
+        bars['high'] = np.maximum.reduceat(prices, starts)
+        bars['low'] = np.minimum.reduceat(prices, starts)
+        bars['close'] = prices[ends - 1]
+
+        fd = os.open(self._path(symbol, resolution), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            end = _aligned_size(fd, BAR)
+            if end:
+                last = np.frombuffer(os.pread(fd, BAR.itemsize, end - BAR.itemsize), dtype=BAR)[0]
+                if last['ts'] == bars[0]['ts']:
+                    bars[0]['open'] = last['open']
+                    bars[0]['high'] = max(last['high'], bars[0]['high'])
+                    bars[0]['low'] = min(last['low'], bars[0]['low'])
+                    end -= BAR.itemsize
+            os.pwrite(fd, bars.tobytes(), end)
+        finally:
+            os.close(fd)
+
+    # --- Leitura ---
+
+    def _view(self, symbol: str, resolution: str) -> np.ndarray:
+        dtype = RAW if resolution == 'raw' else BAR
+        if not _SYMBOL.match(symbol):
+            # Símbolo que não pode ser nome de ficheiro: nunca foi registado
+            return np.empty(0, dtype=dtype)
+        path = self._path(symbol, resolution)
+        try:
+            count = os.path.getsize(path) // dtype.itemsize
+        except FileNotFoundError:
+            return np.empty(0, dtype=dtype)
+        cached = self._maps.get(path)
+        if cached is not None and len(cached) == count:
+            return cached
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        view = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+        self._maps[path] = view
+        return view
+
+    def range(self, symbol: str, start: int, end: int, resolution: str = 'raw', include_previous: bool = False) -> np.ndarray:
+        """
+        Registos com start <= ts <= end (as barras cujo início cai no intervalo, mais a que contém `start`).
+        Com include_previous, inclui também o último registo anterior (para preencher o início de um gráfico).
+        """
+        view = self._view(symbol, resolution)
+        if resolution != 'raw':
+            start -= start % RESOLUTIONS[resolution]
+        ts = view['ts']
+        lo = int(np.searchsorted(ts, start, side='left'))
+        hi = int(np.searchsorted(ts, end, side='right'))
+        if include_previous and lo > 0:
+            lo -= 1
+        return np.array(view[lo:hi])
+
+    def last(self, symbol: str):
+        """(ts, price) da cotação mais recente, ou None"""
+        view = self._view(symbol, 'raw')
+        if len(view) == 0:
+            return None
+        return int(view[-1]['ts']), float(view[-1]['price'])
+
+    def first_ts(self, symbol: str):
+        view = self._view(symbol, 'raw')
+        return int(view[0]['ts']) if len(view) else None
+
+    def count(self, symbol: str, start: int, end: int, resolution: str = 'raw') -> int:
+        """Número de registos que `range` devolveria, sem os copiar"""
+        if resolution != 'raw':
+            start -= start % RESOLUTIONS[resolution]
+        ts = self._view(symbol, resolution)['ts']
+        return int(np.searchsorted(ts, end, side='right') - np.searchsorted(ts, start, side='left'))
+
+    def series(self, symbol: str, start: int, end: int, max_points: int = CHART_MAX_POINTS):
+        """A resolução mais fina com no máximo max_points registos no intervalo, e esses registos"""
+        for resolution in ('raw', *RESOLUTIONS):
+            if self.count(symbol, start, end, resolution) <= max_points or resolution == '1d':
+                return resolution, self.range(symbol, start, end, resolution)
+
+    def portfolio_series(self, quantities: dict, start: int, end: int, max_points: int = CHART_MAX_POINTS, fallback: dict = None):
+        """
+        Valor de uma carteira (quantidades atuais por símbolo) ao longo do tempo.
+        Os fechos de cada símbolo são alinhados numa grelha comum (último preço conhecido
+        em cada ponto) e o valor sai de um único produto matriz-vetor.
+
+        Símbolos sem histórico (ex.: ações, que não têm fornecedor real) entram como uma
+        linha constante ao preço de `fallback`; os que também não o têm ficam de fora e são
+        devolvidos em `missing`, junto com os primeiros.
+        """
+        span = max(end - start, 1)
+        resolution = next((r for r, s in RESOLUTIONS.items() if span / s <= max_points), '1d')
+        seconds = RESOLUTIONS[resolution]
+        grid = np.arange(start - start % seconds, end + 1, seconds, dtype=np.int64)
+
+        symbols = list(quantities)
+        closes = np.zeros((len(symbols), len(grid)))
+        missing = []
+        for i, symbol in enumerate(symbols):
+            bars = self.range(symbol, start, end, resolution, include_previous=True)
+            if len(bars) == 0:
+                missing.append(symbol)
+                closes[i] = (fallback or {}).get(symbol) or 0.0
+                continue
+            idx = np.searchsorted(bars['ts'], grid, side='right') - 1
+            # Antes da primeira cotação conhecida, usar o primeiro fecho (evita degraus artificiais)
+            closes[i] = bars['close'][np.maximum(idx, 0)]
+        values = np.array([quantities[s] for s in symbols], dtype=np.float64) @ closes if symbols else np.zeros(len(grid))
+        return resolution, grid, values, missing
+
+    def stats(self) -> dict:
+        symbols = self.symbols()
+        size = sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)) if symbols else 0
+        return {
+            'directory': self.directory,
+            'symbols': len(symbols),
+            'points': sum(len(self._view(s, 'raw')) for s in symbols),
+            'bytes': size,
+        }
+
+
+def _aligned_size(fd: int, dtype: np.dtype) -> int:
+    """Tamanho útil do ficheiro: ignora um registo incompleto no fim (escrita interrompida)"""
+    size = os.fstat(fd).st_size
+    return size - size % dtype.itemsize
+
+
+price_history = PriceHistory()
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from datetime import datetime, timezone
+
+    parser = argparse.ArgumentParser(prog='python -m app.infrastructure.price_history')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats')
+    read = sub.add_parser('read')
+    read.add_argument('symbol')
+    read.add_argument('--resolution', default='1h', choices=['raw', *RESOLUTIONS])
+    read.add_argument('--days', type=float, default=7)
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print(json.dumps(price_history.stats(), indent=2))
+    else:
+        now = int(time.time())
+        for row in price_history.range(args.symbol.upper(), now - int(args.days * 86400), now, args.resolution):
+            when = datetime.fromtimestamp(int(row['ts']), tz=timezone.utc).isoformat()
+            print(when, *(f"{float(v):.4f}" for v in list(row)[1:]))
@@ -0,0 +1,163 @@
+"""
+Avaliação de carteiras com numpy.
+
+As posições são carregadas em arrays (quantidade, preço médio, preço atual, mercado,
+utilizador) e o valor de mercado, o custo, o P&L não realizado, os pesos e os totais por
+mercado saem de uma única passagem vetorizada, sem ciclos Python por posição.
+
+`value_portfolio` avalia a carteira de um utilizador (GET /investments); `revalue_all`
+avalia todas as carteiras de uma vez, para jobs noturnos:
+
+    python -m app.infrastructure.valuation
+"""
+import json
+
+import numpy as np
+
+HOLDINGS_PAGE_SIZE = 1000
+
+
+class Holdings:
+    """Posições em formato colunar; `symbols`/`markets` guardam índices para as tabelas respetivas"""
+
+    def __init__(self, rows: list):
+        n = len(rows)
+        self.ids = [row.get('id') for row in rows]
+        self.user_ids = np.fromiter((row.get('user_id') or 0 for row in rows), dtype=np.int64, count=n)
+        self.quantity = np.fromiter((float(row.get('quantity') or 0) for row in rows), dtype=np.float64, count=n)
+        self.avg_price = np.fromiter((float(row.get('avg_price') or 0) for row in rows), dtype=np.float64, count=n)
+        self.last_price = np.fromiter((float(row.get('last_price') or 0) for row in rows), dtype=np.float64, count=n)
+        # Codificar por dicionário (O(n)) em vez de ordenar strings com np.unique
+        self.symbol_table, self.symbols = _encode([(row.get('symbol') or '').upper() for row in rows])
+        self.market_table, self.markets = _encode([row.get('market') or 'stock' for row in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Valuation:
+    """Resultado por posição (arrays alinhados com Holdings)"""
+
+    def __init__(self, holdings: Holdings, prices: dict = None):
+        self.holdings = holdings
+        # Preço atual por símbolo (cache de cotações), com o último preço gravado como fallback
+        table = np.array([(prices or {}).get(s, np.nan) for s in holdings.symbol_table], dtype=np.float64)
+        price = table[holdings.symbols] if len(holdings) else np.zeros(0)
+        self.price = np.where(np.isnan(price), holdings.last_price, price)
+        # Sem preço médio registado, o custo é o preço atual (como o frontend fazia)
+        buy_price = np.where(holdings.avg_price > 0, holdings.avg_price, self.price)
+        self.market_value = holdings.quantity * self.price
+        self.cost_basis = holdings.quantity * buy_price
+        self.pnl = self.market_value - self.cost_basis
+        self.pnl_pct = _ratio(self.pnl, self.cost_basis) * 100
+
+
+def _encode(values: list):
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+    return list(index), codes
+
+
+def _ratio(num, den):
+    return np.divide(num, den, out=np.zeros_like(num, dtype=np.float64), where=den != 0)
+
+
+def _summary(value: float, cost: float) -> dict:
+    return {
+        'total_value': round(float(value), 2),
+        'total_invested': round(float(cost), 2),
+        'unrealized_pnl': round(float(value - cost), 2),
+        'unrealized_pnl_pct': round(float((value - cost) / cost * 100), 2) if cost else 0.0,
+    }
+
+
+def value_portfolio(rows: list, prices: dict = None) -> dict:
+    """Posições avaliadas e totais (geral e por mercado) da carteira de um utilizador"""
+    holdings = Holdings(rows)
+    v = Valuation(holdings, prices)
+    total = v.market_value.sum()
+    weights = v.market_value / total * 100 if total else np.zeros(len(holdings))
+
+    n_markets = len(holdings.market_table)
+    market_value = np.bincount(holdings.markets, weights=v.market_value, minlength=n_markets)
+    market_cost = np.bincount(holdings.markets, weights=v.cost_basis, minlength=n_markets)
+
+    positions = [{
+        'id': holdings.ids[i],
+        'price': round(float(v.price[i]), 2),
+        'market_value': round(float(v.market_value[i]), 2),
+        'cost_basis': round(float(v.cost_basis[i]), 2),
+        'unrealized_pnl': round(float(v.pnl[i]), 2),
+        'unrealized_pnl_pct': round(float(v.pnl_pct[i]), 2),
+        'weight': round(float(weights[i]), 2),
+    } for i in range(len(holdings))]
+
+    by_market = {}
+    for m, market in enumerate(holdings.market_table):
+        by_market[market] = _summary(market_value[m], market_cost[m])
+        by_market[market]['weight'] = round(float(market_value[m] / total * 100), 2) if total else 0.0
+
+    return {'positions': positions, 'summary': {**_summary(total, v.cost_basis.sum()), 'by_market': by_market}}
+
+
+def revalue_all(holdings: Holdings, prices: dict = None) -> dict:
+    """
+    Avalia todas as carteiras numa passagem: {user_id: summary}, com os totais por mercado.
+    Os pesos de cada posição na carteira do seu utilizador ficam em `weights` (alinhados com holdings).
+    """
+    v = Valuation(holdings, prices)
+    users, owner = np.unique(holdings.user_ids, return_inverse=True)
+    n_users, n_markets = len(users), len(holdings.market_table)
+
+    user_value = np.bincount(owner, weights=v.market_value, minlength=n_users)
+    user_cost = np.bincount(owner, weights=v.cost_basis, minlength=n_users)
+    weights = _ratio(v.market_value, user_value[owner]) * 100
+
+    cell = owner * n_markets + holdings.markets
+    cell_value = np.bincount(cell, weights=v.market_value, minlength=n_users * n_markets).reshape(n_users, n_markets)
+    cell_cost = np.bincount(cell, weights=v.cost_basis, minlength=n_users * n_markets).reshape(n_users, n_markets)
+    held = np.bincount(cell, minlength=n_users * n_markets).reshape(n_users, n_markets) > 0
+
+    # Arredondamentos em bloco; o ciclo final só monta os dicts de resposta
+    user_pnl = user_value - user_cost
+    user_pct = _ratio(user_pnl, user_cost) * 100
+    cell_pnl = cell_value - cell_cost
+    cell_pct = _ratio(cell_pnl, cell_cost) * 100
+    totals = zip(users.tolist(), np.round(user_value, 2).tolist(), np.round(user_cost, 2).tolist(),
+                 np.round(user_pnl, 2).tolist(), np.round(user_pct, 2).tolist())
+    cells = [np.round(a, 2).tolist() for a in (cell_value, cell_cost, cell_pnl, cell_pct)]
+    held = held.tolist()
+
+    markets = holdings.market_table
+    result = {}
+    for u, (user_id, value, cost, pnl, pct) in enumerate(totals):
+        by_market = {}
+        for m, market in enumerate(markets):
+            if held[u][m]:
+                by_market[market] = {'total_value': cells[0][u][m], 'total_invested': cells[1][u][m],
+                                     'unrealized_pnl': cells[2][u][m], 'unrealized_pnl_pct': cells[3][u][m]}
+        result[user_id] = {'total_value': value, 'total_invested': cost, 'unrealized_pnl': pnl,
+                           'unrealized_pnl_pct': pct, 'by_market': by_market}
+    return {'users': result, 'weights': weights}
+
+
+def load_all_holdings() -> Holdings:
+    """Todas as posições de todos os utilizadores (leitura paginada)"""
+    # Import tardio: o motor de cálculo em si não depende da base de dados
+    from app.infrastructure.supabase_client import supabase
+    if not supabase:
+        raise RuntimeError("Database not configured")
+    rows = []
+    offset = 0
+    while True:
+        resp = supabase.table('investments').select('id, user_id, symbol, market, quantity, avg_price, last_price').order('id').range(offset, offset + HOLDINGS_PAGE_SIZE - 1).execute()
+        page = resp.data or []
+        rows.extend(page)
+        if len(page) < HOLDINGS_PAGE_SIZE:
+            return Holdings(rows)
+        offset += HOLDINGS_PAGE_SIZE
+
+
+if __name__ == '__main__':
+    # Job noturno: usa o last_price mantido pelo refresher da cache de cotações
+    print(json.dumps(revalue_all(load_all_holdings())['users'], indent=2))
@@ -12,6 +12,17 @@ app = FastAPI(
     }
 )
 
+@app.on_event("startup")
+def startup_event():
+    # Cotações atualizadas em background: os pedidos de portfólio só leem a cache
+    from app.infrastructure.price_cache import price_cache
+    price_cache.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    from app.infrastructure.price_cache import price_cache
+    price_cache.stop()
+
 allowed_origins = os.getenv('ALLOWED_ORIGINS', '*').split(',')
 
 app.add_middleware(
@@ -0,0 +1,134 @@
+"""
+Benchmark: histórico de cotações em ficheiros memory-mapped (app.infrastructure.price_history).
+
+Corre num diretório temporário, sem dependências externas além de numpy:
+    python benchmarks/bench_price_history.py --days 365 --symbols 20
+
+Escreve um ano de cotações ao minuto para um símbolo e mede:
+- débito de escrita (por dia de cotações e uma cotação de cada vez, como o refresher faz);
+- consultas por intervalo em várias resoluções vs carregar o ficheiro inteiro e filtrar;
+- a série de valor de uma carteira com N símbolos (30 dias ao minuto cada);
+e verifica que uma carteira mista (cripto com histórico + ação sem histórico) é
+desenhada pelo valor total, com a ação ao preço atual.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DAY = 86400
+
+
+def random_walk(start_ts: int, count: int, step: int = 60, price: float = 100.0):
+    ts = start_ts + np.arange(count, dtype=np.int64) * step
+    prices = price * np.exp(np.cumsum(np.random.normal(0, 0.0005, count)))
+    return ts, prices
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from app.infrastructure.price_history import PriceHistory, RAW
+
+    np.random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        history = PriceHistory(tmp)
+        end = int(time.time()) // 60 * 60
+        start = end - args.days * DAY
+        ts, prices = random_walk(start, args.days * 1440)
+
+        t0 = time.perf_counter()
+        for day in range(args.days):
+            chunk = slice(day * 1440, (day + 1) * 1440)
+            points = np.empty(1440, dtype=RAW)
+            points['ts'], points['price'] = ts[chunk], prices[chunk]
+            history.append('BTC', points)
+        bulk = time.perf_counter() - t0
+
+        single_ts, single_prices = random_walk(end + 60, 5000)
+        t0 = time.perf_counter()
+        for t, p in zip(single_ts.tolist(), single_prices.tolist()):
+            history.append('BTC', [(t, p)])
+        single = time.perf_counter() - t0
+
+        raw_path = os.path.join(tmp, 'BTC.raw.bin')
+        print(f"{len(ts) + 5000} cotações de BTC ({os.path.getsize(raw_path) / 1e6:.1f} MB raw)")
+        print(f"  escrita por dia (1440 cotações):  {len(ts) / bulk:,.0f} cotações/s")
+        print(f"  escrita uma a uma:                {5000 / single:,.0f} cotações/s\n")
+
+        rng = np.random.default_rng(1)
+
+        def window(span):
+            lo = int(rng.integers(start, end - span))
+            return lo, lo + span
+
+        queries = [
+            ('1 dia, raw', DAY, 'raw'),
+            ('1 semana, 1m', 7 * DAY, '1m'),
+            ('1 mês, 1h', 30 * DAY, '1h'),
+            (f'{args.days} dias, 1d', args.days * DAY - 1, '1d'),
+        ]
+        print(f"Consultas por intervalo (mediana de {args.repeat}):")
+        for label, span, resolution in queries:
+            mapped = timed(lambda: history.range('BTC', *window(span), resolution), args.repeat)
+            path = os.path.join(tmp, f'BTC.{resolution}.bin')
+            dtype = RAW if resolution == 'raw' else history._view('BTC', resolution).dtype
+
+            def full_scan():
+                # Alternativa sem índice: ler o ficheiro todo e filtrar
+                data = np.fromfile(path, dtype=dtype)
+                lo, hi = window(span)
+                return data[(data['ts'] >= lo) & (data['ts'] <= hi)]
+
+            scan = timed(full_scan, max(args.repeat // 10, 5))
+            rows = len(history.range('BTC', *window(span), resolution))
+            print(f"  {label:<16} {rows:>6} registos  memmap {mapped * 1e6:8.1f} µs   ficheiro inteiro {scan * 1e3:7.2f} ms")
+
+        quantities = {}
+        month = 30 * 1440
+        for i in range(args.symbols):
+            symbol = f"SYM{i}"
+            s_ts, s_prices = random_walk(end - 30 * DAY, month, price=np.random.uniform(10, 500))
+            points = np.empty(month, dtype=RAW)
+            points['ts'], points['price'] = s_ts, s_prices
+            history.append(symbol, points)
+            quantities[symbol] = float(np.random.uniform(1, 50))
+
+        print(f"\nSérie de valor de uma carteira com {args.symbols} símbolos (mediana):")
+        for label, span in (('1 dia', DAY), ('1 semana', 7 * DAY), ('1 mês', 30 * DAY)):
+            t = timed(lambda: history.portfolio_series(quantities, end - span, end), max(args.repeat // 4, 10))
+            resolution, grid, _, _ = history.portfolio_series(quantities, end - span, end)
+            print(f"  {label:<9} {len(grid):>4} pontos ({resolution})  {t * 1e3:.2f} ms")
+
+        # Carteira mista: a ação não tem histórico e entra ao preço atual (linha constante)
+        mixed = {'SYM0': 2.0, 'AAPL': 3.0, 'NOPRICE': 1.0}
+        resolution, grid, values, missing = history.portfolio_series(mixed, end - DAY, end, fallback={'AAPL': 150.0})
+        crypto = history.range('SYM0', end - DAY, end, resolution, include_previous=True)
+        idx = np.maximum(np.searchsorted(crypto['ts'], grid, side='right') - 1, 0)
+        expected = 2.0 * crypto['close'][idx] + 3.0 * 150.0
+        assert np.allclose(values, expected), "carteira mista não inclui a ação sem histórico"
+        assert missing == ['AAPL', 'NOPRICE'], missing
+        print(f"\nCarteira mista (cripto + ação sem histórico): valor total ok, sem histórico: {missing}")
+
+
+if __name__ == '__main__':
+    main()
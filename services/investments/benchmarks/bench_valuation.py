@@ -0,0 +1,113 @@
+"""
+Benchmark: avaliação de carteiras posição a posição (dicts, como o GET /investments fazia)
+vs o motor vetorizado (app.infrastructure.valuation).
+
+Gera carteiras sintéticas em memória, sem base de dados nem APIs externas:
+    python benchmarks/bench_valuation.py --users 10000 --holdings 50
+
+Mede a revalorização de todos os utilizadores numa passagem (job noturno), separando o
+custo de carregar as linhas para arrays do cálculo em si, e a latência de uma carteira.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MARKETS = ['stock', 'crypto', 'etf']
+
+
+def synthetic_rows(users: int, holdings: int, symbols: int = 2000):
+    universe = [(f"SYM{i}", random.choice(MARKETS), random.uniform(1, 1000)) for i in range(symbols)]
+    rows = []
+    for user_id in range(1, users + 1):
+        for symbol, market, price in random.sample(universe, holdings):
+            rows.append({
+                'id': len(rows) + 1,
+                'user_id': user_id,
+                'symbol': symbol,
+                'market': market,
+                'quantity': round(random.uniform(0.1, 100), 4),
+                'avg_price': round(price * random.uniform(0.5, 1.5), 2),
+                'last_price': round(price, 2),
+            })
+    prices = {symbol: price * random.uniform(0.95, 1.05) for symbol, _, price in universe}
+    return rows, prices
+
+
+def legacy_revalue(rows: list, prices: dict) -> dict:
+    """Um dict de cada vez: agrupar por utilizador e somar em Python"""
+    portfolios = {}
+    for row in rows:
+        portfolios.setdefault(row['user_id'], []).append(row)
+    result = {}
+    for user_id, positions in portfolios.items():
+        total = cost = 0.0
+        by_market = {}
+        valued = []
+        for inv in positions:
+            price = prices.get(inv['symbol'].upper(), float(inv.get('last_price', 0)))
+            buy = float(inv['avg_price']) if float(inv['avg_price']) > 0 else price
+            value = float(inv['quantity']) * price
+            basis = float(inv['quantity']) * buy
+            total += value
+            cost += basis
+            market = by_market.setdefault(inv['market'], [0.0, 0.0])
+            market[0] += value
+            market[1] += basis
+            valued.append((value, basis, (value - basis) / basis * 100 if basis else 0.0))
+        weights = [value / total * 100 if total else 0.0 for value, _, _ in valued]
+        result[user_id] = {'total_value': round(total, 2), 'total_invested': round(cost, 2),
+                           'unrealized_pnl': round(total - cost, 2), 'weights': weights, 'by_market': by_market}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--holdings', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from app.infrastructure.valuation import Holdings, revalue_all, value_portfolio
+
+    random.seed(42)
+    rows, prices = synthetic_rows(args.users, args.holdings)
+    print(f"{args.users} utilizadores x {args.holdings} posições = {len(rows)} linhas, {len(prices)} símbolos\n")
+
+    legacy, load, engine = [], [], []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        expected = legacy_revalue(rows, prices)
+        legacy.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        holdings = Holdings(rows)
+        load.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        result = revalue_all(holdings, prices)
+        engine.append(time.perf_counter() - t0)
+
+    # Os dois caminhos têm de chegar aos mesmos totais
+    for user_id in random.sample(list(expected), 100):
+        assert abs(expected[user_id]['total_value'] - result['users'][user_id]['total_value']) < 0.02
+
+    print("Revalorização de todos os utilizadores (mediana):")
+    print(f"  posição a posição       {statistics.median(legacy) * 1000:9.1f} ms")
+    print(f"  vetorizado (cálculo)    {statistics.median(engine) * 1000:9.1f} ms   ({statistics.median(legacy) / statistics.median(engine):.1f}x)")
+    print(f"  carregar para arrays    {statistics.median(load) * 1000:9.1f} ms")
+
+    portfolio = rows[:args.holdings]
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        value_portfolio(portfolio, prices)
+    single = (time.perf_counter() - t0) / 1000
+    print(f"\nUma carteira ({args.holdings} posições, value_portfolio): {single * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,74 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Body
+from typing import Optional
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure import db
+from app.infrastructure.messaging import consumer_stats
+from app.utils.pagination import apply_keyset, encode_cursor
 
 router = APIRouter()
 
 @router.get("/")
-async def get_notifications(user_id: int):
+async def get_notifications(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    unread_only: bool = False
+):
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
-        return {"notifications": response.data}
+        query = supabase.table('notifications').select('*').eq('user_id', user_id)
+        if unread_only:
+            query = query.eq('is_read', False)
+        # Pedir uma linha a mais para saber se existe página seguinte
+        response = await db.execute(apply_keyset(query, cursor).limit(limit + 1))
+        rows = response.data or []
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return {"notifications": rows[:limit], "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/unread-count")
+async def get_unread_count(user_id: int):
+    """Número de não lidas, lido do contador mantido por trigger (sql/notification_counters.sql)"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    
+    try:
+        response = await db.execute(supabase.table('notification_counters').select('unread').eq('user_id', user_id).limit(1))
+        return {"unread": response.data[0]['unread'] if response.data else 0}
+    except Exception:
+        # Sem a tabela de contadores: contagem no servidor, sem transferir linhas
+        try:
+            response = await db.execute(supabase.table('notifications').select('id', count='exact', head=True).eq('user_id', user_id).eq('is_read', False))
+            return {"unread": response.count or 0}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/read")
+async def mark_many_as_read(user_id: int, data: dict = Body(...)):
+    """Marca como lidas as notificações em `ids`, ou todas as do utilizador com {"all": true}, num único update"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    
+    mark_all = bool(data.get('all'))
+    try:
+        ids = [int(i) for i in data.get('ids') or []]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'ids' must be a list of integers")
+    if not mark_all and not ids:
+        raise HTTPException(status_code=400, detail="Provide 'ids' or 'all': true")
+    
+    try:
+        # Sem devolver as linhas atualizadas: só a contagem
+        query = supabase.table('notifications').update({'is_read': True}, count='exact', returning='minimal').eq('user_id', user_id).eq('is_read', False)
+        if not mark_all:
+            query = query.in_('id', ids)
+        response = await db.execute(query)
+        return {"success": True, "updated": response.count or 0}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -20,7 +78,12 @@ async def mark_as_read(notification_id: int):
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        response = supabase.table('notifications').update({'is_read': True}).eq('id', notification_id).execute()
+        response = await db.execute(supabase.table('notifications').update({'is_read': True}).eq('id', notification_id))
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/consumer/stats")
+async def consumer_stats_endpoint():
+    """Débito do consumidor de eventos (notificações gravadas, lotes, eventos/s)"""
+    return consumer_stats.snapshot()
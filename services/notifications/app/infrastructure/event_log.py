@@ -0,0 +1,392 @@
+"""
+Log local de eventos, só de acréscimo e segmentado (fallback quando o RabbitMQ não está disponível).
+
+Substitui o antigo `events_log.json` único. Estrutura em EVENT_LOG_DIR:
+
+    00000000000000000000.log   registos JSON, um por linha: {"offset", "type", "data"}
+    00000000000000000000.idx   posição em bytes de cada registo do segmento (8 bytes cada)
+    consumers/<nome>.offset    próximo offset a ler por cada consumidor (checkpoint)
+
+- Cada offset é global e crescente; o nome do segmento é o offset do primeiro registo.
+- Passa-se a um novo segmento quando o ativo excede EVENT_LOG_SEGMENT_BYTES.
+- Os lotes são escritos de uma vez; o fsync é agrupado (no máximo um por EVENT_LOG_FSYNC_MS).
+- O índice é escrito depois dos dados, por isso um leitor nunca vê um registo incompleto.
+- `compact()` apaga os segmentos que todos os consumidores registados já confirmaram.
+- `watcher()` devolve um LogWatcher para os leitores acordarem assim que há novos registos
+  (inotify em Linux; noutros sistemas, verificação a cada EVENT_LOG_POLL_MS).
+
+Este módulo existe igual no Finance Service (escreve) e no Notification Service (lê).
+
+    python -m app.infrastructure.event_log stats
+    python -m app.infrastructure.event_log read --from 0 [--limit N]
+    python -m app.infrastructure.event_log compact
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import threading
+import time
+from bisect import bisect_right
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', 'events_log')
+EVENT_LOG_SEGMENT_BYTES = int(os.getenv('EVENT_LOG_SEGMENT_BYTES', str(8 * 1024 * 1024)))
+EVENT_LOG_FSYNC_MS = float(os.getenv('EVENT_LOG_FSYNC_MS', '50'))
+EVENT_LOG_POLL_MS = float(os.getenv('EVENT_LOG_POLL_MS', '50'))
+
+INDEX_ENTRY = struct.Struct('>Q')
+SEGMENT_DIGITS = 20
+
+
+def _segment_name(base_offset: int, ext: str) -> str:
+    return f"{base_offset:0{SEGMENT_DIGITS}d}.{ext}"
+
+
+class EventLog:
+    def __init__(self, directory: str = EVENT_LOG_DIR, segment_bytes: int = EVENT_LOG_SEGMENT_BYTES,
+                 fsync_ms: float = EVENT_LOG_FSYNC_MS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_ms / 1000
+        self._lock = threading.Lock()
+        self._unsynced = set()
+        self._sync_timer = None
+        self._active = None            # (base, tamanho do .idx, tamanho do .log) após a última escrita deste processo
+
+    # --- Segmentos ---
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def segments(self) -> list:
+        """Offsets base dos segmentos existentes, por ordem"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith('.log') and name[:-4].isdigit())
+
+    def _count(self, base_offset: int) -> int:
+        """Registos completos do segmento (entradas inteiras no índice)"""
+        try:
+            return os.path.getsize(self._path(_segment_name(base_offset, 'idx'))) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def end_offset(self) -> int:
+        """Offset que o próximo registo vai receber"""
+        segments = self.segments()
+        if not segments:
+            return 0
+        return segments[-1] + self._count(segments[-1])
+
+    # --- Escrita ---
+
+    def append(self, events: list) -> int:
+        """Acrescenta [(type, data), ...] num único write. Devolve o offset do primeiro registo."""
+        if not events:
+            return self.end_offset()
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, self._file_lock():
+            base, idx_size, log_size = self._active_segment()
+            first = base + idx_size // INDEX_ENTRY.size
+            if log_size >= self.segment_bytes:
+                base, idx_size, log_size = first, 0, 0
+            log_path = self._path(_segment_name(base, 'log'))
+            idx_path = self._path(_segment_name(base, 'idx'))
+
+            lines = [
+                (json.dumps({"offset": first + i, "type": event_type, "data": data}) + "\n").encode('utf-8')
+                for i, (event_type, data) in enumerate(events)
+            ]
+            with open(log_path, 'ab') as log:
+                if log.tell() != log_size:
+                    log.truncate(log_size)
+                log.write(b''.join(lines))
+            entries = []
+            position = log_size
+            for line in lines:
+                entries.append(INDEX_ENTRY.pack(position))
+                position += len(line)
+            with open(idx_path, 'ab') as idx:
+                if idx.tell() != idx_size:
+                    idx.truncate(idx_size)
+                idx.write(b''.join(entries))
+            self._active = (base, idx_size + len(entries) * INDEX_ENTRY.size, position)
+            self._unsynced.update((log_path, idx_path))
+        self._schedule_sync()
+        return first
+
+    def _active_segment(self):
+        """
+        (base, tamanho válido do .idx, tamanho válido do .log) do segmento ativo.
+        Se os ficheiros não mudaram desde a última escrita deste processo, evita listar o
+        diretório e reler o índice; caso contrário, recupera o estado a partir do disco e
+        descarta uma cauda sem índice deixada por uma escrita interrompida.
+        """
+        if self._active is not None:
+            base, idx_size, log_size = self._active
+            try:
+                if (os.path.getsize(self._path(_segment_name(base, 'idx'))) == idx_size
+                        and os.path.getsize(self._path(_segment_name(base, 'log'))) == log_size):
+                    return self._active
+            except FileNotFoundError:
+                pass
+        segments = self.segments()
+        base = segments[-1] if segments else 0
+        count = self._count(base)
+        return base, count * INDEX_ENTRY.size, self._expected_size(base)
+
+    def _expected_size(self, base_offset: int) -> int:
+        """Tamanho do .log até ao fim do último registo indexado"""
+        count = self._count(base_offset)
+        if not count:
+            return 0
+        with open(self._path(_segment_name(base_offset, 'idx')), 'rb') as idx:
+            idx.seek((count - 1) * INDEX_ENTRY.size)
+            last = INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))[0]
+        with open(self._path(_segment_name(base_offset, 'log')), 'rb') as log:
+            log.seek(last)
+            return last + len(log.readline())
+
+    def _file_lock(self):
+        return _FileLock(self._path('.lock'))
+
+    def _schedule_sync(self):
+        if self.fsync_interval <= 0:
+            self.sync()
+            return
+        with self._lock:
+            if self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def sync(self):
+        """fsync dos ficheiros escritos desde o último sync"""
+        with self._lock:
+            paths, self._unsynced = self._unsynced, set()
+            self._sync_timer = None
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # --- Leitura ---
+
+    def read(self, offset: int, limit: int = 1000) -> list:
+        """Até `limit` registos a partir de `offset`, como dicts {"offset", "type", "data"}"""
+        segments = self.segments()
+        records = []
+        i = max(bisect_right(segments, offset) - 1, 0)
+        while i < len(segments) and len(records) < limit:
+            base = segments[i]
+            count = self._count(base)
+            start = max(offset, base) - base
+            if start < count:
+                records.extend(self._read_segment(base, start, min(count, start + limit - len(records))))
+            i += 1
+        return records
+
+    def _read_segment(self, base_offset: int, start: int, stop: int) -> list:
+        with open(self._path(_segment_name(base_offset, 'idx')), 'rb') as idx:
+            idx.seek(start * INDEX_ENTRY.size)
+            position = INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))[0]
+        records = []
+        with open(self._path(_segment_name(base_offset, 'log')), 'rb') as log:
+            log.seek(position)
+            for _ in range(stop - start):
+                records.append(json.loads(log.readline()))
+        return records
+
+    # --- Consumidores e compactação ---
+
+    def committed(self, consumer: str) -> int:
+        try:
+            with open(self._path('consumers', f"{consumer}.offset")) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def commit(self, consumer: str, offset: int):
+        """Guarda o próximo offset a ler pelo consumidor (escrita atómica)"""
+        os.makedirs(self._path('consumers'), exist_ok=True)
+        path = self._path('consumers', f"{consumer}.offset")
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def consumers(self) -> dict:
+        if not os.path.isdir(self._path('consumers')):
+            return {}
+        return {name[:-7]: self.committed(name[:-7]) for name in os.listdir(self._path('consumers')) if name.endswith('.offset')}
+
+    def compact(self) -> int:
+        """Apaga segmentos já lidos por todos os consumidores (nunca o ativo). Devolve quantos apagou."""
+        consumers = self.consumers()
+        if not consumers:
+            return 0
+        low = min(consumers.values())
+        removed = 0
+        with self._lock, self._file_lock():
+            segments = self.segments()
+            for base, next_base in zip(segments, segments[1:]):
+                if next_base > low:
+                    break
+                for ext in ('log', 'idx'):
+                    try:
+                        os.remove(self._path(_segment_name(base, ext)))
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+        return removed
+
+    def import_legacy(self, path: str) -> int:
+        """Move as linhas de um antigo `events_log.json` para o log (uma vez; o ficheiro é renomeado)"""
+        if not os.path.exists(path):
+            return 0
+        events = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    evt = json.loads(line)
+                    events.append((evt['type'], evt['data']))
+                except (ValueError, KeyError):
+                    pass
+        self.append(events)
+        self.sync()
+        os.replace(path, f"{path}.migrated")
+        return len(events)
+
+    def watcher(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return LogWatcher(self)
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        return {
+            'directory': os.path.abspath(self.directory),
+            'segments': len(segments),
+            'firstOffset': segments[0] if segments else 0,
+            'endOffset': self.end_offset(),
+            'bytes': sum(os.path.getsize(self._path(_segment_name(s, 'log'))) for s in segments),
+            'consumers': self.consumers(),
+        }
+
+
+class _FileLock:
+    """flock exclusivo no diretório do log, para escritores em processos diferentes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class LogWatcher:
+    """
+    Espera por escritas no diretório do log. Criado antes da primeira leitura, não perde
+    escritas feitas entre uma leitura vazia e a chamada a `wait()`.
+    """
+    IN_MODIFY = 0x002
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+
+    def __init__(self, log: EventLog):
+        self.log = log
+        self._fd = self._inotify(log.directory)
+        self._last = None if self._fd is not None else self._signature()
+
+    def _inotify(self, directory: str):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return None
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (AttributeError, OSError):
+            return None
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self.IN_MODIFY | self.IN_MOVED_TO | self.IN_CREATE) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _signature(self):
+        segments = self.log.segments()
+        return (segments[-1], self.log._count(segments[-1])) if segments else None
+
+    def wait(self, timeout: float) -> bool:
+        """Bloqueia até haver uma escrita no log ou passar `timeout` segundos. Devolve True se houve escrita."""
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return False
+            try:
+                while os.read(self._fd, 64 * 1024):
+                    pass
+            except BlockingIOError:
+                pass
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            signature = self._signature()
+            if signature != self._last:
+                self._last = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(EVENT_LOG_POLL_MS / 1000, remaining))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+event_log = EventLog()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspecionar e compactar o log local de eventos")
+    parser.add_argument('command', choices=['stats', 'read', 'compact'])
+    parser.add_argument('--from', dest='offset', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print(json.dumps(event_log.stats(), indent=2))
+    elif args.command == 'read':
+        for record in event_log.read(args.offset, args.limit):
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        print(f" [OK] {event_log.compact()} segmento(s) apagado(s)")
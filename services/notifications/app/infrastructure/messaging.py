@@ -1,59 +1,193 @@
+"""
+Consumidor de eventos do Notification Service.
+
+Cada evento do exchange `events` dá origem a uma linha em `notifications`. As mensagens
+chegam do RabbitMQ com uma janela de prefetch (NOTIFY_PREFETCH) e são acumuladas até
+NOTIFY_BATCH_SIZE mensagens ou NOTIFY_FLUSH_MS; cada lote é gravado com um único insert
+e só depois confirmado (ack). Se o insert falhar, o lote volta à fila (nack com requeue).
+
+Os eventos escritos no log local pelo Finance Service (broker em baixo) seguem o mesmo
+caminho em lote, com o offset do log confirmado depois da escrita.
+
+Cada lote gravado é também entregue ao push_hub, que o envia às ligações SSE abertas,
+e o XP dos eventos `gain_xp`/`transactions_imported` segue para o xp_aggregator.
+"""
 import pika
 import json
 import os
+import threading
+import time
 from app.infrastructure.supabase_client import supabase
+from app.infrastructure.event_log import event_log
+from app.infrastructure.push_hub import push_hub
+from app.infrastructure.xp_aggregator import xp_aggregator
 
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
+NOTIFICATIONS_QUEUE = 'notifications'
+NOTIFY_PREFETCH = int(os.getenv('NOTIFY_PREFETCH', '500'))
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '200'))
+NOTIFY_FLUSH_MS = float(os.getenv('NOTIFY_FLUSH_MS', '100'))
+NOTIFY_REPORT_SECONDS = 60
+EVENT_LOG_CONSUMER = 'notifications'
+EVENT_LOG_BATCH = 500
+EVENT_LOG_IDLE_TIMEOUT = 5
 
-def callback(ch, method, properties, body):
-    print(f" [x] Received {method.routing_key}:{body}")
-    data = json.loads(body)
-    
-    # Criar notificacao no Supabase
-    if supabase:
-        try:
-            notification_data = {
-                'user_id': data.get('user_id'),
-                'type': method.routing_key,
-                'payload': data,
-                'is_read': False
+
+def notification_row(event_type: str, data: dict) -> dict:
+    return {
+        'user_id': data.get('user_id'),
+        'type': event_type,
+        'payload': data,
+        'is_read': False
+    }
+
+
+class ConsumerStats:
+    """Débito do consumidor (eventos/s), reportado periodicamente no log do serviço"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.started = time.monotonic()
+        self._window_start = self.started
+        self._window_count = 0
+
+    def record(self, count: int, ok: bool = True):
+        with self._lock:
+            if not ok:
+                self.failed_batches += 1
+                return
+            self.stored += count
+            self.batches += 1
+            self._window_count += count
+            elapsed = time.monotonic() - self._window_start
+            if elapsed >= NOTIFY_REPORT_SECONDS:
+                print(f" [STATS] {self._window_count / elapsed:.1f} eventos/s nos últimos {elapsed:.0f}s ({self.stored} no total)")
+                self._window_start = time.monotonic()
+                self._window_count = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                'stored': self.stored,
+                'batches': self.batches,
+                'failedBatches': self.failed_batches,
+                'avgBatchSize': round(self.stored / self.batches, 1) if self.batches else 0.0,
+                'eventsPerSecond': round(self.stored / elapsed, 1) if elapsed else 0.0,
+                'uptimeSeconds': round(elapsed),
             }
-            supabase.table('notifications').insert(notification_data).execute()
-            print(f" [OK] Notification stored for user {data.get('user_id')}")
+
+
+consumer_stats = ConsumerStats()
+
+
+def store_notifications(rows: list):
+    """Grava um lote de notificações num único insert e envia-o às ligações SSE. Só lança exceção se o insert falhar."""
+    if not rows:
+        return
+    if not supabase:
+        raise RuntimeError("Database not configured")
+    try:
+        response = supabase.table('notifications').insert(rows).execute()
+    except Exception:
+        consumer_stats.record(len(rows), ok=False)
+        raise
+    consumer_stats.record(len(rows))
+    # O lote já está gravado: uma falha daqui em diante não pode devolvê-lo à fila
+    # (seria inserido outra vez e o XP contado a dobrar)
+    try:
+        # As linhas devolvidas pelo insert já trazem id e created_at
+        push_hub.publish(response.data or rows)
+    except Exception as e:
+        print(f" [ERROR] Failed to push {len(rows)} notifications: {e}")
+    try:
+        xp_aggregator.add_events([(r['type'], r['payload']) for r in rows])
+    except Exception as e:
+        print(f" [ERROR] Failed to aggregate XP for {len(rows)} notifications: {e}")
+
+
+def consume_rabbitmq(channel):
+    channel.exchange_declare(exchange='events', exchange_type='topic')
+    # Fila durável: com ack manual, o que não foi gravado sobrevive a um restart do serviço
+    channel.queue_declare(queue=NOTIFICATIONS_QUEUE, durable=True)
+    channel.queue_bind(exchange='events', queue=NOTIFICATIONS_QUEUE, routing_key='#')
+    channel.basic_qos(prefetch_count=NOTIFY_PREFETCH)
+
+    rows = []
+    last_tag = None
+    deadline = None
+    flush_interval = NOTIFY_FLUSH_MS / 1000
+
+    print(' [*] Waiting for events. To exit press CTRL+C')
+    for method, properties, body in channel.consume(NOTIFICATIONS_QUEUE, inactivity_timeout=flush_interval):
+        if method is not None:
+            try:
+                rows.append(notification_row(method.routing_key, json.loads(body)))
+                last_tag = method.delivery_tag
+                if deadline is None:
+                    deadline = time.monotonic() + flush_interval
+            except ValueError:
+                # Mensagem inválida: descartar, senão voltaria à fila para sempre
+                print(f" [ERROR] Invalid event {method.routing_key}: {body[:200]}")
+                channel.basic_reject(method.delivery_tag, requeue=False)
+                continue
+        if not rows or (len(rows) < NOTIFY_BATCH_SIZE and time.monotonic() < deadline):
+            continue
+        try:
+            store_notifications(rows)
+            channel.basic_ack(last_tag, multiple=True)
         except Exception as e:
-            print(f" [ERROR] Failed to store notification: {e}")
+            print(f" [ERROR] Failed to store {len(rows)} notifications: {e}")
+            time.sleep(1)
+            channel.basic_nack(last_tag, multiple=True, requeue=True)
+        rows = []
+        last_tag = None
+        deadline = None
+
+
+def consume_event_log():
+    """
+    Segue o log local escrito pelo Finance Service enquanto o RabbitMQ esteve em baixo.
+    Acorda assim que há novos registos (LogWatcher) e retoma do offset guardado após cada
+    lote gravado, por isso um restart continua onde parou em vez de repetir tudo.
+    """
+    migrated = event_log.import_legacy("events_log.json")
+    if migrated:
+        print(f" [*] {migrated} eventos migrados de events_log.json para {event_log.directory}")
+    watcher = event_log.watcher()
+    offset = event_log.committed(EVENT_LOG_CONSUMER)
+    while True:
+        try:
+            records = event_log.read(offset, EVENT_LOG_BATCH)
+        except Exception as e:
+            print(f" [ERROR] Failed to read event log from offset {offset}: {e}")
+            time.sleep(1)
+            continue
+        if not records:
+            # Sem novos registos: esperar por uma escrita (o timeout é só uma rede de segurança)
+            watcher.wait(EVENT_LOG_IDLE_TIMEOUT)
+            continue
+        try:
+            store_notifications([notification_row(r['type'], r['data']) for r in records])
+        except Exception as e:
+            print(f" [ERROR] Failed to store {len(records)} notifications from event log: {e}")
+            time.sleep(1)
+            continue
+        offset = records[-1]['offset'] + 1
+        event_log.commit(EVENT_LOG_CONSUMER, offset)
+        event_log.compact()
+
 
 def start_consumer():
+    # O log local é sempre lido: o Finance Service pode ter escrito nele mesmo com este serviço ligado ao broker
+    threading.Thread(target=consume_event_log, name='event-log-consumer', daemon=True).start()
+
     print(" [*] Tentando iniciar consumidor de eventos...")
     try:
         connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST, connection_attempts=1, retry_delay=1))
-        channel = connection.channel()
-        channel.exchange_declare(exchange='events', exchange_type='topic')
-        
-        result = channel.queue_declare(queue='', exclusive=True)
-        queue_name = result.method.queue
-        
-        channel.queue_bind(exchange='events', queue=queue_name, routing_key='#')
-        
-        print(' [*] Waiting for events. To exit press CTRL+C')
-        channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=True)
-        channel.start_consuming()
+        consume_rabbitmq(connection.channel())
     except Exception as e:
-        print(f" [FALLBACK] RabbitMQ nao disponivel. O Notification Service monitorizara o ficheiro 'events_log.json'.")
-        # Polling simples do ficheiro de log (apenas para demonstracao se o RabbitMQ nao existir)
-        import time
-        last_pos = 0
-        while True:
-            if os.path.exists("events_log.json"):
-                with open("events_log.json", "r") as f:
-                    f.seek(last_pos)
-                    lines = f.readlines()
-                    last_pos = f.tell()
-                    for line in lines:
-                        try:
-                            evt = json.loads(line)
-                            # Simular callback
-                            callback(None, type('obj', (object,), {'routing_key': evt['type']})(), None, json.dumps(evt['data']))
-                        except:
-                            pass
-            time.sleep(2)
+        print(f" [FALLBACK] RabbitMQ nao disponivel. O Notification Service usara apenas o log local em '{event_log.directory}'.")
@@ -0,0 +1,74 @@
+"""
+Hub em memória para enviar notificações em tempo real (Server-Sent Events).
+
+Cada ligação SSE aberta é só uma asyncio.Queue registada no utilizador: não há threads
+nem tasks por ligação além do próprio stream, por isso milhares de ligações paradas
+custam pouco. O consumidor de eventos corre numa thread; depois de gravar um lote chama
+`publish()`, que entrega o lote ao event loop numa única chamada thread-safe e aí o
+distribui pelas filas dos utilizadores com ligações abertas.
+"""
+import asyncio
+import threading
+
+PUSH_QUEUE_SIZE = 100
+
+
+class PushHub:
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._loop = None
+        self._subscribers = {}     # user_id -> set de asyncio.Queue
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+
+    def bind(self, loop):
+        """Event loop onde vivem as ligações (chamado no arranque da app)"""
+        self._loop = loop
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def publish(self, notifications: list):
+        """Chamado de qualquer thread com as notificações acabadas de gravar"""
+        if self._loop is None or not notifications:
+            return
+        with self._lock:
+            if not any(n.get('user_id') in self._subscribers for n in notifications):
+                return
+        self._loop.call_soon_threadsafe(self._fan_out, notifications)
+
+    def _fan_out(self, notifications: list):
+        with self._lock:
+            targets = [(n, list(self._subscribers.get(n.get('user_id'), ()))) for n in notifications]
+        for notification, queues in targets:
+            for queue in queues:
+                if queue.full():
+                    # Cliente lento: descartar a mais antiga em vez de bloquear os restantes
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(notification)
+                self.delivered += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'connections': sum(len(q) for q in self._subscribers.values()),
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+            }
+
+
+push_hub = PushHub()
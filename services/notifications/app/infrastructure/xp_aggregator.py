@@ -0,0 +1,105 @@
+"""
+Agregação de XP antes de escrever em `user_settings`.
+
+Os eventos `gain_xp` (um por transação) e `transactions_imported` (com o XP de todo o
+lote) não geram uma escrita cada: o XP é somado por utilizador durante XP_FLUSH_SECONDS
+e cada flush aplica um único incremento atómico por utilizador, com o nível recalculado
+na mesma instrução (função SQL add_xp_batch, em sql/add_xp.sql). Uma importação de
+1000 transações custa assim uma escrita de XP.
+
+Se o flush falhar, os totais ainda por aplicar voltam ao acumulador e seguem no flush
+seguinte; os utilizadores já escritos antes da falha não são repetidos.
+"""
+import os
+import threading
+import time
+
+from app.infrastructure.supabase_client import supabase
+
+XP_FLUSH_SECONDS = float(os.getenv('XP_FLUSH_SECONDS', '2'))
+XP_PER_LEVEL = 100
+XP_EVENTS = ('gain_xp', 'transactions_imported')
+FUNCTION_NOT_FOUND = 'PGRST202'
+
+
+class XPAggregator:
+    def __init__(self, flush_seconds: float = XP_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.events = 0
+        self.writes = 0
+
+    def add(self, user_id: int, xp: int):
+        if not user_id or not xp:
+            return
+        with self._lock:
+            self._pending[user_id] = self._pending.get(user_id, 0) + int(xp)
+            self.events += 1
+        self._ensure_started()
+
+    def add_events(self, events: list):
+        """Acumula o XP de uma lista de (tipo, dados) já consumidos"""
+        for event_type, data in events:
+            if event_type in XP_EVENTS:
+                self.add(data.get('user_id'), data.get('xp', 0))
+
+    def flush(self) -> int:
+        """Aplica os totais acumulados. Devolve o número de utilizadores atualizados."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        users = len(pending)
+        try:
+            self._apply(pending)
+        except Exception as e:
+            # `pending` já só tem os utilizadores que ficaram por escrever
+            print(f" [ERROR] Failed to apply XP for {len(pending)} of {users} users: {e}")
+            with self._lock:
+                for user_id, xp in pending.items():
+                    self._pending[user_id] = self._pending.get(user_id, 0) + xp
+            return users - len(pending)
+        self.writes += 1
+        return users
+
+    def _apply(self, pending: dict):
+        """Escreve o XP e retira de `pending` cada utilizador cuja escrita foi confirmada"""
+        if not supabase:
+            raise RuntimeError("Database not configured")
+        user_ids = list(pending)
+        try:
+            supabase.rpc('add_xp_batch', {'p_user_ids': user_ids, 'p_xp': [pending[u] for u in user_ids]}).execute()
+            pending.clear()
+            return
+        except Exception as e:
+            # Só a falta da função justifica o fallback: com um timeout ou erro de rede o
+            # lote pode já ter sido aplicado, e escrever de novo daria o XP a dobrar
+            if getattr(e, 'code', None) != FUNCTION_NOT_FOUND:
+                raise
+        # Sem a função SQL: ler e escrever por utilizador (não atómico entre instâncias)
+        for user_id in user_ids:
+            resp = supabase.table('user_settings').select('xp').eq('user_id', user_id).limit(1).execute()
+            xp = ((resp.data[0].get('xp') or 0) if resp.data else 0) + pending[user_id]
+            supabase.table('user_settings').upsert({'user_id': user_id, 'xp': xp, 'level': xp // XP_PER_LEVEL + 1}).execute()
+            del pending[user_id]
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='xp-aggregator', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'events': self.events, 'writes': self.writes, 'pendingUsers': len(self._pending)}
+
+
+xp_aggregator = XPAggregator()
@@ -1,8 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import os
 import threading
 from app.infrastructure.messaging import start_consumer
+from app.infrastructure.push_hub import push_hub
+from app.infrastructure.xp_aggregator import xp_aggregator
+
+SSE_KEEPALIVE_SECONDS = 20
 
 app = FastAPI(
     title="Notification Service",
@@ -26,10 +33,17 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
+    # O consumidor corre noutra thread e entrega as notificações novas a este event loop
+    push_hub.bind(asyncio.get_running_loop())
     # Iniciar o consumidor de mensagens em uma thread separada
     thread = threading.Thread(target=start_consumer, daemon=True)
     thread.start()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    # Aplicar o XP ainda acumulado
+    xp_aggregator.flush()
+
 @app.get("/")
 def read_root():
     return {"message": "Notification Service API", "status": "running"}
@@ -40,5 +54,40 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/v1/notifications/stream")
+async def notifications_stream(request: Request, user_id: int):
+    """
+    Server-Sent Events com as notificações do utilizador à medida que são gravadas
+    (evento `notification`). Um comentário a cada SSE_KEEPALIVE_SECONDS mantém a ligação
+    aberta através de proxies.
+    """
+    queue = push_hub.subscribe(user_id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    notification = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: notification\ndata: {json.dumps(notification, default=str)}\n\n"
+        finally:
+            push_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/v1/notifications/stream/stats")
+def notifications_stream_stats():
+    return push_hub.stats()
+
+
 from app.api.notifications import router as notifications_router
 app.include_router(notifications_router, prefix="/api/v1/notifications", tags=["Notifications"])
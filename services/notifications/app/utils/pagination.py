@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+
+def encode_cursor(row: dict) -> str:
+    """Cursor opaco com a chave (created_at, id) da última linha devolvida"""
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str):
+    """
+    Chave (created_at, id) do cursor. Os valores entram no filtro `or` do PostgREST, por
+    isso só se aceita um timestamp ISO e um id inteiro (nada que possa acrescentar cláusulas).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        datetime.fromisoformat(created_at)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if type(row_id) is not int:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return created_at, row_id
+
+def apply_keyset(query, cursor: str = None):
+    """
+    Paginação por keyset sobre (created_at DESC, id DESC), servida pelo índice
+    notifications_user_created_id_idx: cada página custa o mesmo, seja qual for a posição.
+    """
+    query = query.order('created_at', desc=True).order('id', desc=True)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})')
+    return query
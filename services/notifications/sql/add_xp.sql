@@ -0,0 +1,17 @@
+-- Incremento atómico de XP para vários utilizadores numa só chamada.
+-- Usado pelo agregador de XP do Notification Service (app/infrastructure/xp_aggregator.py):
+-- cada flush soma o XP acumulado por utilizador e aplica-o aqui, um incremento por utilizador,
+-- recalculando o nível (100 XP por nível, como na barra de progresso do dashboard).
+
+create or replace function add_xp_batch(p_user_ids bigint[], p_xp integer[])
+returns table (user_id bigint, xp integer, level integer)
+language sql
+as $$
+    insert into user_settings as s (user_id, xp, level)
+    select u.user_id, u.xp, u.xp / 100 + 1
+    from unnest(p_user_ids, p_xp) as u(user_id, xp)
+    on conflict (user_id) do update
+        set xp = coalesce(s.xp, 0) + excluded.xp,
+            level = (coalesce(s.xp, 0) + excluded.xp) / 100 + 1
+    returning s.user_id, s.xp, s.level;
+$$;
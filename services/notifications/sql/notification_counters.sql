@@ -0,0 +1,54 @@
+-- Paginação e contador de não lidas para o Notification Service.
+--
+-- GET /notifications pagina por keyset em (created_at DESC, id DESC).
+-- GET /notifications/unread-count lê uma linha de notification_counters em vez de contar
+-- as notificações do utilizador; o contador é mantido por trigger a cada insert/update/delete,
+-- incluindo os inserts em lote do consumidor e as marcações em massa como lidas.
+
+create index if not exists notifications_user_created_id_idx on notifications (user_id, created_at desc, id desc);
+
+create table if not exists notification_counters (
+    user_id bigint primary key,
+    unread integer not null default 0
+);
+
+create or replace function notification_counters_apply() returns trigger
+language plpgsql
+as $$
+declare
+    delta_old integer := 0;
+    delta_new integer := 0;
+begin
+    if tg_op in ('UPDATE', 'DELETE') and not old.is_read and old.user_id is not null then
+        delta_old := -1;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and not new.is_read and new.user_id is not null then
+        delta_new := 1;
+    end if;
+
+    if tg_op = 'UPDATE' and old.user_id is not distinct from new.user_id then
+        delta_new := delta_new + delta_old;
+        delta_old := 0;
+    end if;
+
+    if delta_old <> 0 then
+        insert into notification_counters (user_id, unread) values (old.user_id, greatest(delta_old, 0))
+        on conflict (user_id) do update set unread = greatest(notification_counters.unread + delta_old, 0);
+    end if;
+    if delta_new <> 0 then
+        insert into notification_counters (user_id, unread) values (new.user_id, greatest(delta_new, 0))
+        on conflict (user_id) do update set unread = greatest(notification_counters.unread + delta_new, 0);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists notification_counters_trg on notifications;
+create trigger notification_counters_trg
+after insert or update of is_read, user_id or delete on notifications
+for each row execute function notification_counters_apply();
+
+-- Preenchimento inicial a partir das notificações existentes
+insert into notification_counters (user_id, unread)
+select user_id, count(*) from notifications where not is_read and user_id is not null group by user_id
+on conflict (user_id) do update set unread = excluded.unread;
@@ -19,9 +19,12 @@ import CurrencyConverter from './dashboard/CurrencyConverter'
 import BalanceChart from './dashboard/BalanceChart'
 import FinanceAIChatbot from './FinanceAIChatbot'
 import { useTickerData } from '../hooks/useTickerData'
+import { useNotificationStream } from '../hooks/useNotificationStream'
+import { useToast } from './Toast'
 
 function DashboardPage() {
   const tickerData = useTickerData()
+  const { showToast } = useToast()
   const [loading, setLoading] = useState(true)
   const [userData, setUserData] = useState(null)
   const [activeTab, setActiveTab] = useState('activity')
@@ -33,6 +36,14 @@ function DashboardPage() {
     checkLoginStatus()
   }, [])
 
+  // Alertas de orçamento em tempo real (Notification Service)
+  useNotificationStream((notification) => {
+    if (notification.type === 'budget_exceeded') {
+      const { category, spent, limit } = notification.payload || {}
+      showToast(`Orçamento excedido em ${category}: ${spent}€ de ${limit}€`, 'warning', 6000)
+    }
+  })
+
   const checkLoginStatus = async () => {
     try {
       const response = await apiFetch('/api/dashboard', {
@@ -4,6 +4,8 @@ import { motion, AnimatePresence } from 'framer-motion'
 
 const STORAGE_KEY = 'financelog_chat_history'
 const MAX_STORED = 20
+// A conversa vive no servidor; aqui guarda-se só o id para continuar depois de recarregar
+const CONVERSATION_KEY = 'financelog_chat_conversation'
 
 // Função para renderizar texto com formatação Markdown básica
 function formatMessage(text) {
@@ -32,6 +34,24 @@ function formatInlineText(text) {
   return parts.length > 0 ? parts : text
 }
 
+// Lê um corpo text/event-stream e chama onEvent com cada evento `data: {...}`
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    for (const event of events) {
+      const data = event.split('\n').filter(l => l.startsWith('data: ')).map(l => l.slice(6)).join('\n')
+      if (data) onEvent(JSON.parse(data))
+    }
+  }
+}
+
 const QUICK_QUESTIONS = [
   'Como posso poupar mais este mês?',
   'Estou a gastar demasiado?',
@@ -44,6 +64,8 @@ export default function FinanceAIChatbot() {
   const [minimized, setMinimized] = useState(false)
   const [inputValue, setInputValue] = useState('')
   const [isLoading, setIsLoading] = useState(false)
+  const [streamingId, setStreamingId] = useState(null)
+  const [conversationId, setConversationId] = useState(() => localStorage.getItem(CONVERSATION_KEY))
   const messagesEndRef = useRef(null)
   const inputRef = useRef(null)
 
@@ -75,6 +97,11 @@ export default function FinanceAIChatbot() {
     } catch (e) { /* ignore */ }
   }, [messages])
 
+  useEffect(() => {
+    if (conversationId) localStorage.setItem(CONVERSATION_KEY, conversationId)
+    else localStorage.removeItem(CONVERSATION_KEY)
+  }, [conversationId])
+
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [messages, isOpen, minimized])
@@ -98,38 +125,64 @@ export default function FinanceAIChatbot() {
     setInputValue('')
     setIsLoading(true)
 
-    try {
-      const response = await apiFetch('/api/chat', {
-        method: 'POST',
-        body: JSON.stringify({
-          message: text,
-          conversationHistory: messages.slice(-10).map(m => ({
-            role: m.sender === 'user' ? 'user' : 'assistant',
-            content: m.text,
-          })),
-        }),
-      })
-
-      const botText = response.ok
-        ? (await response.json()).response
-        : 'Desculpe, houve um erro ao processar a sua mensagem. Tente novamente.'
+    const botId = Date.now() + 1
+    // Cria a mensagem do bot no primeiro pedaço e atualiza-a nos seguintes
+    const setBotText = (botText) => {
+      setMessages(prev => prev.some(m => m.id === botId)
+        ? prev.map(m => m.id === botId ? { ...m, text: botText } : m)
+        : [...prev, { id: botId, text: botText, sender: 'bot', timestamp: new Date() }])
+    }
 
+    // O servidor já não tinha a conversa (expirou ou foi apagada): avisar que o contexto se perdeu
+    const noticeReset = () => {
       setMessages(prev => [...prev, {
-        id: Date.now() + 1,
-        text: botText,
+        id: Date.now() + 2,
+        text: 'A conversa anterior já não estava disponível no servidor, por isso o Sensei respondeu sem o contexto das mensagens anteriores.',
         sender: 'bot',
         timestamp: new Date(),
       }])
+    }
+
+    // Só a nova mensagem: o histórico (e o seu resumo) fica no servidor
+    const body = JSON.stringify({ message: text, conversationId })
+
+    try {
+      const response = await apiFetch('/api/chat/stream', { method: 'POST', body })
+
+      if (response.ok && response.body) {
+        let botText = ''
+        await readEventStream(response, (event) => {
+          if (event.type === 'delta') {
+            botText += event.text
+            setStreamingId(botId)
+          } else if (event.type === 'done') {
+            // O texto final é o de referência (inclui o fallback quando o modelo falha)
+            botText = event.response
+            setConversationId(event.conversationId)
+            setBotText(botText)
+            if (event.reset) noticeReset()
+            return
+          }
+          setBotText(botText)
+        })
+      } else {
+        // Sem streaming disponível: resposta completa do endpoint clássico
+        const fallback = await apiFetch('/api/chat', { method: 'POST', body })
+        if (fallback.ok) {
+          const data = await fallback.json()
+          setConversationId(data.conversationId)
+          setBotText(data.response)
+          if (data.reset) noticeReset()
+        } else {
+          setBotText('Desculpe, houve um erro ao processar a sua mensagem. Tente novamente.')
+        }
+      }
     } catch (error) {
       console.error('Erro ao enviar mensagem:', error)
-      setMessages(prev => [...prev, {
-        id: Date.now() + 1,
-        text: 'Desculpe, ocorreu um erro de ligação. Tente novamente mais tarde.',
-        sender: 'bot',
-        timestamp: new Date(),
-      }])
+      setBotText('Desculpe, ocorreu um erro de ligação. Tente novamente mais tarde.')
     } finally {
       setIsLoading(false)
+      setStreamingId(null)
     }
   }
 
@@ -139,6 +192,10 @@ export default function FinanceAIChatbot() {
   }
 
   const clearHistory = () => {
+    if (conversationId) {
+      apiFetch(`/api/chat/${conversationId}`, { method: 'DELETE' }).catch(() => { /* ignore */ })
+      setConversationId(null)
+    }
     const initial = [{
       id: Date.now(),
       text: 'Conversa reiniciada. Olá novamente! Como posso ajudar-te hoje? 🧘‍♂️',
@@ -238,7 +295,7 @@ export default function FinanceAIChatbot() {
               ))}
             </AnimatePresence>
 
-            {isLoading && (
+            {isLoading && !streamingId && (
               <motion.div initial={{ opacity: 0 }} animate={{ opacity: 1 }} className="flex justify-start">
                 <div className="w-7 h-7 rounded-xl bg-blue-600 flex items-center justify-center text-sm mr-2 flex-shrink-0">🧘‍♂️</div>
                 <div className="bg-white px-4 py-3 rounded-2xl rounded-bl-sm shadow-sm border border-slate-100">
@@ -31,13 +31,11 @@ export default function BalanceChart({ userData }) {
     if (!userData?.user_id) { setLoading(false); return }
     setLoading(true)
     try {
-      // Buscar todas as transações sem filtro de data (o endpoint pode não suportar)
-      const resp = await apiFetch('/api/transactions?limit=500')
+      // Série mensal já agregada no servidor (não depende do número de transações)
+      const resp = await apiFetch(`/api/summary/monthly?months=${period}`)
       if (resp.ok) {
         const json = await resp.json()
-        const transactions = json.transactions || []
-        const chartData = buildMonthlyData(transactions, period)
-        setData(chartData)
+        setData(buildMonthlyData(json.months || []))
       }
     } catch (e) {
       console.error('BalanceChart error:', e)
@@ -46,28 +44,14 @@ export default function BalanceChart({ userData }) {
     }
   }
 
-  const buildMonthlyData = (transactions, months) => {
-    const result = []
-    const now = new Date()
-
-    for (let i = months - 1; i >= 0; i--) {
-      const d = new Date(now.getFullYear(), now.getMonth() - i, 1)
-      const year = d.getFullYear()
-      const month = d.getMonth()
+  const buildMonthlyData = (months) => {
+    return months.map(m => {
+      const [year, month] = m.month.split('-').map(Number)
+      const d = new Date(year, month - 1, 1)
       // Formato mais curto para labels
       const label = d.toLocaleDateString('pt-PT', { month: 'short' }).replace('.', '') + '/' + String(d.getFullYear()).slice(2)
-
-      const monthTxns = transactions.filter(t => {
-        const td = new Date(t.date)
-        return td.getFullYear() === year && td.getMonth() === month
-      })
-
-      const income = monthTxns.filter(t => t.type === 'income').reduce((s, t) => s + parseFloat(t.amount || 0), 0)
-      const expense = monthTxns.filter(t => t.type === 'expense').reduce((s, t) => s + parseFloat(t.amount || 0), 0)
-
-      result.push({ label, income, expense, balance: income - expense })
-    }
-    return result
+      return { label, income: m.income, expense: m.expense, balance: m.balance }
+    })
   }
 
   useEffect(() => {
@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { AreaChart, Area, XAxis, YAxis, Tooltip, ResponsiveContainer } from 'recharts'
 import { apiFetch, SERVICES } from '../../config/api'
 import { useToast } from '../Toast'
 import Modal from '../Modal'
@@ -7,6 +8,12 @@ import { LoadingSpinner } from '../Skeleton'
 function StockInvestments({ userData }) {
   const { showToast } = useToast()
   const [investments, setInvestments] = useState([])
+  // Totais calculados pelo Investment Service (null quando os preços locais divergem)
+  const [summary, setSummary] = useState(null)
+  const [history, setHistory] = useState([])
+  const [historyPeriod, setHistoryPeriod] = useState('1m')
+  const [historyGaps, setHistoryGaps] = useState({ flat: [], unpriced: [] })
+  const [noQuote, setNoQuote] = useState(false)
   const [loading, setLoading] = useState(true)
   const [loadingPrices, setLoadingPrices] = useState({})
   const [searchResults, setSearchResults] = useState([])
@@ -28,8 +35,8 @@ function StockInvestments({ userData }) {
     }
   }, [userData])
 
-  const fetchInvestmentsFromDB = async () => {
-    setLoading(true)
+  const fetchInvestmentsFromDB = async (silent = false) => {
+    if (!silent) setLoading(true)
     try {
       const response = await apiFetch('/api/investments', {
         method: 'GET',
@@ -48,16 +55,17 @@ function StockInvestments({ userData }) {
               quantidade: inv.quantity,
               precoCompra: precoCompra,
               precoAtual: precoAtual,
-              variacao: precoCompra > 0 ? ((precoAtual - precoCompra) / precoCompra * 100) : 0,
+              variacao: inv.unrealized_pnl_pct ?? (precoCompra > 0 ? ((precoAtual - precoCompra) / precoCompra * 100) : 0),
             }
           }))
+          setSummary(data.summary || null)
         }
       }
     } catch (error) {
       console.error('Erro ao carregar investimentos:', error)
     } finally {
       // Pequeno delay para evitar flash
-      setTimeout(() => setLoading(false), 300)
+      if (!silent) setTimeout(() => setLoading(false), 300)
     }
   }
 
@@ -70,16 +78,30 @@ function StockInvestments({ userData }) {
     }
   }, [])
 
-  // Atualizar preços periodicamente a cada 30 segundos
+  // Evolução do valor da carteira (histórico de cotações do Investment Service)
   useEffect(() => {
-    const interval = setInterval(() => {
-      investments.forEach(investment => {
-        fetchStockPrice(investment.simbolo, investment.id)
-      })
-    }, 30000)
+    if (!userData?.user_id) return
+    const fetchHistory = async () => {
+      try {
+        const response = await apiFetch(`/api/investments/history?period=${historyPeriod}`, { credentials: 'include' })
+        if (response.ok) {
+          const data = await response.json()
+          setHistory((data.points || []).map(p => ({ ts: p.ts * 1000, value: p.value })))
+          setHistoryGaps({ flat: data.flat || [], unpriced: data.unpriced || [] })
+        }
+      } catch (error) {
+        console.error('Erro ao carregar histórico da carteira:', error)
+      }
+    }
+    fetchHistory()
+  }, [userData, historyPeriod])
+
+  // Atualizar preços e totais periodicamente a cada 30 segundos (um único pedido à carteira)
+  useEffect(() => {
+    const interval = setInterval(() => fetchInvestmentsFromDB(true), 30000)
 
     return () => clearInterval(interval)
-  }, [investments])
+  }, [])
 
   const fetchStockPrice = async (symbol, investmentId) => {
     if (!symbol) return
@@ -87,9 +109,11 @@ function StockInvestments({ userData }) {
     setLoadingPrices(prev => ({ ...prev, [investmentId]: true }))
 
     try {
-      const response = await apiFetch(`/api/stock/${symbol}`)
+      const response = await apiFetch(`/api/investments/price/${symbol}`)
       if (response.ok) {
         const data = await response.json()
+        // Sem cotação para este símbolo: manter o último preço conhecido
+        if (data.price == null) return
 
         setInvestments(prev =>
           prev.map(inv => {
@@ -104,6 +128,7 @@ function StockInvestments({ userData }) {
             return inv
           })
         )
+        setSummary(null)
       } else {
         console.error(`Erro ao buscar preço de ${symbol}`)
       }
@@ -149,13 +174,19 @@ function StockInvestments({ userData }) {
     setNewInvestment(prev => ({ ...prev, simbolo: symbol, nome: name }))
     setSearchResults([])
     setSearchQuery('')
+    setNoQuote(false)
 
-    // Buscar preço atual para sugestão
+    // Buscar preço atual para sugestão (ações sem cotação: o utilizador indica o preço)
     try {
       const response = await apiFetch(`/api/investments/price/${symbol}`)
       if (response.ok) {
         const data = await response.json()
-        setNewInvestment(prev => ({ ...prev, precoCompra: data.price.toFixed(2) }))
+        if (data.price == null) {
+          setNoQuote(true)
+          setNewInvestment(prev => ({ ...prev, precoCompra: '' }))
+        } else {
+          setNewInvestment(prev => ({ ...prev, precoCompra: data.price.toFixed(2) }))
+        }
       }
     } catch (error) {
       console.error('Erro ao buscar preço:', error)
@@ -185,10 +216,10 @@ function StockInvestments({ userData }) {
     return calculateTotal(investments) - calculateTotalInvested(investments)
   }
 
-  const totalAtual = calculateTotal(investments)
-  const totalInvestido = calculateTotalInvested(investments)
-  const lucroPrejuizo = calculateProfit(investments)
-  const percentagemLucro = totalInvestido > 0 ? ((lucroPrejuizo / totalInvestido) * 100).toFixed(2) : 0
+  const totalAtual = summary ? summary.total_value : calculateTotal(investments)
+  const totalInvestido = summary ? summary.total_invested : calculateTotalInvested(investments)
+  const lucroPrejuizo = summary ? summary.unrealized_pnl : calculateProfit(investments)
+  const percentagemLucro = summary ? summary.unrealized_pnl_pct.toFixed(2) : (totalInvestido > 0 ? ((lucroPrejuizo / totalInvestido) * 100).toFixed(2) : 0)
 
   const handleAddInvestment = async () => {
     if (newInvestment.simbolo && newInvestment.nome && newInvestment.quantidade && newInvestment.precoCompra) {
@@ -221,6 +252,7 @@ function StockInvestments({ userData }) {
           }
           const updatedInvestments = [...investments, investment]
           setInvestments(updatedInvestments)
+          setSummary(null)
           setNewInvestment({ simbolo: '', nome: '', quantidade: '', precoCompra: '' })
           setShowModal(false)
           setSearchQuery('')
@@ -250,6 +282,7 @@ function StockInvestments({ userData }) {
       if (response.ok) {
         const updatedInvestments = investments.filter(inv => inv.id !== id)
         setInvestments(updatedInvestments)
+        setSummary(null)
         showToast('Investimento removido', 'success')
       } else {
         showToast('Erro ao remover investimento', 'error')
@@ -290,11 +323,11 @@ function StockInvestments({ userData }) {
       <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
         <div className="rounded-xl p-4 bg-slate-900 text-white shadow-lg">
           <p className="text-xs text-white/80">Valor Atual</p>
-          <p className="text-2xl font-bold">{formatCurrency(calculateTotal(investments))}</p>
+          <p className="text-2xl font-bold">{formatCurrency(totalAtual)}</p>
         </div>
         <div className="rounded-xl p-4 bg-white border border-gray-100 shadow-sm">
           <p className="text-xs text-gray-500">Total Investido</p>
-          <p className="text-2xl font-bold text-gray-900">{formatCurrency(calculateTotalInvested(investments))}</p>
+          <p className="text-2xl font-bold text-gray-900">{formatCurrency(totalInvestido)}</p>
         </div>
         <div className="rounded-xl p-4 bg-white border border-gray-100 shadow-sm flex items-center justify-between">
           <div>
@@ -305,6 +338,59 @@ function StockInvestments({ userData }) {
         </div>
       </div>
 
+      {/* Evolução da carteira */}
+      {history.length > 1 && (
+        <div className="bg-white rounded-2xl shadow-lg border border-gray-100 p-6">
+          <div className="flex items-center justify-between mb-4">
+            <h3 className="text-lg font-bold text-gray-900 flex items-center gap-2">
+              <div className="w-2 h-6 bg-primary rounded-full" />
+              Evolução da Carteira
+            </h3>
+            <div className="flex gap-1">
+              {['1d', '1w', '1m', '1y', 'all'].map(period => (
+                <button
+                  key={period}
+                  onClick={() => setHistoryPeriod(period)}
+                  className={`px-2 py-1 rounded-md text-xs font-semibold ${historyPeriod === period ? 'bg-primary text-white' : 'bg-gray-100 text-gray-600 hover:bg-gray-200'}`}
+                >
+                  {period === 'all' ? 'Tudo' : period.toUpperCase()}
+                </button>
+              ))}
+            </div>
+          </div>
+          <div className="h-56">
+            <ResponsiveContainer width="100%" height="100%">
+              <AreaChart data={history} margin={{ top: 5, right: 10, left: 10, bottom: 5 }}>
+                <XAxis
+                  dataKey="ts"
+                  type="number"
+                  domain={['dataMin', 'dataMax']}
+                  axisLine={false}
+                  tickLine={false}
+                  tick={{ fill: '#94a3b8', fontSize: 10, fontWeight: 700 }}
+                  tickFormatter={(ts) => historyPeriod === '1d'
+                    ? new Date(ts).toLocaleTimeString('pt-PT', { hour: '2-digit', minute: '2-digit' })
+                    : new Date(ts).toLocaleDateString('pt-PT', { day: '2-digit', month: 'short' })}
+                />
+                <YAxis axisLine={false} tickLine={false} tick={{ fill: '#94a3b8', fontSize: 10, fontWeight: 700 }} tickFormatter={(val) => `€${Math.round(val)}`} width={60} domain={['auto', 'auto']} />
+                <Tooltip
+                  contentStyle={{ borderRadius: '16px', border: 'none', boxShadow: '0 10px 15px -3px rgba(0,0,0,0.1)' }}
+                  labelFormatter={(ts) => new Date(ts).toLocaleString('pt-PT')}
+                  formatter={(value) => [formatCurrency(value), 'Valor']}
+                />
+                <Area type="monotone" dataKey="value" stroke="#10b981" fill="#10b981" fillOpacity={0.15} strokeWidth={2} />
+              </AreaChart>
+            </ResponsiveContainer>
+          </div>
+          {(historyGaps.flat.length > 0 || historyGaps.unpriced.length > 0) && (
+            <p className="mt-2 text-xs text-gray-500">
+              {historyGaps.flat.length > 0 && `Sem histórico de cotações (valor ao preço atual): ${historyGaps.flat.join(', ')}. `}
+              {historyGaps.unpriced.length > 0 && `Sem cotação, fora do gráfico: ${historyGaps.unpriced.join(', ')}.`}
+            </p>
+          )}
+        </div>
+      )}
+
       {/* Lista de Investimentos */}
       {investments.length > 0 ? (
         <div className="bg-white rounded-2xl shadow-lg border border-gray-100 overflow-hidden">
@@ -522,7 +608,9 @@ function StockInvestments({ userData }) {
                 <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M13 16h-1v-4h-1m1-4h.01M21 12a9 9 0 11-18 0 9 9 0 0118 0z" />
               </svg>
               <p className="text-xs text-blue-700 font-medium">
-                💡 Dica: O preço sugerido é baseado na cotação atual da ação. Verifique se o valor está correto antes de adicionar.
+                {noQuote
+                  ? `💡 Não há cotação disponível para ${newInvestment.simbolo}. Indique o preço de compra manualmente.`
+                  : '💡 Dica: O preço sugerido é baseado na cotação atual da ação. Verifique se o valor está correto antes de adicionar.'}
               </p>
             </div>
           )}
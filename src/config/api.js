@@ -55,19 +55,25 @@ export const apiFetch = (endpoint, options = {}) => {
     } else if (url.startsWith('/api/investments') || url.startsWith('/api/stock')) {
       url = `${SERVICES.INVESTMENTS}${url.replace('/api', '')}`
     } else if (url.startsWith('/api/notifications')) {
-      url = `${SERVICES.NOTIFICATIONS}/notifications/`
+      // Manter sub-rotas (/unread-count, /read) e a query string (limit, cursor, unread_only)
+      url = `${SERVICES.NOTIFICATIONS}/notifications/${url.replace(/^\/api\/notifications\/?/, '')}`
     } else if (url.startsWith('/api/activity-summary')) {
       url = `${SERVICES.FINANCE}/summary/`
     } else if (url.startsWith('/api/financial-health')) {
       url = `${SERVICES.FINANCE}/summary/health`
     } else if (url.startsWith('/api/transactions')) {
-      url = `${SERVICES.FINANCE}/transactions/`
+      // Manter a query string (limit, cursor, start_date, end_date)
+      const query = url.includes('?') ? url.slice(url.indexOf('?')) : ''
+      url = `${SERVICES.FINANCE}/transactions/${query}`
     } else if (url.startsWith('/api/summary/insights')) {
       url = `${SERVICES.FINANCE}/summary/insights`
     } else if (url.startsWith('/api/summary/analysis')) {
       url = `${SERVICES.FINANCE}/summary/analysis`
     } else if (url.startsWith('/api/categories')) {
       url = `${SERVICES.FINANCE}/categories/`
+    } else if (url.startsWith('/api/chat/')) {
+      // /api/chat/stream e /api/chat/{conversationId}
+      url = `${SERVICES.FINANCE}${url.replace('/api', '')}`
     } else if (url.startsWith('/api/chat')) {
       url = `${SERVICES.FINANCE}/chat/`
     } else {
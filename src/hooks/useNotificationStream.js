@@ -0,0 +1,31 @@
+import { useEffect, useRef } from 'react'
+import { SERVICES } from '../config/api'
+
+const getCookie = (name) => {
+  try {
+    const value = `; ${document.cookie}`
+    const parts = value.split(`; ${name}=`)
+    if (parts.length === 2) return parts.pop().split(';').shift()
+  } catch (e) { return null }
+  return null
+}
+
+// Recebe as notificações novas por Server-Sent Events, sem polling.
+// O EventSource volta a ligar-se sozinho se a ligação cair.
+export const useNotificationStream = (onNotification) => {
+  const handlerRef = useRef(onNotification)
+  handlerRef.current = onNotification
+
+  useEffect(() => {
+    const userId = getCookie('user_id')
+    if (!userId || typeof EventSource === 'undefined') return
+
+    const source = new EventSource(`${SERVICES.NOTIFICATIONS}/notifications/stream?user_id=${userId}`, { withCredentials: true })
+    source.addEventListener('notification', (event) => {
+      try {
+        handlerRef.current?.(JSON.parse(event.data))
+      } catch (e) { /* ignore */ }
+    })
+    return () => source.close()
+  }, [])
+}